@@ -0,0 +1,281 @@
+import itertools
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from search import FIELD_WEIGHTS, tokenize
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[float, float, str]
+
+
+class IntervalTree:
+    """Static centered interval tree: all intervals containing a point in O(log n + k)."""
+
+    def __init__(self, intervals: List[Interval]):
+        # Empty intervals (low > high) contain nothing
+        self.root = self.build([interval for interval in intervals if interval[0] <= interval[1]])
+
+    def build(self, intervals: List[Interval]):
+        if not intervals:
+            return None
+        endpoints = sorted(bound for low, high, _ in intervals for bound in (low, high) if abs(bound) != float("inf"))
+        center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+        by_low = sorted(overlapping, key=lambda interval: interval[0])
+        by_high = sorted(overlapping, key=lambda interval: interval[1], reverse=True)
+        return (center, by_low, by_high, self.build(left), self.build(right))
+
+    def stab(self, point: float) -> List[str]:
+        found = []
+        node = self.root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if point < center:
+                for low, _, key in by_low:
+                    if low > point:
+                        break
+                    found.append(key)
+                node = left
+            elif point > center:
+                for _, high, key in by_high:
+                    if high < point:
+                        break
+                    found.append(key)
+                node = right
+            else:
+                found.extend(key for _, _, key in by_low)
+                break
+        return found
+
+
+def listing_terms(listing: Dict[str, Any]) -> Set[str]:
+    return {token for field in FIELD_WEIGHTS for token in tokenize(listing.get(field) or "")}
+
+
+class SavedSearchIndex:
+    """Finds the saved searches a new listing matches without evaluating each of them.
+
+    Each predicate has its own inverted structure: vehicle type buckets, an interval
+    tree over price ranges and keyword postings. A listing's candidates per predicate
+    are looked up directly and intersected, so the work grows with the number of
+    searches matching each predicate rather than with all saved searches.
+
+    Keywords match when every stemmed term of the saved search_text occurs in the
+    listing's title, make, model or description.
+
+    Refreshes re-scan `commit_lag` seconds behind the watermark, as updated_at is
+    stamped before the write commits (see change_feed.PollWindow).
+    """
+
+    def __init__(self, rebuild_threshold: int = 256, commit_lag: float = 5.0):
+        self.rebuild_threshold = rebuild_threshold
+        self.lag = timedelta(seconds=commit_lag)
+        self.searches: Dict[str, Dict[str, Any]] = {}
+        self.by_vehicle_type: Dict[Optional[str], Set[str]] = defaultdict(set)
+        self.by_term: Dict[str, Set[str]] = defaultdict(set)
+        self.without_terms: Set[str] = set()
+        self.without_price: Set[str] = set()
+        # Price ranges added since the last tree build are scanned until the next rebuild;
+        # removed searches stay in the tree as stale entries until then
+        self.price_tree = IntervalTree([])
+        self.pending_prices: Dict[str, Tuple[float, float]] = {}
+        self.stale_prices = 0
+        self.watermark: Optional[datetime] = None
+        # (search id, updated_at) of the changes applied inside the re-scanned window
+        self.seen: Dict[Tuple[str, datetime], datetime] = {}
+
+    def __len__(self):
+        return len(self.searches)
+
+    async def load(self, collection):
+        await self.refresh(collection)
+        logger.info(f"Saved search index loaded with {len(self.searches)} searches")
+
+    async def refresh(self, collection):
+        """Apply saved searches created or deleted (by any worker) since the last refresh."""
+        if self.watermark is None:
+            query = {"is_active": True}
+            self.watermark = datetime.utcnow()
+        else:
+            query = {"updated_at": {"$gte": self.watermark - self.lag}}
+        async for saved in collection.find(query, {"_id": 0}).sort("updated_at", 1):
+            key = (saved["id"], saved["updated_at"])
+            if key in self.seen:
+                continue
+            if saved.get("is_active", True):
+                self.add(saved)
+            else:
+                self.remove(saved["id"])
+            self.seen[key] = saved["updated_at"]
+            self.watermark = max(self.watermark, saved["updated_at"])
+        # Keys older than the re-scanned window can never come back
+        since = self.watermark - self.lag
+        self.seen = {key: updated_at for key, updated_at in self.seen.items() if updated_at >= since}
+
+    def add(self, saved: Dict[str, Any]):
+        self.remove(saved["id"])
+        search_id = saved["id"]
+        terms = frozenset(tokenize(saved.get("search_text") or ""))
+        low = saved.get("min_price")
+        high = saved.get("max_price")
+        self.searches[search_id] = {
+            "id": search_id,
+            "user_id": saved["user_id"],
+            "name": saved.get("name"),
+            "vehicle_type": saved.get("vehicle_type"),
+            "terms": terms,
+            "price": None if low is None and high is None else (
+                float("-inf") if low is None else low,
+                float("inf") if high is None else high,
+            ),
+        }
+        self.by_vehicle_type[saved.get("vehicle_type")].add(search_id)
+        if terms:
+            # One posting per search, under its longest (usually rarest) term; the rest
+            # are verified against the listing's terms
+            self.by_term[max(terms, key=len)].add(search_id)
+        else:
+            self.without_terms.add(search_id)
+        price = self.searches[search_id]["price"]
+        if price is None:
+            self.without_price.add(search_id)
+        else:
+            self.pending_prices[search_id] = price
+            if len(self.pending_prices) > self.rebuild_threshold:
+                self.rebuild_prices()
+
+    def remove(self, search_id: str):
+        saved = self.searches.pop(search_id, None)
+        if saved is None:
+            return
+        self.by_vehicle_type[saved["vehicle_type"]].discard(search_id)
+        if saved["terms"]:
+            self.by_term[max(saved["terms"], key=len)].discard(search_id)
+        self.without_terms.discard(search_id)
+        self.without_price.discard(search_id)
+        if saved["price"] is not None and self.pending_prices.pop(search_id, None) is None:
+            self.stale_prices += 1
+            if self.stale_prices > self.rebuild_threshold:
+                self.rebuild_prices()
+
+    def rebuild_prices(self):
+        self.price_tree = IntervalTree([
+            (*saved["price"], search_id) for search_id, saved in self.searches.items() if saved["price"] is not None
+        ])
+        self.pending_prices = {}
+        self.stale_prices = 0
+
+    def price_matches(self, price: float) -> Set[str]:
+        """Searches with a price range containing `price`."""
+        # The tree can hold stale entries of removed or re-added searches, hence the set
+        matches = {search_id for search_id in self.price_tree.stab(price) if self.in_price_range(search_id, price)}
+        matches.update(key for key, (low, high) in self.pending_prices.items() if low <= price <= high)
+        return matches
+
+    def in_price_range(self, search_id: str, price: float) -> bool:
+        saved = self.searches.get(search_id)
+        return saved is not None and saved["price"] is not None and saved["price"][0] <= price <= saved["price"][1]
+
+    def match(self, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+        vehicle_type = listing.get("vehicle_type")
+        price = listing["price"]
+        terms = listing_terms(listing)
+        # Each predicate's candidates as the (disjoint) buckets holding them; only the
+        # smallest predicate is iterated, and its candidates checked against the others
+        by_type = [self.by_vehicle_type.get(None, ())]
+        if vehicle_type is not None:
+            by_type.append(self.by_vehicle_type.get(vehicle_type, ()))
+        by_terms = [self.without_terms, *(self.by_term.get(term, ()) for term in terms)]
+        by_price = [self.without_price, self.price_matches(price)]
+        smallest = min((by_type, by_terms, by_price), key=lambda buckets: sum(len(bucket) for bucket in buckets))
+        matched = []
+        for search_id in itertools.chain.from_iterable(smallest):
+            saved = self.searches[search_id]
+            if (
+                saved["vehicle_type"] in (None, vehicle_type)
+                and (saved["price"] is None or saved["price"][0] <= price <= saved["price"][1])
+                # Postings only guarantee one term; multi-term searches need all of them
+                and saved["terms"] <= terms
+            ):
+                matched.append(saved)
+        return matched
+
+
+def format_price(price: float) -> str:
+    return f"{price:,.0f} €".replace(",", ".")
+
+
+async def send_alert_digests(
+    db,
+    send_email: Callable[[str, str, str], Awaitable[bool]],
+    site_url: str = "",
+    max_listings: int = 50,
+):
+    """Send each user one email listing the new matches for their saved searches.
+
+    At most `max_listings` listings go into one email; matches beyond that stay
+    queued for the next digest, which the email says.
+    """
+    pending = await db.alert_queue.aggregate([
+        {"$sort": {"created_at": 1}},
+        {"$group": {"_id": "$user_id", "items": {"$push": {"id": "$_id", "listing_id": "$listing_id", "search_name": "$search_name"}}}},
+    ]).to_list(None)
+    sent = 0
+    for group in pending:
+        user = await db.users.find_one({"id": group["_id"], "is_active": {"$ne": False}}, {"_id": 0, "email": 1, "full_name": 1})
+        queued_ids = list(dict.fromkeys(item["listing_id"] for item in group["items"]))
+        listing_ids = queued_ids[:max_listings]
+        remaining = len(queued_ids) - len(listing_ids)
+        included = set(listing_ids)
+        # Without an account nothing can be delivered, so nothing stays queued
+        items = [item for item in group["items"] if item["listing_id"] in included or not user]
+        queue_ids = [item["id"] for item in items]
+        listings = await db.listings.find(
+            {"id": {"$in": listing_ids}, "is_active": True}, {"_id": 0, "id": 1, "title": 1, "price": 1}
+        ).to_list(len(listing_ids))
+        if user and listings:
+            searches = sorted({item["search_name"] for item in items if item.get("search_name")})
+            lines = [f"- {listing['title']} ({format_price(listing['price'])}): {site_url}/listings/{listing['id']}" for listing in listings]
+            body = "\n".join([
+                f"Hallo {user['full_name']},",
+                "",
+                f"es gibt {len(listings)} neue Inserate zu Ihren gespeicherten Suchen"
+                + (f" ({', '.join(searches)})" if searches else "") + ":",
+                "",
+                *lines,
+                *(["", f"{remaining} weitere Inserate folgen mit der nächsten Benachrichtigung."] if remaining else []),
+            ])
+            if not await send_email(user["email"], "Neue Inserate zu Ihren gespeicherten Suchen", body):
+                continue
+            sent += 1
+        # Delivered, or nothing left to deliver (account or listings gone)
+        await db.alert_queue.delete_many({"_id": {"$in": queue_ids}})
+    if sent:
+        logger.info(f"Sent {sent} saved search digests")
+    return sent
+
+
+async def enqueue_alerts(db, index: SavedSearchIndex, listing: Dict[str, Any]) -> int:
+    matches = [saved for saved in index.match(listing) if saved["user_id"] != listing["seller_id"]]
+    if not matches:
+        return 0
+    now = datetime.utcnow()
+    alerts = [{
+        "user_id": saved["user_id"],
+        "search_id": saved["id"],
+        "search_name": saved["name"],
+        "listing_id": listing["id"],
+        "created_at": now,
+    } for saved in matches]
+    await db.alert_queue.insert_many(alerts)
+    return len(alerts)
@@ -0,0 +1,46 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_inactive_listings(db, older_than_days: int, batch_size: int = 500) -> int:
+    """Move listings soft-deleted more than `older_than_days` ago into `listings_archive`.
+
+    Each batch is copied with idempotent upserts before it is deleted from the hot
+    collection, so an interrupted run never loses a listing and can simply be repeated.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    query = {"is_active": False, "deleted_at": {"$lt": cutoff}}
+    archived = 0
+    while True:
+        batch = await db.listings.find(query).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        now = datetime.utcnow()
+        await db.listings_archive.bulk_write(
+            [ReplaceOne({"_id": listing["_id"]}, {**listing, "archived_at": now}, upsert=True) for listing in batch],
+            ordered=False,
+        )
+        per_seller = defaultdict(list)
+        for listing in batch:
+            per_seller[listing["seller_id"]].append(listing["_id"])
+        # Deleted per seller, so each seller's total drops by exactly what this run removed,
+        # even if an overlapping run already took some of the batch
+        decrements = []
+        for seller_id, ids in per_seller.items():
+            result = await db.listings.delete_many({"_id": {"$in": ids}, "is_active": False})
+            if result.deleted_count:
+                decrements.append(UpdateOne({"_id": seller_id}, {"$inc": {"deleted": -result.deleted_count, "writes": 1}}))
+            archived += result.deleted_count
+        # Archived listings no longer count towards the sellers' dashboard totals
+        if decrements:
+            await db.seller_listing_counts.bulk_write(decrements, ordered=False)
+        if len(batch) < batch_size:
+            break
+    if archived:
+        logger.info(f"Archived {archived} inactive listings")
+    return archived
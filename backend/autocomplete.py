@@ -0,0 +1,125 @@
+import bisect
+import heapq
+import logging
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("make", "model")
+
+
+def normalize(value: str) -> str:
+    """Case- and accent-insensitive key: "Bürstner " and "burstner" complete alike."""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+class PrefixIndex:
+    """Sorted array of distinct keys with listing counts, searched by binary search.
+
+    Every key starting with a prefix lies in one contiguous slice of the sorted
+    array, found with two bisects; the most frequent keys of that slice are the
+    suggestions. Counts change in place on every write; the array only changes
+    when a value appears for the first time or its last listing goes away.
+    """
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.counts: Counter = Counter()
+        # Every spelling seen per key; the most common one is shown
+        self.spellings: Dict[str, Counter] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, value: str):
+        key = normalize(value)
+        if not key:
+            return
+        if key not in self.counts:
+            bisect.insort(self.keys, key)
+            self.spellings[key] = Counter()
+        self.counts[key] += 1
+        self.spellings[key][value.strip()] += 1
+
+    def discard(self, value: str):
+        key = normalize(value)
+        if key not in self.counts:
+            return
+        self.counts[key] -= 1
+        spellings = self.spellings[key]
+        spellings[value.strip()] -= 1
+        if spellings[value.strip()] <= 0:
+            del spellings[value.strip()]
+        if self.counts[key] <= 0:
+            del self.counts[key]
+            del self.spellings[key]
+            del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(self.keys, prefix)
+        # U+10FFFF sorts after any character that can follow the prefix
+        end = bisect.bisect_left(self.keys, prefix + "\U0010ffff", start)
+        best = heapq.nsmallest(limit, self.keys[start:end], key=lambda key: (-self.counts[key], key))
+        return [(self.spellings[key].most_common(1)[0][0], self.counts[key]) for key in best]
+
+
+class AutocompleteIndex:
+    """Per-process make and model suggestions weighted by active listing counts.
+
+    Models are indexed globally and per make, so a model prefix can be narrowed
+    to the make already entered.
+    """
+
+    def __init__(self):
+        self.makes = PrefixIndex()
+        self.models = PrefixIndex()
+        self.models_by_make: Dict[str, PrefixIndex] = {}
+        # listing id -> (make, model) as indexed, to undo on update or delete
+        self.listings: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self):
+        return len(self.listings)
+
+    async def load(self, collection):
+        projection = {"_id": 0, "id": 1, "make": 1, "model": 1}
+        async for listing in collection.find({"is_active": True}, projection):
+            self.index(listing)
+        logger.info(f"Autocomplete index loaded with {len(self.makes)} makes and {len(self.models)} models")
+
+    def index(self, listing: Dict[str, Any]):
+        self.remove(listing["id"])
+        if not listing.get("is_active", True):
+            return
+        make = (listing.get("make") or "").strip()
+        model = (listing.get("model") or "").strip()
+        self.listings[listing["id"]] = (make, model)
+        self.makes.add(make)
+        self.models.add(model)
+        if make and model:
+            self.models_by_make.setdefault(normalize(make), PrefixIndex()).add(model)
+
+    def remove(self, listing_id: str):
+        indexed = self.listings.pop(listing_id, None)
+        if indexed is None:
+            return
+        make, model = indexed
+        self.makes.discard(make)
+        self.models.discard(model)
+        make_key = normalize(make)
+        models = self.models_by_make.get(make_key)
+        if models is not None and model:
+            models.discard(model)
+            if not len(models):
+                del self.models_by_make[make_key]
+
+    def complete(self, field: str, prefix: str, make: Optional[str] = None, limit: int = 10) -> List[Tuple[str, int]]:
+        if field == "make":
+            return self.makes.complete(prefix, limit)
+        if make:
+            models = self.models_by_make.get(normalize(make))
+            return models.complete(prefix, limit) if models is not None else []
+        return self.models.complete(prefix, limit)
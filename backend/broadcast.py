@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from change_feed import ListingChange
+
+logger = logging.getLogger(__name__)
+
+# Enough for the listing cards; images are left out of change events altogether
+COMPACT_FIELDS = (
+    "id", "title", "price", "vehicle_type", "make", "model", "year",
+    "mileage", "fuel_type", "location", "created_at", "version",
+)
+
+EVENT_NAMES = {"insert": "new", "update": "updated", "delete": "removed"}
+
+# Queued in place of an event when a subscriber falls too far behind
+RESET = "reset"
+
+
+def compact(listing: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: listing.get(field) for field in COMPACT_FIELDS if field in listing}
+
+
+def default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class Subscription:
+    def __init__(self, vehicle_type: Optional[str], min_price: Optional[float], max_price: Optional[float], max_queue: int):
+        self.vehicle_type = vehicle_type
+        self.min_price = min_price
+        self.max_price = max_price
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(max_queue)
+        self.lagging = False
+
+    def matches(self, listing: Dict[str, Any]) -> bool:
+        if self.vehicle_type and listing.get("vehicle_type") != self.vehicle_type:
+            return False
+        price = listing.get("price")
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        return True
+
+    def offer(self, message: str):
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too slow to keep up: tell the client to refetch rather than buffer without bound
+            self.lagging = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class ListingBroadcaster:
+    """Fans one worker's listing change feed out to its server-sent event subscribers.
+
+    Each change is filtered per subscriber and serialized at most twice (as itself
+    and as a removal), however many subscribers receive it. Subscribers get a
+    bounded queue; one that overflows receives a single reset instead.
+    """
+
+    def __init__(self, max_subscribers: int = 1000, max_queue: int = 100):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self.subscriptions: Set[Subscription] = set()
+        self.sequence = 0
+
+    def subscribe(self, vehicle_type: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None) -> Optional[Subscription]:
+        if len(self.subscriptions) >= self.max_subscribers:
+            return None
+        subscription = Subscription(vehicle_type, min_price, max_price, self.max_queue)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def message(self, event: str, data: Dict[str, Any]) -> str:
+        self.sequence += 1
+        return f"id: {self.sequence}\nevent: {event}\ndata: {json.dumps(data, default=default, separators=(',', ':'))}\n\n"
+
+    def publish(self, change: ListingChange):
+        if not self.subscriptions or change.listing_id is None:
+            return
+        listing = change.listing
+        full = removed = None
+        for subscription in self.subscriptions:
+            if change.op != "delete" and subscription.matches(listing):
+                if full is None:
+                    full = self.message(EVENT_NAMES[change.op], compact(listing))
+                subscription.offer(full)
+            elif change.op != "insert":
+                # Deleted, or updated so that it no longer passes the subscriber's filter
+                if removed is None:
+                    removed = self.message("removed", {"id": change.listing_id})
+                subscription.offer(removed)
@@ -0,0 +1,36 @@
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Small per-process cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if len(self.entries) >= self.max_entries:
+            now = time.monotonic()
+            for stale in [k for k, (expires_at, _) in self.entries.items() if expires_at < now]:
+                del self.entries[stale]
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,239 @@
+import asyncio
+import inspect
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# $changeStream is only supported on replica sets / sharded clusters
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class ListingChange:
+    """Normalized listing write. `op` is "insert", "update" or "delete" (soft deletes included)."""
+
+    __slots__ = ("op", "listing_id", "listing", "timestamp")
+
+    def __init__(self, op: str, listing_id: Optional[str], listing: Optional[Dict[str, Any]], timestamp: datetime):
+        self.op = op
+        self.listing_id = listing_id
+        self.listing = listing
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"ListingChange({self.op}, {self.listing_id})"
+
+
+Subscriber = Callable[[ListingChange], Union[None, Awaitable[None]]]
+
+
+def normalize_change(change: Dict[str, Any]) -> Optional[ListingChange]:
+    operation = change["operationType"]
+    timestamp = change.get("wallTime") or datetime.utcnow()
+    listing = change.get("fullDocument")
+    if operation == "delete":
+        before = change.get("fullDocumentBeforeChange") or {}
+        return ListingChange("delete", before.get("id"), None, timestamp)
+    if operation not in ("insert", "update", "replace"):
+        return None
+    if listing is None:
+        # Updated and then removed before the lookup ran
+        return None
+    listing.pop("_id", None)
+    if not listing.get("is_active", True):
+        return ListingChange("delete", listing["id"], listing, timestamp)
+    return ListingChange("insert" if operation == "insert" else "update", listing["id"], listing, timestamp)
+
+
+class PollWindow:
+    """Watermark and de-duplication state of the polling fallback.
+
+    The app stamps created_at/updated_at/deleted_at before the write commits, so a
+    write can become visible after newer ones have already moved the watermark past
+    its timestamp. Every poll therefore re-scans `lag` behind the watermark, and
+    changes already published inside that window are skipped by (id, changed_at).
+    """
+
+    def __init__(self, watermark: datetime, lag: float):
+        self.watermark = watermark
+        self.lag = timedelta(seconds=lag)
+        self.seen: Dict[Tuple[str, datetime], datetime] = {}
+
+    @property
+    def since(self) -> datetime:
+        return self.watermark - self.lag
+
+    def accept(self, listings: List[Dict[str, Any]]) -> List[ListingChange]:
+        """Changes among `listings` not published yet, oldest first; marks them published."""
+        events = []
+        for listing in listings:
+            listing.pop("_id", None)
+            changed_at = max(
+                listing.get(field) for field in ("created_at", "updated_at", "deleted_at")
+                if listing.get(field) is not None
+            )
+            key = (listing["id"], changed_at)
+            if key in self.seen:
+                continue
+            if not listing.get("is_active", True):
+                op = "delete"
+            elif listing.get("updated_at") is None or changed_at == listing.get("created_at"):
+                op = "insert"
+            else:
+                op = "update"
+            self.seen[key] = changed_at
+            events.append(ListingChange(op, listing["id"], listing, changed_at))
+        events.sort(key=lambda event: event.timestamp)
+        if events:
+            self.watermark = max(self.watermark, events[-1].timestamp)
+        # Keys older than the re-scanned window can never come back
+        since = self.since
+        self.seen = {key: changed_at for key, changed_at in self.seen.items() if changed_at >= since}
+        return events
+
+
+class ListingChangeFeed:
+    """Publishes listing writes from any process to in-process subscribers.
+
+    Uses a change stream where available and persists its resume token in
+    `change_feed_state`, so a restart continues where it left off. On a standalone
+    server it polls `created_at`/`updated_at`/`deleted_at` instead, re-scanning
+    `commit_lag` seconds behind its watermark (see PollWindow).
+
+    Every worker process consumes the feed itself. The state document is keyed by
+    consumer name only, so it survives restarts and rescheduling: a worker resumes
+    from the latest position any worker of the consumer has checkpointed, and
+    subscribers are idempotent, so replaying changes it has already seen is harmless.
+    """
+
+    def __init__(
+        self,
+        db,
+        consumer: str = "listings",
+        poll_interval: float = 2.0,
+        checkpoint_interval: float = 1.0,
+        exclude_fields: Tuple[str, ...] = ("images",),
+        ignore_updates_to: Tuple[str, ...] = (),
+        commit_lag: float = 5.0,
+    ):
+        self.collection = db.listings
+        self.state = db.change_feed_state
+        self.consumer = consumer
+        self.poll_interval = poll_interval
+        self.commit_lag = commit_lag
+        self.checkpoint_interval = checkpoint_interval
+        self.projection = {field: 0 for field in exclude_fields}
+        # Updates that set any of these fields (e.g. view counter flushes) are not published
+        self.ignore_updates_to = ignore_updates_to
+        self.subscribers: List[Subscriber] = []
+        self.task: Optional[asyncio.Task] = None
+        self.mode: Optional[str] = None
+        # Pre-images give delete events their listing id (MongoDB 6.0+)
+        self.pre_images = True
+
+    def subscribe(self, subscriber: Subscriber):
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    async def publish(self, change: ListingChange):
+        for subscriber in self.subscribers:
+            try:
+                result = subscriber(change)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception(f"Change feed subscriber {subscriber!r} failed on {change!r}")
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.watch()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable, falling back to polling")
+                    await self.poll()
+                    return
+                if self.pre_images and "fullDocumentBeforeChange" in str(e):
+                    self.pre_images = False
+                    continue
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Change feed resume point is no longer in the oplog, restarting from now")
+                    await self.save_state({"resume_token": None})
+                    continue
+                logger.exception("Change stream failed, retrying")
+            except PyMongoError:
+                logger.exception("Change stream failed, retrying")
+            await asyncio.sleep(self.poll_interval)
+
+    async def load_state(self) -> Dict[str, Any]:
+        return await self.state.find_one({"_id": self.consumer}) or {}
+
+    async def save_state(self, fields: Dict[str, Any]):
+        # updated_at lets the TTL index remove the documents of consumers that are gone
+        await self.state.update_one({"_id": self.consumer}, {"$set": {**fields, "updated_at": datetime.utcnow()}}, upsert=True)
+
+    async def watch(self):
+        self.mode = "change_stream"
+        token = (await self.load_state()).get("resume_token")
+        pipeline = [
+            {"$match": {f"updateDescription.updatedFields.{field}": {"$exists": False}}}
+            for field in self.ignore_updates_to
+        ]
+        if self.projection:
+            pipeline.append({"$project": {f"fullDocument.{field}": 0 for field in self.projection}})
+        loop = asyncio.get_running_loop()
+        last_checkpoint = loop.time()
+        options = {"full_document_before_change": "whenAvailable"} if self.pre_images else {}
+        async with self.collection.watch(
+            pipeline, full_document="updateLookup", resume_after=token, **options
+        ) as stream:
+            async for change in stream:
+                event = normalize_change(change)
+                if event is not None:
+                    await self.publish(event)
+                # Checkpoint at most once per interval; subscribers are idempotent so a
+                # replay of the last few events after a crash is harmless
+                if loop.time() - last_checkpoint >= self.checkpoint_interval:
+                    await self.save_state({"resume_token": stream.resume_token})
+                    last_checkpoint = loop.time()
+
+    async def poll(self):
+        self.mode = "polling"
+        # Each $or branch is indexed: updated_at by (updated_at, id), created_at and
+        # deleted_at by the app's partial indexes, which the is_active predicates select
+        window = PollWindow((await self.load_state()).get("watermark") or datetime.utcnow(), self.commit_lag)
+        while True:
+            since = window.since
+            query = {"$or": [
+                {"is_active": True, "created_at": {"$gte": since}},
+                {"updated_at": {"$gte": since}},
+                {"is_active": False, "deleted_at": {"$gte": since}},
+            ]}
+            try:
+                changed = await self.collection.find(query, self.projection or None).to_list(None)
+            except PyMongoError:
+                logger.exception("Change feed poll failed")
+                changed = []
+            events = window.accept(changed)
+            for event in events:
+                await self.publish(event)
+            if events:
+                await self.save_state({"watermark": window.watermark})
+            await asyncio.sleep(self.poll_interval)
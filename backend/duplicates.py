@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import random
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# 64 hash functions in 16 bands of 4 rows. Two listings share at least one band with
+# probability 1 - (1 - J^4)^16: 50% at Jaccard 0.45, 99% at 0.7, >99.9% at 0.85.
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.8
+# Text and image fields a fingerprint is computed from
+FINGERPRINT_FIELDS = ("title", "description", "make", "model", "images")
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 64) - 1
+# Fixed seed: signatures are stored, so every process must use the same permutations
+_random = random.Random(0x5EED)
+PERMUTATIONS = [(_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_HASHES)]
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shingles(listing: Dict[str, Any]) -> set:
+    """Word 3-grams of the listing text, plus one feature per distinct image."""
+    words = WORD.findall(" ".join(str(listing.get(field) or "") for field in ("make", "model", "title", "description")).lower())
+    if len(words) < SHINGLE_WORDS:
+        features = {" ".join(words)} if words else set()
+    else:
+        features = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    # Reposts reuse the same photos byte for byte, so a content hash identifies them
+    features.update("image:" + hashlib.blake2b(image.encode(), digest_size=16).hexdigest() for image in listing.get("images") or ())
+    return features
+
+
+def signature(features: set) -> List[int]:
+    hashes = [hash64(feature) for feature in features]
+    if not hashes:
+        return [MAX_HASH] * NUM_HASHES
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+
+def band_keys(values: List[int]) -> List[str]:
+    return [
+        f"{band}:" + hashlib.blake2b(repr(values[band * ROWS:(band + 1) * ROWS]).encode(), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+def fingerprint(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """MinHash signature (packed as bytes) and LSH band keys, stored on the listing."""
+    values = signature(shingles(listing))
+    return {
+        "signature": b"".join(value.to_bytes(8, "big") for value in values),
+        "bands": band_keys(values),
+    }
+
+
+def unpack(packed: bytes) -> List[int]:
+    return [int.from_bytes(packed[i:i + 8], "big") for i in range(0, len(packed), 8)]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two packed signatures."""
+    return sum(x == y for x, y in zip(unpack(a), unpack(b))) / NUM_HASHES
+
+
+async def find_duplicates(
+    collection,
+    listing_fingerprint: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    exclude_id: Optional[str] = None,
+    limit: int = 50,
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """Active listings whose estimated similarity is at least `threshold`, most similar first.
+
+    Candidates share at least one LSH band, which the multikey index on
+    fingerprint.bands finds directly; only they are compared signature by signature.
+    """
+    query = {"is_active": True, "fingerprint.bands": {"$in": listing_fingerprint["bands"]}}
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    projection = {"_id": 0, "id": 1, "seller_id": 1, "title": 1, "created_at": 1, "fingerprint.signature": 1}
+    candidates = await collection.find(query, projection).limit(limit).to_list(limit)
+    matches = []
+    for candidate in candidates:
+        score = similarity(listing_fingerprint["signature"], candidate["fingerprint"]["signature"])
+        if score >= threshold:
+            matches.append((score, candidate))
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return matches
+
+
+async def backfill_fingerprints(collection, batch_size: int = 500) -> int:
+    """Fingerprint active listings written before fingerprints existed."""
+    filled = 0
+    projection = {"_id": 1, **{field: 1 for field in FINGERPRINT_FIELDS}}
+    while True:
+        batch = await collection.find({"is_active": True, "fingerprint": {"$exists": False}}, projection).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await collection.bulk_write(
+            [UpdateOne({"_id": listing["_id"]}, {"$set": {"fingerprint": fingerprint(listing)}}) for listing in batch],
+            ordered=False,
+        )
+        filled += len(batch)
+        if len(batch) < batch_size:
+            break
+    if filled:
+        logger.info(f"Fingerprinted {filled} listings")
+    return filled
+
+
+class DisjointSets:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, key: str) -> str:
+        root = self.parent.setdefault(key, key)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while key != root:
+            key, self.parent[key] = self.parent[key], root
+        return root
+
+    def union(self, a: str, b: str):
+        self.parent[self.find(a)] = self.find(b)
+
+
+async def scan_duplicates(
+    collection,
+    threshold: float = DEFAULT_THRESHOLD,
+    max_bucket: int = 200,
+) -> List[List[Dict[str, Any]]]:
+    """Groups of near-duplicate active listings across the whole catalog, oldest first.
+
+    Buckets are built in MongoDB by unwinding the band keys, so only listings
+    sharing a bucket are ever compared. Buckets larger than `max_bucket` are
+    boilerplate (e.g. empty descriptions) rather than duplicates and are skipped.
+    """
+    buckets = collection.aggregate([
+        {"$match": {"is_active": True, "fingerprint.bands": {"$exists": True}}},
+        {"$project": {"_id": 0, "id": 1, "band": "$fingerprint.bands"}},
+        {"$unwind": "$band"},
+        {"$group": {"_id": "$band", "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1, "$lte": max_bucket}}},
+    ], allowDiskUse=True)
+    pairs = set()
+    async for bucket in buckets:
+        ids = sorted(bucket["ids"])
+        pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    if not pairs:
+        return []
+
+    involved = {listing_id for pair in pairs for listing_id in pair}
+    listings = {}
+    projection = {"_id": 0, "id": 1, "seller_id": 1, "title": 1, "created_at": 1, "fingerprint.signature": 1}
+    async for listing in collection.find({"id": {"$in": list(involved)}}, projection):
+        listings[listing["id"]] = listing
+    groups = DisjointSets()
+    for a, b in pairs:
+        if a in listings and b in listings:
+            if similarity(listings[a]["fingerprint"]["signature"], listings[b]["fingerprint"]["signature"]) >= threshold:
+                groups.union(a, b)
+
+    members: Dict[str, List[Dict[str, Any]]] = {}
+    for listing_id in groups.parent:
+        listing = listings[listing_id]
+        listing.pop("fingerprint", None)
+        members.setdefault(groups.find(listing_id), []).append(listing)
+    result = [
+        sorted(group, key=lambda listing: (listing.get("created_at") or datetime.min, listing["id"]))
+        for group in members.values() if len(group) > 1
+    ]
+    logger.info(f"Duplicate scan compared {len(pairs)} candidate pairs and found {len(result)} groups")
+    return result
+
+
+async def flag_duplicates(collection, groups: List[List[Dict[str, Any]]]) -> int:
+    """Mark every listing but the oldest of each group as a duplicate of the oldest."""
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne({"id": listing["id"], "is_active": True}, {"$set": {"duplicate_of": group[0]["id"], "duplicate_flagged_at": now}})
+        for group in groups for listing in group[1:]
+    ]
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+    return len(updates)
@@ -0,0 +1,161 @@
+import bisect
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 9
+MAX_ZOOM = 22
+
+
+def geohash(latitude: float, longitude: float, precision: int = MAX_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # geohash interleaves bits starting with longitude
+    while len(chars) < precision:
+        bounds, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at `precision`."""
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def precision_for_zoom(zoom: int) -> int:
+    # Roughly four cells per 256px map tile, i.e. clusters about 64px apart
+    zoom = max(0, min(MAX_ZOOM, zoom))
+    return max(1, min(MAX_PRECISION, round(2 * (zoom + 2) / 5)))
+
+
+def cell_range(bbox: Tuple[float, float, float, float], precision: int) -> Tuple[int, int, int, int]:
+    """(first_row, last_row, first_col, last_col) of the cells covering `bbox`."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    height, width = cell_size(precision)
+    first_row = math.floor((min_lat + 90) / height)
+    last_row = min(math.floor((max_lat + 90) / height), round(180 / height) - 1)
+    first_col = math.floor((min_lng + 180) / width)
+    last_col = min(math.floor((max_lng + 180) / width), round(360 / width) - 1)
+    return first_row, last_row, first_col, last_col
+
+
+def cell_count(bbox: Tuple[float, float, float, float], precision: int) -> int:
+    first_row, last_row, first_col, last_col = cell_range(bbox, precision)
+    return max(0, last_row - first_row + 1) * max(0, last_col - first_col + 1)
+
+
+def covering_cells(bbox: Tuple[float, float, float, float], precision: int) -> List[str]:
+    first_row, last_row, first_col, last_col = cell_range(bbox, precision)
+    height, width = cell_size(precision)
+    return [
+        geohash(-90 + (row + 0.5) * height, -180 + (col + 0.5) * width, precision)
+        for row in range(first_row, last_row + 1)
+        for col in range(first_col, last_col + 1)
+    ]
+
+
+class MapIndex:
+    """Per-process geohash index of active listings for clustered map views.
+
+    Points are kept in one list sorted by full-precision geohash. Every listing
+    in a cell shares the cell's geohash prefix, so it occupies one contiguous
+    slice and two bisects give its count, whatever the zoom level.
+    The listing in the middle of the slice stands in for the cluster.
+    """
+
+    def __init__(self, max_cells: int = 1024):
+        self.max_cells = max_cells
+        self.points: List[Tuple[str, str]] = []
+        self.listings: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self):
+        return len(self.listings)
+
+    async def load(self, collection):
+        projection = {"_id": 0, "id": 1, "title": 1, "price": 1, "vehicle_type": 1, "location": 1, "is_active": 1}
+        async for listing in collection.find({"is_active": True}, projection):
+            self.index(listing)
+        logger.info(f"Map index loaded with {len(self.listings)} listings")
+
+    def index(self, listing: Dict[str, Any]):
+        self.remove(listing["id"])
+        location = listing.get("location") or {}
+        try:
+            latitude = float(location["latitude"])
+            longitude = float(location["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if not listing.get("is_active", True) or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return
+        point = (geohash(latitude, longitude), listing["id"])
+        bisect.insort(self.points, point)
+        self.listings[listing["id"]] = {
+            "id": listing["id"],
+            "title": listing.get("title"),
+            "price": listing.get("price"),
+            "vehicle_type": listing.get("vehicle_type"),
+            "latitude": latitude,
+            "longitude": longitude,
+            "geohash": point[0],
+        }
+
+    def remove(self, listing_id: str):
+        listing = self.listings.pop(listing_id, None)
+        if listing is None:
+            return
+        position = bisect.bisect_left(self.points, (listing["geohash"], listing_id))
+        del self.points[position]
+
+    def clusters(self, bbox: Tuple[float, float, float, float], zoom: int) -> Tuple[int, List[Dict[str, Any]]]:
+        precision = precision_for_zoom(zoom)
+        # Counted, not generated: a world view at a high zoom would cover billions of cells
+        while precision > 1 and cell_count(bbox, precision) > self.max_cells:
+            precision -= 1
+        result = []
+        for cell in covering_cells(bbox, precision):
+            start = bisect.bisect_left(self.points, (cell,))
+            # "~" sorts after every base32 character
+            end = bisect.bisect_left(self.points, (cell + "~",))
+            if start == end:
+                continue
+            representative = self.listings[self.points[(start + end) // 2][1]]
+            result.append({
+                "geohash": cell,
+                "count": end - start,
+                "latitude": representative["latitude"],
+                "longitude": representative["longitude"],
+                "listing": {key: representative[key] for key in ("id", "title", "price", "vehicle_type")},
+            })
+        return precision, result
+
+
+def parse_bbox(value: str) -> Optional[Tuple[float, float, float, float]]:
+    """"min_lng,min_lat,max_lng,max_lat" (Leaflet's toBBoxString) clamped to valid coordinates."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    except ValueError:
+        return None
+    if not all(math.isfinite(bound) for bound in (min_lng, min_lat, max_lng, max_lat)):
+        return None
+    if min_lng > max_lng or min_lat > max_lat:
+        return None
+    return max(min_lng, -180.0), max(min_lat, -90.0), min(max_lng, 180.0), min(max_lat, 90.0)
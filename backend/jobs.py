@@ -0,0 +1,56 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, TypeVar
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+T = TypeVar("T")
+
+
+async def acquire_lease(db, name: str, ttl: timedelta) -> bool:
+    """Take or renew a named lease so only one worker across the deployment runs a job."""
+    now = datetime.utcnow()
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"holder": WORKER_ID}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + ttl}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lease, so the upsert collided with its document
+        return False
+    return True
+
+
+async def run_with_retry(name: str, step: Callable[[], Awaitable[T]], first_delay: float = 1.0, max_delay: float = 60.0) -> T:
+    """Run `step` until it succeeds, doubling the pause after each failure up to `max_delay`."""
+    delay = first_delay
+    while True:
+        try:
+            return await step()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"{name} failed, retrying in {delay:g}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+async def run_periodically(db, name: str, interval: float, job: Callable[[], Awaitable[None]], exclusive: bool = True):
+    """Run `job` every `interval` seconds; with `exclusive`, only on the lease holder."""
+    while True:
+        try:
+            if not exclusive or await acquire_lease(db, name, timedelta(seconds=interval * 2)):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Periodic job {name} failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,140 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MIN_COMPARABLES = 8
+# Each level relaxes the comparables until enough are found: (name, same make, same model, max year difference)
+COMPARABLE_LEVELS = (
+    ("make_model", True, True, 2),
+    ("make_model", True, True, 5),
+    ("make", True, False, 3),
+    ("vehicle_type", False, False, 3),
+    ("vehicle_type", False, False, None),
+)
+
+
+def normalize(value: Optional[str]) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def round_price(value: float) -> int:
+    return int(round(value / 100.0)) * 100
+
+
+class MarketSnapshot:
+    """Columnar copy of active listings for price estimates.
+
+    One numpy array per attribute, with make, model and vehicle type stored as
+    integer codes, so a comparable search is a handful of vectorized comparisons
+    over the whole inventory instead of a database query.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.built_at = datetime.utcnow()
+        self.vehicle_types: Dict[str, int] = {}
+        self.makes: Dict[str, int] = {}
+        self.models: Dict[Tuple[str, str], int] = {}
+        n = len(rows)
+        self.price = np.empty(n, dtype=np.float64)
+        self.year = np.empty(n, dtype=np.float64)
+        self.mileage = np.empty(n, dtype=np.float64)
+        self.length = np.empty(n, dtype=np.float64)
+        self.vehicle_type = np.empty(n, dtype=np.int32)
+        self.make = np.empty(n, dtype=np.int32)
+        self.model = np.empty(n, dtype=np.int32)
+        for i, row in enumerate(rows):
+            make = normalize(row.get("make"))
+            self.price[i] = row["price"]
+            self.year[i] = row.get("year") or np.nan
+            self.mileage[i] = row["mileage"] if row.get("mileage") is not None else np.nan
+            self.length[i] = row["length"] if row.get("length") is not None else np.nan
+            self.vehicle_type[i] = self.vehicle_types.setdefault(normalize(row.get("vehicle_type")), len(self.vehicle_types))
+            self.make[i] = self.makes.setdefault(make, len(self.makes))
+            self.model[i] = self.models.setdefault((make, normalize(row.get("model"))), len(self.models))
+
+    def __len__(self):
+        return len(self.price)
+
+    @classmethod
+    async def build(cls, collection) -> "MarketSnapshot":
+        started = time.perf_counter()
+        projection = {"_id": 0, "price": 1, "year": 1, "mileage": 1, "length": 1, "vehicle_type": 1, "make": 1, "model": 1}
+        rows = await collection.find({"is_active": True, "price": {"$gt": 0}}, projection).to_list(None)
+        snapshot = cls(rows)
+        logger.info(f"Market snapshot built with {len(snapshot)} listings in {time.perf_counter() - started:.2f}s")
+        return snapshot
+
+    def comparables(self, vehicle_type: str, make: Optional[str], model: Optional[str], year: int) -> Tuple[str, np.ndarray]:
+        base = self.vehicle_type == self.vehicle_types.get(normalize(vehicle_type), -1)
+        make_key = normalize(make)
+        make_code = self.makes.get(make_key, -1)
+        model_code = self.models.get((make_key, normalize(model)), -1)
+        for name, same_make, same_model, max_years in COMPARABLE_LEVELS:
+            if (same_make and make_code < 0) or (same_model and model_code < 0):
+                continue
+            mask = base
+            if same_model:
+                mask = mask & (self.model == model_code)
+            elif same_make:
+                mask = mask & (self.make == make_code)
+            if max_years is not None:
+                mask = mask & (np.abs(self.year - year) <= max_years)
+            if np.count_nonzero(mask) >= MIN_COMPARABLES:
+                return name, mask
+        return "vehicle_type", base
+
+    def estimate(
+        self,
+        vehicle_type: str,
+        year: int,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        mileage: Optional[float] = None,
+        length: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        level, mask = self.comparables(vehicle_type, make, model, year)
+        count = int(np.count_nonzero(mask))
+        if count < MIN_COMPARABLES:
+            return None
+        prices = self.price[mask]
+        log_price = np.log(prices)
+
+        # log(price) ~ year + mileage + length over the comparables, with missing values
+        # imputed by the comparables' median; a feature is dropped if it carries no signal
+        columns = [np.ones(count)]
+        target = [1.0]
+        for values, requested in ((self.year[mask], year), (self.mileage[mask], mileage), (self.length[mask], length)):
+            known = ~np.isnan(values)
+            if np.count_nonzero(known) < MIN_COMPARABLES:
+                continue
+            median = float(np.median(values[known]))
+            filled = np.where(known, values, median)
+            spread = float(filled.std())
+            if spread == 0:
+                continue
+            columns.append((filled - median) / spread)
+            target.append(((requested if requested is not None else median) - median) / spread)
+        design = np.column_stack(columns)
+
+        if count >= len(columns) + MIN_COMPARABLES:
+            coefficients, *_ = np.linalg.lstsq(design, log_price, rcond=None)
+            predicted = float(np.dot(target, coefficients))
+            residuals = log_price - design @ coefficients
+            low, mid, high = np.percentile(residuals, [25, 50, 75])
+            band = (predicted + low, predicted + mid, predicted + high)
+        else:
+            band = tuple(np.percentile(log_price, [25, 50, 75]))
+
+        return {
+            "estimate": round_price(float(np.exp(band[1]))),
+            "low": round_price(float(np.exp(band[0]))),
+            "high": round_price(float(np.exp(band[2]))),
+            "comparables": count,
+            "comparable_level": level,
+            "snapshot_at": self.built_at,
+        }
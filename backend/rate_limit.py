@@ -0,0 +1,200 @@
+import asyncio
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class RateLimit:
+    """Token bucket budget: `capacity` requests, refilled over `period` seconds."""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.refill_rate = capacity / period
+
+    def __repr__(self):
+        return f"RateLimit({self.capacity}/{self.period:g}s)"
+
+
+def parse_limits(spec: str) -> Dict[str, RateLimit]:
+    # "login=10/60,register=5/600" -> {"login": RateLimit(10, 60), ...}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, budget = item.split("=", 1)
+        capacity, period = budget.split("/", 1)
+        limits[route.strip()] = RateLimit(int(capacity), float(period))
+    return limits
+
+
+def parse_networks(spec: str) -> List[Network]:
+    # "127.0.0.1,10.0.0.0/8" -> [IPv4Network("127.0.0.1/32"), IPv4Network("10.0.0.0/8")]
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+def is_trusted(host: Optional[str], networks: List[Network]) -> bool:
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+class InMemoryBackend:
+    """Per-process buckets; the oldest idle buckets are evicted beyond `max_keys`.
+
+    Every worker keeps its own buckets, so with N workers a client can spend up
+    to N times its budget. Use RedisBackend where the limits must hold exactly.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (float(limit.capacity), now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_rate)
+        if tokens >= cost:
+            self.buckets[key] = (tokens - cost, now)
+            allowed, retry_after = True, 0.0
+        else:
+            self.buckets[key] = (tokens, now)
+            allowed, retry_after = False, (cost - tokens) / limit.refill_rate
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+# KEYS[1] bucket key; ARGV: capacity, refill_rate, cost, now
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBackend:
+    """Buckets shared by all workers; each check is one atomic Lua call."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, limit: RateLimit, cost: int = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(
+            keys=[self.prefix + key],
+            args=[limit.capacity, limit.refill_rate, cost, time.time()],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    async def close(self):
+        await self.redis.close()
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, RateLimit], client_key: Callable[[Request], str]):
+        self.backend = backend
+        self.limits = limits
+        self.client_key = client_key
+
+    def limit(self, route: str, cost: Optional[Callable[[Request], int]] = None):
+        """FastAPI dependency enforcing the budget configured for `route`."""
+
+        async def dependency(request: Request):
+            budget = self.limits.get(route)
+            if budget is None:
+                return
+            # A cost above the capacity could never be paid and would be refused forever
+            weight = min(cost(request), budget.capacity) if cost else 1
+            key = f"{route}:{self.client_key(request)}"
+            try:
+                allowed, retry_after = await self.backend.take(key, budget, weight)
+            except Exception as e:
+                # Fail open: a broken limiter must not take the API down with it
+                logger.warning(f"Rate limiter unavailable: {e}")
+                return
+            if not allowed:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests, please try again later",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+        return dependency
+
+
+class AdmissionState:
+    """Request slots shared between the admission middleware and readiness checks."""
+
+    def __init__(self, max_concurrency: int):
+        self.capacity = max_concurrency
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+    @property
+    def utilization(self) -> float:
+        return self.in_flight / self.capacity
+
+
+class AdmissionControlMiddleware:
+    """Caps concurrently processed requests and sheds the excess with 503.
+
+    Requests wait up to `queue_timeout` seconds for a slot, so short bursts are
+    smoothed while sustained overload is rejected before the event loop saturates.
+    """
+
+    def __init__(self, app, state: AdmissionState, queue_timeout: float = 0.5, exempt_paths=()):
+        self.app = app
+        self.state = state
+        self.queue_timeout = queue_timeout
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await asyncio.wait_for(self.state.slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            response = JSONResponse(
+                {"detail": "Server is busy, please try again shortly"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        self.state.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.in_flight -= 1
+            self.state.slots.release()
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import math
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from search import tokenize
+
+logger = logging.getLogger(__name__)
+
+VEHICLE_TYPES = ("caravan", "motorhome", "camper_van")
+# Text terms per field; make and model weigh most since a matching make says more than a shared word
+TEXT_WEIGHTS = {"make": 3, "model": 3, "title": 2, "description": 1}
+# Only a listing's heaviest terms are kept, which bounds memory per listing
+MAX_TERMS = 32
+CARD_FIELDS = ("id", "title", "price", "vehicle_type", "make", "model", "year", "mileage")
+INTERNED_FIELDS = ("vehicle_type", "make", "model")
+EARTH_RADIUS_KM = 6371.0
+
+# Feature columns: vehicle type one-hot, log price, year, length, log mileage, 3D position.
+# Each is scaled so that one unit is a "noticeable" difference, and centred near typical
+# values so the float32 expansion of the squared distance keeps its precision.
+FEATURES = len(VEHICLE_TYPES) + 4 + 3
+LOG_PRICE_SCALE = 0.3  # ~35% price difference
+LOG_PRICE_CENTER = math.log(30000)
+YEAR_SCALE = 4.0
+YEAR_CENTER = 2010
+LENGTH_SCALE = 1.5  # meters
+LOG_MILEAGE_SCALE = 0.7
+DISTANCE_SCALE_KM = 250.0
+# Added to the squared distance for every feature unknown on either side
+MISSING_PENALTY = 0.25
+# Make is compared for equality: a different make counts as one noticeable difference
+MAKE_MISMATCH = 1.0
+# Listings indexed between two yields to the event loop while loading
+LOAD_BATCH = 500
+
+
+def encode(listing: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Numeric feature vector and known-feature mask of a listing."""
+    values = np.zeros(FEATURES, dtype=np.float32)
+    known = np.zeros(FEATURES, dtype=np.float32)
+    vehicle_type = listing.get("vehicle_type")
+    if vehicle_type in VEHICLE_TYPES:
+        values[VEHICLE_TYPES.index(vehicle_type)] = 1.0
+        known[:len(VEHICLE_TYPES)] = 1.0
+    column = len(VEHICLE_TYPES)
+    scalars = (
+        (math.log(listing["price"]) - LOG_PRICE_CENTER) / LOG_PRICE_SCALE if (listing.get("price") or 0) > 0 else None,
+        (listing["year"] - YEAR_CENTER) / YEAR_SCALE if listing.get("year") else None,
+        listing["length"] / LENGTH_SCALE if listing.get("length") else None,
+        math.log1p(listing["mileage"] / 1000) / LOG_MILEAGE_SCALE if listing.get("mileage") is not None else None,
+    )
+    for offset, value in enumerate(scalars):
+        if value is not None:
+            values[column + offset] = value
+            known[column + offset] = 1.0
+    column += len(scalars)
+    location = listing.get("location") or {}
+    try:
+        latitude = math.radians(float(location["latitude"]))
+        longitude = math.radians(float(location["longitude"]))
+    except (KeyError, TypeError, ValueError):
+        pass
+    else:
+        # Euclidean distance between these points is the chord distance in DISTANCE_SCALE_KM units
+        radius = EARTH_RADIUS_KM / DISTANCE_SCALE_KM
+        values[column:column + 3] = (
+            radius * math.cos(latitude) * math.cos(longitude),
+            radius * math.cos(latitude) * math.sin(longitude),
+            radius * math.sin(latitude),
+        )
+        known[column:column + 3] = 1.0
+    return values, known
+
+
+def make_key(listing: Dict[str, Any]) -> str:
+    return " ".join((listing.get("make") or "").lower().split())
+
+
+def text_terms(listing: Dict[str, Any]) -> List[Tuple[str, int]]:
+    terms = Counter()
+    for field, weight in TEXT_WEIGHTS.items():
+        # Repeating the tokens once per unit of weight keeps the counting loop in C
+        terms.update(tokenize(listing.get(field) or "") * weight)
+    return terms.most_common(MAX_TERMS)
+
+
+class SimilarListings:
+    """Per-process nearest-neighbour index of active listings, updated on every write.
+
+    A query scores every listing at once on the numeric features and make, keeps
+    the closest `candidates`, and re-ranks those by TF-IDF cosine of their text.
+    IDF weights are computed at query time from live document frequencies, so
+    writes never re-weight the index.
+
+    The masked squared distance to a query expands into one matrix-vector product:
+    rows hold [values², values, known] (values are zero where unknown), so the
+    query vector [known, -2 values, values² - penalty * known] gives every row's
+    distance, less the constant penalty * FEATURES, in a single pass.
+    """
+
+    def __init__(self, candidates: int = 200, text_weight: float = 0.4, capacity: int = 1024):
+        self.candidates = candidates
+        self.text_weight = text_weight
+        self.design = np.zeros((capacity, 3 * FEATURES), dtype=np.float32)
+        self.makes = np.full(capacity, -1, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.rows: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.free: List[int] = list(range(capacity - 1, -1, -1))
+        # Makes are compared by code; codes of makes no longer listed are reused
+        self.make_codes: Dict[str, int] = {}
+        self.make_names: Dict[int, str] = {}
+        self.make_counts: Counter = Counter()
+        self.free_make_codes: List[int] = []
+        # Terms are interned strings shared by every listing using them, and are
+        # dropped with their last listing, so the vocabulary tracks the live index
+        self.terms: Dict[int, Dict[str, int]] = {}
+        self.document_frequency: Counter = Counter()
+        self.cards: Dict[int, tuple] = {}
+        # TF-IDF norms are memoized against the index size they were computed for
+        self.norms: Dict[int, float] = {}
+        self.norm_size = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    async def load(self, collection):
+        projection = {field: 1 for field in (*CARD_FIELDS, *TEXT_WEIGHTS, "length", "location")}
+        cursor = collection.find({"is_active": True}, {"_id": 0, **projection}).batch_size(LOAD_BATCH)
+        count = 0
+        async for listing in cursor:
+            self.index(listing)
+            count += 1
+            if count % LOAD_BATCH == 0:
+                # Indexing is CPU bound; yield so requests are served while loading
+                await asyncio.sleep(0)
+        logger.info(f"Similar listings index loaded with {len(self.rows)} listings")
+
+    def grow(self):
+        capacity = len(self.ids)
+        self.design = np.concatenate([self.design, np.zeros_like(self.design)])
+        self.makes = np.concatenate([self.makes, np.full_like(self.makes, -1)])
+        self.active = np.concatenate([self.active, np.zeros_like(self.active)])
+        self.ids.extend([None] * capacity)
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def make_code(self, make: str) -> int:
+        code = self.make_codes.get(make)
+        if code is None:
+            code = self.make_codes[make] = self.free_make_codes.pop() if self.free_make_codes else len(self.make_codes)
+            self.make_names[code] = make
+        self.make_counts[code] += 1
+        return code
+
+    def release_make(self, code: int):
+        self.make_counts[code] -= 1
+        if self.make_counts[code] <= 0:
+            del self.make_counts[code]
+            del self.make_codes[self.make_names.pop(code)]
+            self.free_make_codes.append(code)
+
+    def index(self, listing: Dict[str, Any]):
+        self.remove(listing["id"])
+        if not listing.get("is_active", True):
+            return
+        if not self.free:
+            self.grow()
+        row = self.free.pop()
+        values, known = encode(listing)
+        self.design[row] = np.concatenate([values * values, values, known])
+        make = make_key(listing)
+        self.makes[row] = self.make_code(make) if make else -1
+        self.active[row] = True
+        self.rows[listing["id"]] = row
+        self.ids[row] = listing["id"]
+        terms = {sys.intern(term): count for term, count in text_terms(listing)}
+        self.terms[row] = terms
+        self.document_frequency.update(terms.keys())
+        # Cards are tuples with interned categorical strings to keep the per-listing footprint small
+        self.cards[row] = tuple(
+            sys.intern(listing[field]) if field in INTERNED_FIELDS and isinstance(listing.get(field), str) else listing.get(field)
+            for field in CARD_FIELDS
+        )
+
+    def remove(self, listing_id: str):
+        row = self.rows.pop(listing_id, None)
+        if row is None:
+            return
+        self.active[row] = False
+        self.design[row] = 0
+        if self.makes[row] >= 0:
+            self.release_make(int(self.makes[row]))
+            self.makes[row] = -1
+        self.ids[row] = None
+        self.cards.pop(row, None)
+        self.norms.pop(row, None)
+        for term in self.terms.pop(row):
+            self.document_frequency[term] -= 1
+            if self.document_frequency[term] <= 0:
+                del self.document_frequency[term]
+        self.free.append(row)
+
+    def idf(self, term: str) -> float:
+        return math.log((len(self.rows) + 1) / (self.document_frequency[term] + 1)) + 1
+
+    def norm(self, row: int) -> float:
+        norm = self.norms.get(row)
+        if norm is None:
+            norm = self.norms[row] = math.sqrt(sum((count * self.idf(term)) ** 2 for term, count in self.terms[row].items())) or 1.0
+        return norm
+
+    def similar(self, listing_id: str, limit: int = 6) -> Optional[List[Dict[str, Any]]]:
+        row = self.rows.get(listing_id)
+        if row is None:
+            return None
+        size = len(self.ids)
+        # Squared distance over features known on both sides, plus a penalty for the rest
+        squares, values, known = np.split(self.design[row], 3)
+        query = np.concatenate([known, -2 * values, squares - MISSING_PENALTY * known])
+        # Rounding can leave a tiny negative where the exact distance is zero
+        distance = np.maximum(self.design @ query + MISSING_PENALTY * FEATURES, 0)
+        make = self.makes[row]
+        if make >= 0:
+            distance += np.where(self.makes < 0, MISSING_PENALTY, np.where(self.makes == make, 0.0, MAKE_MISMATCH))
+        else:
+            distance += MISSING_PENALTY
+        distance[~self.active] = np.inf
+        distance[row] = np.inf
+        count = min(self.candidates, len(self.rows) - 1)
+        if count <= 0:
+            return []
+        nearest = np.argpartition(distance, count - 1)[:count] if count < size else np.arange(size)
+        nearest = nearest[np.isfinite(distance[nearest])]
+
+        if abs(len(self.rows) - self.norm_size) > 0.05 * len(self.rows):
+            self.norms.clear()
+            self.norm_size = len(self.rows)
+        # Query weights carry idf twice so the dot product with raw candidate counts is the TF-IDF dot
+        query = {term: count * self.idf(term) ** 2 for term, count in self.terms[row].items()}
+        query_norm = self.norm(row)
+        scored = []
+        for candidate in nearest.tolist():
+            terms = self.terms[candidate]
+            dot = sum(weight * terms[term] for term, weight in query.items() if term in terms)
+            cosine = dot / (self.norm(candidate) * query_norm)
+            numeric = math.exp(-float(distance[candidate]) / 2)
+            scored.append(((1 - self.text_weight) * numeric + self.text_weight * cosine, candidate))
+        scored.sort(reverse=True)
+        return [{**dict(zip(CARD_FIELDS, self.cards[candidate])), "score": round(score, 4)} for score, candidate in scored[:limit]]
@@ -0,0 +1,426 @@
+import functools
+import heapq
+import logging
+import math
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# numpy, imported by the first InMemorySearchBackend: the default mongo backend
+# never loads it, which keeps it off the cold start path
+np = None
+
+
+def import_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+# Field weights are applied as term-frequency multipliers when indexing
+FIELD_WEIGHTS = {"title": 3, "make": 2, "model": 2, "description": 1}
+# Listing fields kept per document, so ranked matches are filtered and faceted without MongoDB
+CATEGORICAL_FIELDS = ("vehicle_type", "fuel_type", "make")
+NUMERIC_FIELDS = ("price", "year")
+
+GERMAN_STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer",
+    "und", "oder", "mit", "ohne", "für", "fur", "von", "vom", "zu", "zum", "zur", "im", "in",
+    "am", "an", "auf", "aus", "bei", "ist", "sind", "wird", "werden", "sehr", "auch",
+    "the", "and", "with", "for", "of", "a", "an", "is",
+}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchMatch:
+    """A search expressed as a Mongo filter clause."""
+
+    ranked = False
+
+    def __init__(self, clause: Dict[str, Any]):
+        self.clause = clause
+
+
+class MongoSearchBackend:
+    """Default backend: case-insensitive regex over the text fields, evaluated by MongoDB."""
+
+    name = "mongo"
+
+    async def load(self, collection):
+        pass
+
+    def index(self, listing: Dict[str, Any]):
+        pass
+
+    def remove(self, listing_id: str):
+        pass
+
+    def match(self, text: str) -> SearchMatch:
+        return SearchMatch({"$or": [
+            {field: {"$regex": text, "$options": "i"}} for field in ("title", "description", "make", "model")
+        ]})
+
+
+# German Snowball stemmer (https://snowballstem.org/algorithms/german/stemmer.html)
+VOWELS = "aeiouyäöü"
+S_ENDING = "bdfghklmnrt"
+ST_ENDING = "bdfghklmnt"
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    def region_after(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = region_after(0)
+    r2 = region_after(r1)
+    return max(r1, 3), r2
+
+
+# Listing text repeats the same words over and over, so stems are memoized
+@functools.lru_cache(maxsize=100000)
+def german_stem(word: str) -> str:
+    word = word.replace("ß", "ss")
+    # u and y between vowels behave as consonants
+    chars = list(word)
+    for i in range(1, len(chars) - 1):
+        if chars[i] in "uy" and chars[i - 1] in VOWELS and chars[i + 1] in VOWELS:
+            chars[i] = chars[i].upper()
+    word = "".join(chars)
+    r1, r2 = _regions(word)
+
+    # Step 1
+    for suffix in ("ern", "em", "er", "en", "es", "e", "s"):
+        if word.endswith(suffix):
+            start = len(word) - len(suffix)
+            if suffix == "s" and (start == 0 or word[start - 1] not in S_ENDING):
+                break
+            if start >= r1:
+                word = word[:start]
+                if suffix in ("en", "es", "e") and word.endswith("niss"):
+                    word = word[:-1]
+            break
+
+    # Step 2
+    for suffix in ("est", "en", "er", "st"):
+        if word.endswith(suffix):
+            start = len(word) - len(suffix)
+            if suffix == "st" and (start < 4 or word[start - 1] not in ST_ENDING):
+                break
+            if start >= r1:
+                word = word[:start]
+            break
+
+    # Step 3
+    for suffix in ("isch", "lich", "heit", "keit", "end", "ung", "ig", "ik"):
+        if not word.endswith(suffix):
+            continue
+        start = len(word) - len(suffix)
+        if start < r2:
+            break
+        if suffix in ("end", "ung"):
+            word = word[:start]
+            if word.endswith("ig") and len(word) - 2 >= r2 and not word.endswith("eig"):
+                word = word[:-2]
+        elif suffix in ("ig", "ik", "isch"):
+            if not word[:start].endswith("e"):
+                word = word[:start]
+        elif suffix in ("lich", "heit"):
+            word = word[:start]
+            for prefix in ("er", "en"):
+                if word.endswith(prefix) and len(word) - 2 >= r1:
+                    word = word[:-2]
+                    break
+        elif suffix == "keit":
+            word = word[:start]
+            for prefix in ("lich", "ig"):
+                if word.endswith(prefix) and len(word) - len(prefix) >= r2:
+                    word = word[:-len(prefix)]
+                    break
+        break
+
+    return word.lower().replace("ä", "a").replace("ö", "o").replace("ü", "u")
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFC", (text or "").lower())
+    return [german_stem(token) for token in TOKEN_RE.findall(text) if token not in GERMAN_STOPWORDS]
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Postings:
+    """Rows containing a term and the term's weighted frequency in each, as growable arrays.
+
+    A query uses the arrays as they are. Removal moves the last entry into the
+    freed slot, so the order of rows is arbitrary.
+    """
+
+    __slots__ = ("rows", "tfs", "size")
+
+    def __init__(self):
+        self.rows = np.empty(4, dtype=np.int32)
+        self.tfs = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, row: int, tf: int):
+        if self.size == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.empty_like(self.rows)])
+            self.tfs = np.concatenate([self.tfs, np.empty_like(self.tfs)])
+        self.rows[self.size] = row
+        self.tfs[self.size] = tf
+        self.size += 1
+
+    def discard(self, row: int):
+        found = np.flatnonzero(self.rows[:self.size] == row)
+        if not len(found):
+            return
+        position, last = int(found[0]), self.size - 1
+        self.rows[position] = self.rows[last]
+        self.tfs[position] = self.tfs[last]
+        self.size = last
+
+
+class RankedMatch(SearchMatch):
+    """Every listing matching a search, with its BM25 score.
+
+    The match set is never truncated: filter clauses and facets are evaluated on
+    the attributes the index keeps per listing, and only the requested page is
+    sorted. Rows are reused as listings come and go, so a match must be used
+    before the index changes, i.e. before the request awaits anything.
+    """
+
+    ranked = True
+
+    def __init__(self, index: "InMemorySearchBackend", rows: "np.ndarray", scores: "np.ndarray"):
+        self.index = index
+        self.rows = rows
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def clause(self) -> Dict[str, Any]:
+        # Only needed when MongoDB orders the matches, e.g. by popularity
+        return {"id": {"$in": [self.index.ids[row] for row in self.rows.tolist()]}}
+
+    def mask(self, clauses: List[Dict[str, Any]]) -> "np.ndarray":
+        """Which matches pass every clause; clauses are equality or $gte/$lte conditions on kept fields."""
+        keep = np.ones(len(self.rows), dtype=bool)
+        for clause in clauses:
+            for field, condition in clause.items():
+                if field in CATEGORICAL_FIELDS:
+                    code = self.index.codes[field].get(condition, -2)
+                    keep &= self.index.categories[field][self.rows] == code
+                elif field in NUMERIC_FIELDS and isinstance(condition, dict) and set(condition) <= {"$gte", "$lte"}:
+                    values = self.index.numbers[field][self.rows]
+                    if "$gte" in condition:
+                        keep &= values >= condition["$gte"]
+                    if "$lte" in condition:
+                        keep &= values <= condition["$lte"]
+                else:
+                    raise ValueError(f"Unsupported search filter on {field}: {condition!r}")
+        return keep
+
+    def page(self, clauses: List[Dict[str, Any]], skip: int, limit: int) -> List[str]:
+        """Listing ids of one page of the matches passing `clauses`, best first."""
+        keep = self.mask(clauses)
+        rows, scores = self.rows[keep], self.scores[keep]
+        end = skip + limit
+        if end <= 0 or skip >= len(rows):
+            return []
+        if end < len(rows):
+            # Everything scoring at least the end-th best, ties included, so pages never overlap
+            threshold = np.partition(scores, len(scores) - end)[len(scores) - end]
+            top = scores >= threshold
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))[skip:end]
+        return [self.index.ids[row] for row in rows[order].tolist()]
+
+    def counts(self, field: str, clauses: List[Dict[str, Any]], limit: int = 50) -> List[Dict[str, Any]]:
+        """Most common values of a categorical field among the matches passing `clauses`."""
+        codes = self.index.categories[field][self.rows[self.mask(clauses)]]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.index.values[field]))
+        best = np.flatnonzero(counts)
+        best = best[np.argsort(-counts[best], kind="stable")][:limit]
+        return [{"value": self.index.values[field][code], "count": int(counts[code])} for code in best.tolist()]
+
+    def buckets(self, field: str, boundaries: List[int], clauses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Counts of a numeric field per [boundary, next boundary), plus "other" outside them."""
+        values = self.index.numbers[field][self.rows[self.mask(clauses)]]
+        values = values[~np.isnan(values)]
+        slots = np.searchsorted(np.asarray(boundaries, dtype=np.float64), values, side="right") - 1
+        inside = (slots >= 0) & (slots < len(boundaries) - 1)
+        counts = np.bincount(slots[inside], minlength=len(boundaries) - 1)
+        buckets = [{"min": boundaries[slot], "count": int(counts[slot])} for slot in np.flatnonzero(counts).tolist()]
+        if not inside.all():
+            buckets.append({"min": "other", "count": int((~inside).sum())})
+        return buckets
+
+
+class InMemorySearchBackend:
+    """Per-process inverted index with BM25 ranking and trigram fuzzy matching.
+
+    Listings are rows of per-listing arrays (length and the filterable fields), and
+    each term's postings are arrays of rows, so a query scores every matching
+    listing with a few vectorized operations per term.
+    """
+
+    name = "memory"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, fuzzy_threshold: float = 0.45, capacity: int = 1024):
+        import_numpy()
+        self.k1 = k1
+        self.b = b
+        self.fuzzy_threshold = fuzzy_threshold
+        self.postings: Dict[str, Postings] = {}
+        self.trigram_index: Dict[str, set] = defaultdict(set)
+        self.doc_terms: Dict[int, Counter] = {}
+        self.lengths = np.zeros(capacity, dtype=np.float32)
+        self.total_length = 0
+        self.rows: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.free: List[int] = list(range(capacity - 1, -1, -1))
+        # Categorical fields are stored as codes into a per-field list of values, -1 when missing
+        self.codes: Dict[str, Dict[str, int]] = {field: {} for field in CATEGORICAL_FIELDS}
+        self.values: Dict[str, List[str]] = {field: [] for field in CATEGORICAL_FIELDS}
+        self.categories = {field: np.full(capacity, -1, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self.numbers = {field: np.full(capacity, np.nan, dtype=np.float64) for field in NUMERIC_FIELDS}
+
+    def __len__(self):
+        return len(self.rows)
+
+    async def load(self, collection):
+        fields = (*FIELD_WEIGHTS, *CATEGORICAL_FIELDS, *NUMERIC_FIELDS)
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+        async for listing in collection.find({"is_active": True}, projection):
+            self.index(listing)
+        logger.info(f"Search index loaded with {len(self.rows)} listings")
+
+    def grow(self):
+        capacity = len(self.ids)
+        self.lengths = np.concatenate([self.lengths, np.zeros_like(self.lengths)])
+        for field, column in self.categories.items():
+            self.categories[field] = np.concatenate([column, np.full_like(column, -1)])
+        for field, column in self.numbers.items():
+            self.numbers[field] = np.concatenate([column, np.full_like(column, np.nan)])
+        self.ids.extend([None] * capacity)
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def code(self, field: str, value: Any) -> int:
+        if not isinstance(value, str):
+            return -1
+        code = self.codes[field].get(value)
+        if code is None:
+            code = self.codes[field][value] = len(self.values[field])
+            self.values[field].append(sys.intern(value))
+        return code
+
+    def index(self, listing: Dict[str, Any]):
+        self.remove(listing["id"])
+        if not listing.get("is_active", True):
+            return
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(listing.get(field) or ""):
+                terms[token] += weight
+        if not self.free:
+            self.grow()
+        row = self.free.pop()
+        self.rows[listing["id"]] = row
+        self.ids[row] = listing["id"]
+        self.doc_terms[row] = terms
+        length = sum(terms.values())
+        self.lengths[row] = length
+        self.total_length += length
+        for field in CATEGORICAL_FIELDS:
+            self.categories[field][row] = self.code(field, listing.get(field))
+        for field in NUMERIC_FIELDS:
+            value = listing.get(field)
+            self.numbers[field][row] = value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = Postings()
+                for gram in trigrams(term):
+                    self.trigram_index[gram].add(term)
+            postings.add(row, tf)
+
+    def remove(self, listing_id: str):
+        row = self.rows.pop(listing_id, None)
+        if row is None:
+            return
+        self.ids[row] = None
+        self.total_length -= int(self.lengths[row])
+        self.lengths[row] = 0
+        for field in CATEGORICAL_FIELDS:
+            self.categories[field][row] = -1
+        for field in NUMERIC_FIELDS:
+            self.numbers[field][row] = np.nan
+        for term in self.doc_terms.pop(row):
+            postings = self.postings[term]
+            postings.discard(row)
+            if not postings:
+                del self.postings[term]
+                for gram in trigrams(term):
+                    self.trigram_index[gram].discard(term)
+        self.free.append(row)
+
+    def expand(self, term: str) -> List[Tuple[str, float]]:
+        """The term itself if indexed, otherwise its closest vocabulary terms by trigram similarity."""
+        if term in self.postings:
+            return [(term, 1.0)]
+        grams = trigrams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_index.get(gram, ()))
+        candidates = []
+        for candidate, overlap in shared.items():
+            similarity = overlap / (len(grams) + len(trigrams(candidate)) - overlap)
+            if similarity >= self.fuzzy_threshold:
+                candidates.append((candidate, similarity))
+        return heapq.nlargest(3, candidates, key=lambda c: c[1])
+
+    def search(self, text: str) -> RankedMatch:
+        n = len(self.rows)
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        if n:
+            average_length = self.total_length / n
+            for term in dict.fromkeys(tokenize(text)):
+                for candidate, weight in self.expand(term):
+                    postings = self.postings[candidate]
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    rows, tfs = postings.rows[:postings.size], postings.tfs[:postings.size]
+                    norms = self.k1 * (1 - self.b + self.b * self.lengths[rows] / average_length)
+                    # A row appears once per term, so the fancy-indexed add never drops a posting
+                    scores[rows] += (weight * idf * (self.k1 + 1)) * tfs / (tfs + norms)
+        # BM25 scores of matching rows are always positive
+        rows = np.flatnonzero(scores)
+        return RankedMatch(self, rows, scores[rows])
+
+    def match(self, text: str) -> RankedMatch:
+        return self.search(text)
+
+
+def create_search_backend(name: str):
+    if name == "memory":
+        try:
+            return InMemorySearchBackend()
+        except ImportError:
+            logger.error("SEARCH_BACKEND=memory needs numpy, which is not installed; using the mongo backend")
+    return MongoSearchBackend()
@@ -0,0 +1,40 @@
+"""Production entry point: multi-worker uvicorn tuned for this app.
+
+Workers are started with multiprocessing's spawn method, so each one imports
+server.py (and creates its own Motor client) after the process split.
+"""
+import importlib.util
+import os
+
+import uvicorn
+
+
+def worker_count() -> int:
+    if os.environ.get("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    try:
+        # Respect CPU limits set through affinity (e.g. docker --cpuset-cpus)
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def main():
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=worker_count(),
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        backlog=int(os.environ.get("BACKLOG", "2048")),
+        # Slightly above nginx's upstream keepalive timeout so nginx closes idle connections first
+        timeout_keep_alive=int(os.environ.get("KEEP_ALIVE_TIMEOUT", "65")),
+        # On SIGTERM: stop accepting, let in-flight requests finish for up to this long
+        timeout_graceful_shutdown=int(os.environ.get("GRACEFUL_SHUTDOWN_TIMEOUT", "30")),
+        access_log=os.environ.get("ACCESS_LOG", "1") == "1",
+    )
+
+
+if __name__ == "__main__":
+    main()
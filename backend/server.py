@@ -1,37 +1,223 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+from bson import json_util
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from cache import TTLCache
+from search import RankedMatch, SearchMatch, create_search_backend
+from change_feed import ListingChange, ListingChangeFeed
+from jobs import run_periodically, run_with_retry
+from archive import archive_inactive_listings
+from rate_limit import (
+    RateLimiter, InMemoryBackend, RedisBackend, AdmissionControlMiddleware, AdmissionState, is_trusted, parse_limits,
+    parse_networks,
+)
+from health import PoolMonitor, LoopLagMonitor
+from views import ViewCounter
+from alerts import SavedSearchIndex, enqueue_alerts, send_alert_digests
+from broadcast import RESET, ListingBroadcaster
+from geo import MAX_ZOOM, MapIndex, parse_bbox
+from autocomplete import AutocompleteIndex
+from syndication import decode_token, feed_lines
+from sitemaps import STATE_ID, regenerate_sitemaps
+from duplicates import DEFAULT_THRESHOLD, FINGERPRINT_FIELDS, find_duplicates, fingerprint
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection. Motor clients must not cross a fork: serve.py's workers are
+# spawned and import this module themselves, so each gets its own client and pool.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_monitor = PoolMonitor()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_monitor])
 db = client[os.environ['DB_NAME']]
 
+# Read routing: anonymous browse traffic may be served by secondaries, bounded by
+# max staleness (MongoDB requires at least 90 seconds). Sellers who just wrote
+# get causally consistent reads of their own changes for a short window.
+READ_MAX_STALENESS_SECONDS = int(os.environ.get("READ_MAX_STALENESS_SECONDS", "90"))
+READ_YOUR_WRITES_WINDOW_SECONDS = int(os.environ.get("READ_YOUR_WRITES_WINDOW_SECONDS", "30"))
+secondary_reads = SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+public_listings = db.get_collection("listings", read_preference=secondary_reads)
+public_users = db.get_collection("users", read_preference=secondary_reads)
+
+# The cluster and operation time of a seller's last write travel in a signed
+# cookie, so whichever worker serves the next read can wait for that write
+READ_MARKER_COOKIE = "read_after"
+READ_MARKER_JSON = json_util.CANONICAL_JSON_OPTIONS
+
 # JWT Configuration
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Listing search: "mongo" (regex, default) or "memory" (in-process ranked inverted index)
+search_backend = create_search_backend(os.environ.get("SEARCH_BACKEND", "mongo"))
+
+# Listing change feed: one invalidation stream for every in-process cache and index,
+# covering writes from other workers and admin scripts as well as our own handlers
+listing_changes = ListingChangeFeed(
+    db,
+    consumer=os.environ.get("CHANGE_FEED_CONSUMER", "listings"),
+    poll_interval=float(os.environ.get("CHANGE_FEED_POLL_SECONDS", "2")),
+    # Polling re-scans this far behind its watermark for writes that committed late
+    commit_lag=float(os.environ.get("CHANGE_FEED_COMMIT_LAG_SECONDS", "5")),
+    # View counter flushes only touch view_count/popularity, which no subscriber uses
+    ignore_updates_to=("popularity",),
+    # Duplicate detection fingerprints are only read by find_duplicates
+    exclude_fields=("images", "fingerprint"),
+)
+
+# Live listing updates: one broadcaster per worker fans the change feed out to all
+# of the worker's server-sent event streams
+listing_broadcaster = ListingBroadcaster(max_subscribers=int(os.environ.get("MAX_STREAM_SUBSCRIBERS", "1000")))
+listing_changes.subscribe(listing_broadcaster.publish)
+STREAM_HEARTBEAT_SECONDS = 15  # below nginx's 30s proxy_read_timeout
+STREAM_RETRY_MS = 5000
+
+# Listing views are counted in memory and flushed in bulk every VIEW_FLUSH_SECONDS
+VIEW_FLUSH_SECONDS = float(os.environ.get("VIEW_FLUSH_SECONDS", "10"))
+view_counter = ViewCounter(db.listings, half_life_hours=float(os.environ.get("POPULARITY_HALF_LIFE_HOURS", "72")))
+
+# Price estimates are computed from a columnar snapshot of active listings, rebuilt
+# every MARKET_SNAPSHOT_MINUTES. market.py (and numpy) is imported by the first
+# build in the background, which keeps it off the cold start path.
+MARKET_SNAPSHOT_MINUTES = float(os.environ.get("MARKET_SNAPSHOT_MINUTES", "15"))
+market_state: Dict[str, Any] = {"snapshot": None}
+
+async def rebuild_market_snapshot():
+    from market import MarketSnapshot
+    market_state["snapshot"] = await MarketSnapshot.build(db.listings)
+
+# Saved searches: new listings are matched against an in-memory index of every
+# saved search, refreshed from the database so searches saved on other workers apply
+saved_search_index = SavedSearchIndex(commit_lag=float(os.environ.get("CHANGE_FEED_COMMIT_LAG_SECONDS", "5")))
+MAX_SAVED_SEARCHES = int(os.environ.get("MAX_SAVED_SEARCHES", "50"))
+SAVED_SEARCH_REFRESH_SECONDS = float(os.environ.get("SAVED_SEARCH_REFRESH_SECONDS", "5"))
+ALERT_DIGEST_HOURS = float(os.environ.get("ALERT_DIGEST_HOURS", "24"))
+SITE_URL = os.environ.get("SITE_URL", "https://rvclassifieds.com")
+
+@listing_changes.subscribe
+def sync_search_index(change: ListingChange):
+    if change.op == "delete":
+        if change.listing_id:
+            search_backend.remove(change.listing_id)
+    else:
+        search_backend.index(change.listing)
+
+# Map clusters are served from a per-worker geohash index of active listings
+map_index = MapIndex()
+
+@listing_changes.subscribe
+def sync_map_index(change: ListingChange):
+    if change.op == "delete":
+        if change.listing_id:
+            map_index.remove(change.listing_id)
+    else:
+        map_index.index(change.listing)
+
+# Make/model suggestions are served from a per-worker prefix index of active listings
+autocomplete_index = AutocompleteIndex()
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+@listing_changes.subscribe
+def sync_autocomplete_index(change: ListingChange):
+    if change.op == "delete":
+        if change.listing_id:
+            autocomplete_index.remove(change.listing_id)
+    else:
+        autocomplete_index.index(change.listing)
+
+# "Similar listings" come from a per-worker nearest-neighbour index. Like the market
+# snapshot, recommend.py (and numpy) is imported during warm-up rather than at import time.
+similar_state: Dict[str, Any] = {"index": None, "loaded": False}
+SIMILAR_LISTINGS_MAX = 24
+
+@listing_changes.subscribe
+def sync_similar_listings(change: ListingChange):
+    index = similar_state["index"]
+    if index is None:
+        return
+    if change.op == "delete":
+        if change.listing_id:
+            index.remove(change.listing_id)
+    else:
+        index.index(change.listing)
+
+# Near-duplicate detection: new listings are fingerprinted (MinHash over text and
+# images) and compared with the active listings sharing an LSH bucket. "flag" marks
+# the repost with duplicate_of; "reject" also refuses a seller's repost of their own
+# listing. Matches across sellers are only ever flagged, never rejected.
+DUPLICATE_POLICY = os.environ.get("DUPLICATE_POLICY", "flag")
+DUPLICATE_THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD))
+
+# Rate limiting: per-route token buckets keyed by user (when authenticated) or client IP
+DEFAULT_RATE_LIMITS = "login=10/60,register=5/600,token-refresh=30/60,contact-seller=5/600,listings=120/60,autocomplete=600/60,feed=60/60"
+# "memory" keeps buckets per worker process; "redis" shares them across workers and hosts
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+# Peers allowed to set X-Real-IP: loopback and the private ranges the proxy sits on
+TRUSTED_PROXIES = parse_networks(
+    os.environ.get("TRUSTED_PROXIES", "127.0.0.0/8,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7")
+)
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "256"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "0.5"))
+
+def client_key(request: Request) -> str:
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    # nginx sets X-Real-IP; from any other peer the header is client supplied and ignored
+    peer = request.client.host if request.client else None
+    ip = request.headers.get("x-real-ip") if is_trusted(peer, TRUSTED_PROXIES) else None
+    return f"ip:{ip or peer or 'unknown'}"
+
+rate_limits = parse_limits(DEFAULT_RATE_LIMITS)
+rate_limits.update(parse_limits(os.environ.get("RATE_LIMITS", "")))
+if RATE_LIMIT_BACKEND == "redis":
+    rate_limit_backend = RedisBackend(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+else:
+    rate_limit_backend = InMemoryBackend()
+rate_limiter = RateLimiter(rate_limit_backend, rate_limits, client_key)
+
+def listings_cost(request: Request) -> int:
+    # Deep pagination costs the database more, so it drains the bucket faster
+    try:
+        skip = int(request.query_params.get("skip", 0))
+    except ValueError:
+        skip = 0
+    return 1 + max(skip, 0) // 100
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -63,6 +249,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class Listing(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -85,6 +275,9 @@ class Listing(BaseModel):
     show_phone: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
+    version: int = 0
+    view_count: int = 0
+    duplicate_of: Optional[str] = None  # listing this one was flagged as a repost of
 
 class ListingCreate(BaseModel):
     title: str
@@ -101,12 +294,109 @@ class ListingCreate(BaseModel):
     images: List[str] = []
     show_phone: bool = False
 
+class ListingUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    vehicle_type: Optional[str] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = None
+    length: Optional[float] = None
+    fuel_type: Optional[str] = None
+    location: Optional[Dict[str, Any]] = None
+    images: Optional[List[str]] = None
+    show_phone: Optional[bool] = None
+
+class ListingSummary(BaseModel):
+    id: str
+    title: str
+    price: float
+    vehicle_type: str
+    make: str
+    model: str
+    year: int
+    mileage: Optional[int] = None
+    length: Optional[float] = None
+    fuel_type: Optional[str] = None
+    location: Dict[str, Any]
+    images: List[str] = []  # first image only, as a thumbnail
+    show_phone: bool = False
+    created_at: datetime
+    is_active: bool = True
+    version: int = 0
+    view_count: int = 0
+
+SUMMARY_PROJECTION = {"_id": 0, "description": 0, "images": {"$slice": 1}}
+
+REQUIRED_LISTING_FIELDS = {name for name, field in ListingCreate.model_fields.items() if field.is_required()} | {"images", "show_phone"}
+
 class ContactMessage(BaseModel):
     listing_id: str
     sender_name: str
     sender_email: EmailStr
     message: str
 
+class ListingBatchRequest(BaseModel):
+    ids: List[str]
+    view: str = "full"
+
+class ListingBatch(BaseModel):
+    listings: List[Union[Listing, ListingSummary]]
+    missing: List[str]  # unknown or no longer active, in request order
+
+class MapCluster(BaseModel):
+    geohash: str
+    count: int
+    latitude: float
+    longitude: float
+    listing: Dict[str, Any]  # representative listing: id, title, price, vehicle_type
+
+class MapView(BaseModel):
+    precision: int
+    clusters: List[MapCluster]
+
+class MarketEstimate(BaseModel):
+    estimate: int
+    low: int  # 25th percentile
+    high: int  # 75th percentile
+    comparables: int
+    comparable_level: str  # make_model, make or vehicle_type
+    snapshot_at: datetime
+
+class Suggestion(BaseModel):
+    value: str
+    count: int  # active listings
+
+class SimilarListing(BaseModel):
+    id: str
+    title: str
+    price: float
+    vehicle_type: str
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    mileage: Optional[int] = None
+    score: float
+
+class SavedSearchCreate(BaseModel):
+    name: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    search_text: Optional[str] = None
+
+class SavedSearch(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    name: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    search_text: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class SearchFilter(BaseModel):
     vehicle_type: Optional[str] = None
     min_price: Optional[float] = None
@@ -135,6 +425,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Refresh tokens are opaque random strings. Only their SHA-256 is stored: they carry
+# enough entropy that a slow password hash would just cost CPU on every refresh.
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+# A refresh token's successor is sealed with a one-time pad derived from the token
+# itself, which only its holder knows. Concurrent refreshes with the same token (two
+# tabs, a retried request) within the grace window get that same successor back.
+REFRESH_TOKEN_GRACE_SECONDS = int(os.environ.get("REFRESH_TOKEN_GRACE_SECONDS", "30"))
+
+def seal_successor(token: str, value: bytes) -> bytes:
+    # XOR with the pad, so sealing twice opens it again
+    pad = hashlib.blake2b(token.encode(), digest_size=64, person=b"refresh-next").digest()
+    return bytes(a ^ b for a, b in zip(value, pad))
+
+async def issue_refresh_token(user_id: str, family_id: Optional[str] = None) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "token_hash": hash_refresh_token(token),
+        "user_id": user_id,
+        # All tokens rotated from one login share a family, revoked together on reuse
+        "family_id": family_id or str(uuid.uuid4()),
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "used_at": None
+    })
+    return token
+
+async def issue_tokens(username: str, user_id: str, family_id: Optional[str] = None, refresh_token: Optional[str] = None) -> Dict[str, str]:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+    if refresh_token is None:
+        refresh_token = await issue_refresh_token(user_id, family_id)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=401,
@@ -154,6 +482,117 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     return User(**user)
 
+# Optional users are only needed to tell sellers from visitors, so they are cached briefly
+optional_user_cache = TTLCache(ttl=int(os.environ.get("OPTIONAL_USER_CACHE_SECONDS", "60")), max_entries=10000)
+
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    if credentials is None:
+        return None
+    try:
+        username = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+    if username is None:
+        return None
+    user = optional_user_cache.get(username)
+    if user is None:
+        found = await db.users.find_one({"username": username})
+        if found is None:
+            return None
+        user = User(**found)
+        optional_user_cache.set(username, user)
+    return user
+
+# Read-your-writes helpers
+def remember_write(response: Response, session):
+    if session.cluster_time is None or session.operation_time is None:
+        # Standalone server: every read goes to the primary anyway
+        return
+    marker = jwt.encode({
+        "cluster_time": json_util.dumps(session.cluster_time, json_options=READ_MARKER_JSON),
+        "operation_time": json_util.dumps(session.operation_time, json_options=READ_MARKER_JSON),
+        "exp": datetime.utcnow() + timedelta(seconds=READ_YOUR_WRITES_WINDOW_SECONDS),
+    }, SECRET_KEY, algorithm=ALGORITHM)
+    response.set_cookie(
+        READ_MARKER_COOKIE, marker, max_age=READ_YOUR_WRITES_WINDOW_SECONDS, path="/api", httponly=True, samesite="lax"
+    )
+
+def read_marker(request: Request) -> Optional[tuple]:
+    cookie = request.cookies.get(READ_MARKER_COOKIE)
+    if not cookie:
+        return None
+    try:
+        # Signed, so a client cannot make reads wait for an operation time that never comes
+        marker = jwt.decode(cookie, SECRET_KEY, algorithms=[ALGORITHM])
+        return (
+            json_util.loads(marker["cluster_time"], json_options=READ_MARKER_JSON),
+            json_util.loads(marker["operation_time"], json_options=READ_MARKER_JSON),
+        )
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
+@asynccontextmanager
+async def write_session(response: Response):
+    async with await client.start_session(causal_consistency=True) as session:
+        yield session
+        remember_write(response, session)
+
+@asynccontextmanager
+async def read_session(request: Request):
+    marker = read_marker(request)
+    if marker is None:
+        yield None
+        return
+    cluster_time, operation_time = marker
+    async with await client.start_session(causal_consistency=True) as session:
+        # Secondaries wait until they have applied the seller's write before answering
+        session.advance_cluster_time(cluster_time)
+        session.advance_operation_time(operation_time)
+        yield session
+
+# Seller details are stored once on the user and resolved for listings at read time
+SELLER_FIELDS = ("seller_name", "seller_email", "seller_phone")
+LEGACY_SELLER_COPY = {field: "" for field in SELLER_FIELDS}
+DELETED_SELLER = {"seller_name": "Gelöschter Benutzer", "seller_email": "deleted@deleted.local", "seller_phone": None}
+seller_cache = TTLCache(ttl=int(os.environ.get("SELLER_CACHE_SECONDS", "60")), max_entries=10000)
+
+def seller_fields(user: Dict[str, Any]) -> Dict[str, Any]:
+    if not user.get("is_active", True):
+        return dict(DELETED_SELLER)
+    return {"seller_name": user["full_name"], "seller_email": user["email"], "seller_phone": user.get("phone")}
+
+class SellerLoader:
+    """Request-scoped loader resolving the sellers of a batch of listings with one $in query."""
+
+    def __init__(self):
+        self.sellers: Dict[str, Dict[str, Any]] = {}
+
+    async def attach(self, listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        missing = set()
+        for listing in listings:
+            seller_id = listing["seller_id"]
+            if seller_id not in self.sellers:
+                cached = seller_cache.get(seller_id)
+                if cached is None:
+                    missing.add(seller_id)
+                else:
+                    self.sellers[seller_id] = cached
+        if missing:
+            users = await public_users.find(
+                {"id": {"$in": list(missing)}},
+                {"_id": 0, "id": 1, "full_name": 1, "email": 1, "phone": 1, "is_active": 1}
+            ).to_list(None)
+            for user in users:
+                fields = seller_fields(user)
+                seller_cache.set(user["id"], fields)
+                self.sellers[user["id"]] = fields
+        for listing in listings:
+            listing.update(self.sellers.get(listing["seller_id"], DELETED_SELLER))
+        return listings
+
+def storable_listing(listing: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in listing.items() if key not in SELLER_FIELDS}
+
 # Email sending function (simple SMTP - can be enhanced with proper email service)
 async def send_email(to_email: str, subject: str, body: str, from_email: str = "noreply@rvclassifieds.com"):
     try:
@@ -167,35 +606,72 @@ async def send_email(to_email: str, subject: str, body: str, from_email: str = "
         return False
 
 # Authentication routes
-@api_router.post("/register", response_model=dict)
+@api_router.post("/register", response_model=dict, dependencies=[Depends(rate_limiter.limit("register"))])
 async def register(user: UserCreate):
-    # Check if user already exists
-    existing_user = await db.users.find_one({"$or": [{"username": user.username}, {"email": user.email}]})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username or email already registered")
-    
-    # Hash password and create user
-    hashed_password = get_password_hash(user.password)
+    # Hash password off the event loop; bcrypt is deliberately slow
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
     user_dict = user.dict()
     del user_dict["password"]
     user_obj = User(**user_dict)
     user_data = user_obj.dict()
     user_data["hashed_password"] = hashed_password
     
-    result = await db.users.insert_one(user_data)
+    # The unique username/email indexes reject duplicates atomically
+    try:
+        await db.users.insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username or email already registered")
     return {"message": "User registered successfully", "user_id": user_obj.id}
 
-@api_router.post("/login", response_model=Token)
+@api_router.post("/login", response_model=Token, dependencies=[Depends(rate_limiter.limit("login"))])
 async def login(user: UserLogin):
     db_user = await db.users.find_one({"username": user.username})
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+    if not db_user or not await run_in_threadpool(verify_password, user.password, db_user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await issue_tokens(user.username, db_user["id"])
+
+@api_router.post("/token/refresh", response_model=Token, dependencies=[Depends(rate_limiter.limit("token-refresh"))])
+async def refresh_access_token(request: RefreshRequest):
+    token_hash = hash_refresh_token(request.refresh_token)
+    now = datetime.utcnow()
+    stored = await db.refresh_tokens.find_one({"token_hash": token_hash, "used_at": None, "expires_at": {"$gt": now}})
+    if stored is not None:
+        db_user = await db.users.find_one({"id": stored["user_id"], "is_active": True})
+        if not db_user:
+            raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+        # The successor is stored before the token is marked used, so a token marked
+        # used always has a successor that can be handed out again
+        successor = await issue_refresh_token(db_user["id"], stored["family_id"])
+        # Rotation: each refresh token can be exchanged once; its successor is recorded with it
+        rotated = await db.refresh_tokens.update_one(
+            {"_id": stored["_id"], "used_at": None},
+            {"$set": {"used_at": now, "successor": seal_successor(request.refresh_token, successor.encode())}}
+        )
+        if rotated.modified_count:
+            return await issue_tokens(db_user["username"], db_user["id"], stored["family_id"], refresh_token=successor)
+        # A concurrent refresh rotated it first; hand out its successor instead
+        await db.refresh_tokens.delete_one({"token_hash": hash_refresh_token(successor)})
+    
+    stored = await db.refresh_tokens.find_one({"token_hash": token_hash, "used_at": {"$ne": None}})
+    if stored is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    if not stored.get("successor") or now - stored["used_at"] > timedelta(seconds=REFRESH_TOKEN_GRACE_SECONDS):
+        # A rotated token came back: assume it was stolen and end the whole session
+        await db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    successor = seal_successor(request.refresh_token, stored["successor"]).decode()
+    db_user = await db.users.find_one({"id": stored["user_id"], "is_active": True})
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    return await issue_tokens(db_user["username"], db_user["id"], stored["family_id"], refresh_token=successor)
+
+@api_router.post("/logout")
+async def logout(request: RefreshRequest):
+    stored = await db.refresh_tokens.find_one({"token_hash": hash_refresh_token(request.refresh_token)})
+    if stored:
+        await db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+    return {"message": "Logged out successfully"}
 
 @api_router.get("/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
@@ -203,100 +679,584 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 # Listing routes
 @api_router.post("/listings", response_model=Listing)
-async def create_listing(listing_data: ListingCreate, current_user: User = Depends(get_current_user)):
+async def create_listing(listing_data: ListingCreate, response: Response, current_user: User = Depends(get_current_user)):
     listing_dict = listing_data.dict()
     listing_dict["seller_id"] = current_user.id
-    listing_dict["seller_name"] = current_user.full_name
-    listing_dict["seller_email"] = current_user.email
-    listing_dict["seller_phone"] = current_user.phone
+    listing_dict.update(seller_fields(current_user.dict()))
     
     listing_obj = Listing(**listing_dict)
-    result = await db.listings.insert_one(listing_obj.dict())
+    stored = storable_listing(listing_obj.dict())
+    stored["updated_at"] = listing_obj.created_at
+    stored["fingerprint"] = fingerprint(stored)
+    if DUPLICATE_POLICY in ("flag", "reject"):
+        duplicates = await find_duplicates(db.listings, stored["fingerprint"], DUPLICATE_THRESHOLD)
+        own = [match for score, match in duplicates if match["seller_id"] == current_user.id]
+        if own and DUPLICATE_POLICY == "reject":
+            raise HTTPException(status_code=409, detail=f"You already have a listing for this vehicle: {own[0]['id']}")
+        if duplicates:
+            score, original = duplicates[0]
+            stored.update(duplicate_of=original["id"], duplicate_score=score, duplicate_flagged_at=datetime.utcnow())
+            listing_obj.duplicate_of = original["id"]
+            logger.info(f"Listing {listing_obj.id} flagged as duplicate of {original['id']} ({score:.2f})")
+    async with write_session(response) as session:
+        await db.listings.insert_one(stored, session=session)
+    await bump_listing_counts(current_user.id, active=1)
+    try:
+        await enqueue_alerts(db, saved_search_index, listing_obj.dict())
+    except PyMongoError as e:
+        # The listing is live either way; only the saved search alerts are lost
+        logger.warning(f"Could not enqueue saved search alerts for listing {listing_obj.id}: {e}")
     return listing_obj
 
-@api_router.get("/listings", response_model=List[Listing])
+def build_listing_filters(
+    vehicle_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    search: Optional[SearchMatch] = None
+) -> Dict[str, Dict[str, Any]]:
+    # Filters are kept per facet dimension so each facet can ignore its own filter
+    filters = {}
+    if vehicle_type:
+        filters["vehicle_type"] = {"vehicle_type": vehicle_type}
+    if min_price is not None or max_price is not None:
+        price = {}
+        if min_price is not None:
+            price["$gte"] = min_price
+        if max_price is not None:
+            price["$lte"] = max_price
+        filters["price"] = {"price": price}
+    # A ranked match filters itself in memory; see get_listings for when it needs a clause
+    if search is not None and not search.ranked:
+        filters["search"] = search.clause
+    return filters
+
+def combine_filters(filters: Dict[str, Dict[str, Any]], exclude: Optional[str] = None) -> Dict[str, Any]:
+    query = {"is_active": True}
+    for dimension, clause in filters.items():
+        if dimension != exclude:
+            query.update(clause)
+    return query
+
+# Facet counts
+FACET_CACHE_SECONDS = int(os.environ.get("FACET_CACHE_SECONDS", "60"))
+YEAR_BUCKETS = [0, 1990, 2000, 2005, 2010, 2015, 2020, 10000]
+PRICE_BUCKETS = [0, 10000, 20000, 30000, 50000, 75000, 100000, 150000, 10 ** 12]
+facet_cache = TTLCache(ttl=FACET_CACHE_SECONDS, max_entries=16)
+listing_changes.subscribe(lambda change: facet_cache.clear())
+
+class ListingPage(BaseModel):
+    listings: List[Listing]
+    facets: Dict[str, List[Dict[str, Any]]]
+
+def facet_pipeline(filters: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def branch(dimension: Optional[str], stages: List[Dict[str, Any]]):
+        # Disjunctive faceting: a facet's counts ignore the filter on its own field.
+        # The search clause is shared by every branch and applied before $facet.
+        match = {}
+        for name, clause in filters.items():
+            if name not in (dimension, "search"):
+                match.update(clause)
+        return ([{"$match": match}] if match else []) + stages
+
+    def counts(field: str, limit: int = 50):
+        return [
+            {"$match": {field: {"$ne": None}}},
+            {"$sortByCount": f"${field}"},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "value": "$_id", "count": 1}}
+        ]
+
+    def buckets(field: str, boundaries: List[int]):
+        return [
+            {"$match": {field: {"$type": "number"}}},
+            {"$bucket": {"groupBy": f"${field}", "boundaries": boundaries, "default": "other"}},
+            {"$project": {"_id": 0, "min": "$_id", "count": 1}}
+        ]
+
+    return [
+        {"$match": {"is_active": True, **filters.get("search", {})}},
+        {"$facet": {
+            "vehicle_type": branch("vehicle_type", counts("vehicle_type")),
+            "fuel_type": branch(None, counts("fuel_type")),
+            "make": branch(None, counts("make", limit=20)),
+            "year": branch(None, buckets("year", YEAR_BUCKETS)),
+            "price": branch("price", buckets("price", PRICE_BUCKETS))
+        }}
+    ]
+
+def label_buckets(facets: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    for field, boundaries in (("year", YEAR_BUCKETS), ("price", PRICE_BUCKETS)):
+        upper = dict(zip(boundaries, boundaries[1:]))
+        for bucket in facets.get(field, []):
+            bucket["max"] = upper.get(bucket["min"])
+    return facets
+
+async def get_facets(filters: Dict[str, Dict[str, Any]], session=None) -> Dict[str, List[Dict[str, Any]]]:
+    if not filters:
+        cached = facet_cache.get("unfiltered")
+        if cached is not None:
+            return cached
+    result = await public_listings.aggregate(facet_pipeline(filters), session=session).to_list(1)
+    facets = label_buckets(result[0] if result else {})
+    if not filters:
+        facet_cache.set("unfiltered", facets)
+    return facets
+
+def other_clauses(filters: Dict[str, Dict[str, Any]], exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+    return [clause for dimension, clause in filters.items() if dimension not in (exclude, "search")]
+
+def ranked_facets(search: RankedMatch, filters: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    # The facets of facet_pipeline, counted in memory over every match of a ranked search
+    return label_buckets({
+        "vehicle_type": search.counts("vehicle_type", other_clauses(filters, "vehicle_type")),
+        "fuel_type": search.counts("fuel_type", other_clauses(filters)),
+        "make": search.counts("make", other_clauses(filters), limit=20),
+        "year": search.buckets("year", YEAR_BUCKETS, other_clauses(filters)),
+        "price": search.buckets("price", PRICE_BUCKETS, other_clauses(filters, "price")),
+    })
+
+async def fetch_ranked_page(page_ids: List[str], session=None):
+    # The search index has already filtered and ordered the page; fetch it and keep that order
+    if not page_ids:
+        return []
+    listings = await public_listings.find({"id": {"$in": page_ids}, "is_active": True}, session=session).to_list(len(page_ids))
+    position = {listing_id: i for i, listing_id in enumerate(page_ids)}
+    return sorted(listings, key=lambda listing: position[listing["id"]])
+
+LISTING_SORTS = {
+    "newest": [("created_at", -1)],
+    # Listings never viewed have no popularity and sort last
+    "popular": [("popularity", -1), ("created_at", -1)],
+}
+
+@api_router.get(
+    "/listings",
+    response_model=Union[List[Listing], ListingPage],
+    dependencies=[Depends(rate_limiter.limit("listings", listings_cost))]
+)
 async def get_listings(
+    request: Request,
     skip: int = 0,
     limit: int = 20,
     vehicle_type: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    search_text: Optional[str] = None
+    search_text: Optional[str] = None,
+    include_facets: bool = False,
+    sort: str = "newest",
+    sellers: SellerLoader = Depends(SellerLoader)
 ):
-    query = {"is_active": True}
+    if sort not in LISTING_SORTS:
+        raise HTTPException(status_code=400, detail="sort must be one of: newest, popular")
+    search = search_backend.match(search_text) if search_text else None
+    filters = build_listing_filters(vehicle_type, min_price, max_price, search)
+    ranked = search is not None and search.ranked
+    # A ranked match must be used before the index changes, so page and facets are taken right away
+    ranked_page = search.page(other_clauses(filters), skip, limit) if ranked and sort == "newest" else None
+    facets = ranked_facets(search, filters) if ranked and include_facets else None
+    if ranked and ranked_page is None:
+        # Popularity order comes from MongoDB, which needs every match as an id list
+        filters["search"] = search.clause
     
-    if vehicle_type:
-        query["vehicle_type"] = vehicle_type
-    if min_price is not None:
-        query["price"] = query.get("price", {})
-        query["price"]["$gte"] = min_price
-    if max_price is not None:
-        query["price"] = query.get("price", {})
-        query["price"]["$lte"] = max_price
-    if search_text:
-        query["$or"] = [
-            {"title": {"$regex": search_text, "$options": "i"}},
-            {"description": {"$regex": search_text, "$options": "i"}},
-            {"make": {"$regex": search_text, "$options": "i"}},
-            {"model": {"$regex": search_text, "$options": "i"}}
-        ]
+    async with read_session(request) as session:
+        # Ranked search results keep relevance order unless popularity was asked for
+        if ranked_page is not None:
+            page = fetch_ranked_page(ranked_page, session=session)
+        else:
+            page = public_listings.find(combine_filters(filters), session=session).skip(skip).limit(limit).sort(LISTING_SORTS[sort]).to_list(limit)
+        if not include_facets:
+            listings = await sellers.attach(await page)
+            return [Listing(**listing) for listing in listings]
+        if facets is not None:
+            listings = await page
+        elif session is None:
+            listings, facets = await asyncio.gather(page, get_facets(filters))
+        else:
+            # A session must not run concurrent operations
+            listings = await page
+            facets = await get_facets(filters, session=session)
+    await sellers.attach(listings)
+    return ListingPage(listings=[Listing(**listing) for listing in listings], facets=facets)
+
+@api_router.get("/listings/stream", dependencies=[Depends(rate_limiter.limit("listings"))])
+async def stream_listings(
+    vehicle_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    # Server-sent events: "new" and "updated" carry a compact listing (no images),
+    # "removed" only the id; "reset" means events were lost and the client should refetch
+    subscription = listing_broadcaster.subscribe(vehicle_type, min_price, max_price)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many live listing streams", headers={"Retry-After": "30"})
     
-    listings = await db.listings.find(query).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
-    return [Listing(**listing) for listing in listings]
+    async def events():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line so idle streams are not closed by proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                if message == RESET:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                yield message
+        finally:
+            listing_broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/listings/map", response_model=MapView, dependencies=[Depends(rate_limiter.limit("listings"))])
+async def get_listing_map(bbox: str, zoom: int, response: Response):
+    # bbox is "min_lng,min_lat,max_lng,max_lat"; clusters come from memory, not MongoDB
+    bounds = parse_bbox(bbox)
+    if bounds is None:
+        raise HTTPException(status_code=400, detail="bbox must be finite min_lng,min_lat,max_lng,max_lat with min <= max")
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"zoom must be between 0 and {MAX_ZOOM}")
+    precision, clusters = map_index.clusters(bounds, zoom)
+    response.headers["Cache-Control"] = "public, max-age=30"
+    return MapView(precision=precision, clusters=clusters)
+
+# Favorites and compare pages: many listings by id in one query
+LISTING_BATCH_MAX = 100
+
+async def fetch_listing_batch(ids: List[str], view: str, request: Request, sellers: SellerLoader) -> ListingBatch:
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="view must be one of: full, summary")
+    ids = list(dict.fromkeys(listing_id for listing_id in ids if listing_id))
+    if len(ids) > LISTING_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {LISTING_BATCH_MAX} ids per request")
+    if not ids:
+        return ListingBatch(listings=[], missing=[])
+    
+    projection = SUMMARY_PROJECTION if view == "summary" else None
+    async with read_session(request) as session:
+        found = await public_listings.find({"id": {"$in": ids}, "is_active": True}, projection, session=session).to_list(len(ids))
+    by_id = {listing["id"]: listing for listing in found}
+    listings = [by_id[listing_id] for listing_id in ids if listing_id in by_id]
+    missing = [listing_id for listing_id in ids if listing_id not in by_id]
+    if view == "summary":
+        return ListingBatch(listings=[ListingSummary(**listing) for listing in listings], missing=missing)
+    await sellers.attach(listings)
+    return ListingBatch(listings=[Listing(**listing) for listing in listings], missing=missing)
+
+@api_router.get("/listings/batch", response_model=ListingBatch, dependencies=[Depends(rate_limiter.limit("listings"))])
+async def get_listing_batch(
+    ids: str,
+    request: Request,
+    view: str = "full",
+    sellers: SellerLoader = Depends(SellerLoader)
+):
+    # ids is comma separated; use the POST variant when the list outgrows a URL
+    return await fetch_listing_batch(ids.split(","), view, request, sellers)
+
+@api_router.post("/listings/batch", response_model=ListingBatch, dependencies=[Depends(rate_limiter.limit("listings"))])
+async def post_listing_batch(
+    batch: ListingBatchRequest,
+    request: Request,
+    sellers: SellerLoader = Depends(SellerLoader)
+):
+    return await fetch_listing_batch(batch.ids, batch.view, request, sellers)
 
 @api_router.get("/listings/{listing_id}", response_model=Listing)
-async def get_listing(listing_id: str):
-    listing = await db.listings.find_one({"id": listing_id, "is_active": True})
+async def get_listing(
+    listing_id: str,
+    request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_optional_user),
+    sellers: SellerLoader = Depends(SellerLoader)
+):
+    async with read_session(request) as session:
+        listing = await public_listings.find_one({"id": listing_id, "is_active": True}, session=session)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
+    if current_user is None or current_user.id != listing["seller_id"]:
+        view_counter.record(listing_id)
+    response.headers["ETag"] = listing_etag(listing)
+    await sellers.attach([listing])
     return Listing(**listing)
 
-@api_router.get("/my-listings", response_model=List[Listing])
-async def get_my_listings(current_user: User = Depends(get_current_user)):
-    listings = await db.listings.find({"seller_id": current_user.id}).sort("created_at", -1).to_list(100)
-    return [Listing(**listing) for listing in listings]
+@api_router.get("/listings/{listing_id}/similar", response_model=List[SimilarListing], dependencies=[Depends(rate_limiter.limit("listings"))])
+async def get_similar_listings(listing_id: str, response: Response, limit: int = 6):
+    if not 1 <= limit <= SIMILAR_LISTINGS_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SIMILAR_LISTINGS_MAX}")
+    index = similar_state["index"]
+    if index is None or not similar_state["loaded"]:
+        raise HTTPException(status_code=503, detail="Similar listings are not available yet", headers={"Retry-After": "30"})
+    similar = index.similar(listing_id, limit)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return [SimilarListing(**listing) for listing in similar]
+
+# Seller dashboard
+MY_LISTINGS_STATUS = {"active": {"is_active": True}, "deleted": {"is_active": False}, "all": {}}
+MY_LISTINGS_MAX_LIMIT = 100
+
+class MyListingsPage(BaseModel):
+    listings: List[Union[Listing, ListingSummary]]
+    next_cursor: Optional[str] = None
+    total: int
+    counts: Dict[str, int]
+
+def encode_cursor(listing: Dict[str, Any]) -> str:
+    position = {"created_at": listing["created_at"].isoformat(), "id": listing["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(position["created_at"])
+        listing_id = position["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Keyset pagination: strictly after the last listing of the previous page
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": listing_id}}
+    ]}
+
+# Per-seller listing counts are kept up to date by the write handlers, so the
+# dashboard never needs a count_documents over the seller's whole inventory.
+# Every change also bumps "writes", which the one-off backfill checks against.
+COUNT_BACKFILL_ATTEMPTS = 3
+
+async def bump_listing_counts(seller_id: str, active: int = 0, deleted: int = 0):
+    # Upserted, so a seller whose counter does not exist yet still records the write
+    await db.seller_listing_counts.update_one(
+        {"_id": seller_id}, {"$inc": {"active": active, "deleted": deleted, "writes": 1}}, upsert=True
+    )
+
+async def get_listing_counts(seller_id: str) -> Dict[str, int]:
+    for _ in range(COUNT_BACKFILL_ATTEMPTS):
+        counts = await db.seller_listing_counts.find_one({"_id": seller_id})
+        if counts is not None and counts.get("backfilled"):
+            return {"active": counts["active"], "deleted": counts["deleted"]}
+        # First dashboard visit for this seller: count the listings once. The count is
+        # only stored if no write bumped the counter meanwhile, as it may have missed it.
+        writes = counts.get("writes", 0) if counts else 0
+        grouped = await db.listings.aggregate([
+            {"$match": {"seller_id": seller_id}},
+            {"$group": {"_id": "$is_active", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        by_status = {group["_id"]: group["count"] for group in grouped}
+        totals = {"active": by_status.get(True, 0), "deleted": by_status.get(False, 0)}
+        try:
+            await db.seller_listing_counts.update_one(
+                {"_id": seller_id, "writes": writes if writes else {"$in": [0, None]}},
+                {"$set": {**totals, "backfilled": True}},
+                upsert=True
+            )
+            return totals
+        except DuplicateKeyError:
+            # A write changed the counter since it was read; count again
+            continue
+    # Listings keep changing: answer with the last count and store one on a later visit
+    return totals
+
+@api_router.get("/my-listings", response_model=MyListingsPage)
+async def get_my_listings(
+    status: str = "all",
+    view: str = "full",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if status not in MY_LISTINGS_STATUS:
+        raise HTTPException(status_code=400, detail="status must be one of: active, deleted, all")
+    if view not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="view must be one of: full, summary")
+    limit = max(1, min(limit, MY_LISTINGS_MAX_LIMIT))
+    
+    query = {"seller_id": current_user.id, **MY_LISTINGS_STATUS[status]}
+    if cursor:
+        query.update(decode_cursor(cursor))
+    projection = SUMMARY_PROJECTION if view == "summary" else None
+    # Fetch one extra listing to know whether another page follows
+    listings, counts = await asyncio.gather(
+        db.listings.find(query, projection).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1),
+        get_listing_counts(current_user.id)
+    )
+    next_cursor = encode_cursor(listings[limit - 1]) if len(listings) > limit else None
+    listings = listings[:limit]
+    
+    if view == "summary":
+        page = [ListingSummary(**listing) for listing in listings]
+    else:
+        seller = seller_fields(current_user.dict())
+        page = [Listing(**{**listing, **seller}) for listing in listings]
+    total = counts["active"] + counts["deleted"] if status == "all" else counts[status]
+    return MyListingsPage(listings=page, next_cursor=next_cursor, total=total, counts=counts)
+
+# Optimistic concurrency: every write bumps `version`, exposed to clients as the ETag
+def listing_etag(listing: Dict[str, Any]) -> str:
+    return f'"{listing.get("version", 0)}"'
+
+def version_filter(if_match: Optional[str]) -> Dict[str, Any]:
+    if if_match is None or if_match.strip() == "*":
+        return {}
+    try:
+        version = int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+    # Listings written before versioning have no version field
+    return {"version": {"$in": [0, None]}} if version == 0 else {"version": version}
+
+async def raise_write_conflict(listing_id: str, owner_query: Dict[str, Any], if_match: Optional[str], action: str):
+    # Only reached when the single-round-trip write matched nothing
+    if version_filter(if_match) and await db.listings.count_documents(owner_query, limit=1):
+        raise HTTPException(status_code=412, detail="Listing was modified by another request")
+    raise HTTPException(status_code=404, detail=f"Listing not found or you don't have permission to {action} it")
 
 @api_router.put("/listings/{listing_id}", response_model=Listing)
 async def update_listing(
     listing_id: str, 
     listing_data: ListingCreate, 
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
 ):
-    # Check if listing exists and belongs to current user
-    existing_listing = await db.listings.find_one({"id": listing_id, "seller_id": current_user.id})
-    if not existing_listing:
-        raise HTTPException(status_code=404, detail="Listing not found or you don't have permission to edit it")
-    
-    # Update listing
+    # Ownership check and update in one round trip
+    owner_query = {"id": listing_id, "seller_id": current_user.id}
     listing_dict = listing_data.dict()
     listing_dict["seller_id"] = current_user.id
-    listing_dict["seller_name"] = current_user.full_name
-    listing_dict["seller_email"] = current_user.email
-    listing_dict["seller_phone"] = current_user.phone
     listing_dict["updated_at"] = datetime.utcnow()
+    listing_dict["fingerprint"] = fingerprint(listing_dict)
     
-    await db.listings.update_one({"id": listing_id}, {"$set": listing_dict})
+    async with write_session(response) as session:
+        updated_listing = await db.listings.find_one_and_update(
+            {**owner_query, **version_filter(if_match)},
+            # Drop seller copies left on listings written before sellers were referenced
+            {"$set": listing_dict, "$unset": LEGACY_SELLER_COPY, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+    if not updated_listing:
+        await raise_write_conflict(listing_id, owner_query, if_match, "edit")
+    response.headers["ETag"] = listing_etag(updated_listing)
+    return Listing(**{**updated_listing, **seller_fields(current_user.dict())})
+
+# Attempts at a fingerprinted PATCH while other writes keep changing the listing
+PATCH_FINGERPRINT_ATTEMPTS = 3
+
+@api_router.patch("/listings/{listing_id}", response_model=Listing)
+async def patch_listing(
+    listing_id: str,
+    listing_data: ListingUpdate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    # Only the fields the client sent are written, so images need not be re-uploaded
+    changes = listing_data.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    cleared = [field for field, value in changes.items() if value is None and field in REQUIRED_LISTING_FIELDS]
+    if cleared:
+        raise HTTPException(status_code=422, detail=f"Fields cannot be null: {', '.join(cleared)}")
+    changes["updated_at"] = datetime.utcnow()
     
-    # Return updated listing
-    updated_listing = await db.listings.find_one({"id": listing_id})
-    return Listing(**updated_listing)
+    owner_query = {"id": listing_id, "seller_id": current_user.id, "is_active": True}
+    # The fingerprint also covers fields the patch may not carry. Those are read
+    # first, and the write only applies to the version they were read from, so
+    # listing and fingerprint change together in one update.
+    missing = [field for field in FINGERPRINT_FIELDS if field not in changes]
+    refingerprint = len(missing) < len(FINGERPRINT_FIELDS)
+    updated_listing = None
+    async with write_session(response) as session:
+        for _ in range(PATCH_FINGERPRINT_ATTEMPTS):
+            query = {**owner_query, **version_filter(if_match)}
+            if refingerprint:
+                current = await db.listings.find_one(query, {"_id": 0, "version": 1, **{field: 1 for field in missing}}, session=session)
+                if current is None:
+                    break
+                changes["fingerprint"] = fingerprint({**current, **changes})
+                query["version"] = current["version"] if current.get("version") else {"$in": [0, None]}
+            updated_listing = await db.listings.find_one_and_update(
+                query,
+                {"$set": changes, "$unset": LEGACY_SELLER_COPY, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if updated_listing or not refingerprint or if_match is not None:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="Listing is being edited by another request, please retry")
+    if not updated_listing:
+        await raise_write_conflict(listing_id, owner_query, if_match, "edit")
+    response.headers["ETag"] = listing_etag(updated_listing)
+    return Listing(**{**updated_listing, **seller_fields(current_user.dict())})
 
 @api_router.delete("/listings/{listing_id}")
-async def delete_listing(listing_id: str, current_user: User = Depends(get_current_user)):
-    # Check if listing exists and belongs to current user
-    existing_listing = await db.listings.find_one({"id": listing_id, "seller_id": current_user.id})
-    if not existing_listing:
-        raise HTTPException(status_code=404, detail="Listing not found or you don't have permission to delete it")
-    
-    # Soft delete by setting is_active to False
-    await db.listings.update_one(
-        {"id": listing_id}, 
-        {"$set": {"is_active": False, "deleted_at": datetime.utcnow()}}
+async def delete_listing(
+    listing_id: str,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    # Soft delete by setting is_active to False; the filter doubles as the ownership check
+    owner_query = {"id": listing_id, "seller_id": current_user.id}
+    now = datetime.utcnow()
+    result = await db.listings.update_one(
+        {**owner_query, "is_active": True, **version_filter(if_match)},
+        {"$set": {"is_active": False, "deleted_at": now, "updated_at": now}, "$inc": {"version": 1}}
     )
+    if result.matched_count == 0:
+        # Deleting twice is not an error, but must not be counted twice
+        if await db.listings.count_documents({**owner_query, "is_active": False}, limit=1):
+            return {"message": "Listing deleted successfully"}
+        await raise_write_conflict(listing_id, {**owner_query, "is_active": True}, if_match, "delete")
+    await bump_listing_counts(current_user.id, active=-1, deleted=1)
     
     return {"message": "Listing deleted successfully"}
 
-@api_router.post("/contact-seller")
+# Saved searches
+@api_router.post("/saved-searches", response_model=SavedSearch)
+async def create_saved_search(search_data: SavedSearchCreate, current_user: User = Depends(get_current_user)):
+    criteria = search_data.dict(exclude={"name"})
+    if all(value in (None, "") for value in criteria.values()):
+        raise HTTPException(status_code=400, detail="A saved search needs at least one filter")
+    if search_data.min_price is not None and search_data.max_price is not None and search_data.min_price > search_data.max_price:
+        raise HTTPException(status_code=400, detail="min_price must not exceed max_price")
+    if await db.saved_searches.count_documents({"user_id": current_user.id, "is_active": True}) >= MAX_SAVED_SEARCHES:
+        raise HTTPException(status_code=400, detail=f"You can save at most {MAX_SAVED_SEARCHES} searches")
+    
+    saved_search = SavedSearch(user_id=current_user.id, **search_data.dict())
+    document = {**saved_search.dict(), "is_active": True, "updated_at": saved_search.created_at}
+    await db.saved_searches.insert_one(document)
+    saved_search_index.add(document)
+    return saved_search
+
+@api_router.get("/saved-searches", response_model=List[SavedSearch])
+async def get_saved_searches(current_user: User = Depends(get_current_user)):
+    return await db.saved_searches.find(
+        {"user_id": current_user.id, "is_active": True}, {"_id": 0}
+    ).sort("created_at", -1).to_list(MAX_SAVED_SEARCHES)
+
+@api_router.delete("/saved-searches/{search_id}")
+async def delete_saved_search(search_id: str, current_user: User = Depends(get_current_user)):
+    # Soft delete so other workers see the removal on their next refresh; the
+    # deleted_at TTL index purges it afterwards
+    now = datetime.utcnow()
+    result = await db.saved_searches.update_one(
+        {"id": search_id, "user_id": current_user.id, "is_active": True},
+        {"$set": {"is_active": False, "updated_at": now, "deleted_at": now}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    saved_search_index.remove(search_id)
+    await db.alert_queue.delete_many({"search_id": search_id})
+    return {"message": "Saved search deleted successfully"}
+
+@api_router.post("/contact-seller", dependencies=[Depends(rate_limiter.limit("contact-seller"))])
 async def contact_seller(message_data: ContactMessage):
     # Get listing details
     listing = await db.listings.find_one({"id": message_data.listing_id, "is_active": True})
@@ -316,13 +1276,71 @@ async def contact_seller(message_data: ContactMessage):
     You can reply directly to this email to respond to the inquiry.
     """
     
-    email_sent = await send_email(listing["seller_email"], subject, body)
+    # Read from the primary: a seller not yet replicated must not look deleted
+    seller = await db.users.find_one({"id": listing["seller_id"], "is_active": {"$ne": False}}, {"_id": 0, "email": 1})
+    if not seller:
+        raise HTTPException(status_code=404, detail="Seller not found")
+    email_sent = await send_email(seller["email"], subject, body)
     
     if email_sent:
         return {"message": "Message sent successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to send message")
 
+# Market price estimate for sellers, served from the in-memory snapshot
+@api_router.get("/market/estimate", response_model=MarketEstimate, dependencies=[Depends(rate_limiter.limit("listings"))])
+async def get_market_estimate(
+    vehicle_type: str,
+    year: int,
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    mileage: Optional[int] = None,
+    length: Optional[float] = None
+):
+    snapshot = market_state["snapshot"]
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Market data is not available yet", headers={"Retry-After": "30"})
+    estimate = snapshot.estimate(vehicle_type, year, make=make, model=model, mileage=mileage, length=length)
+    if estimate is None:
+        raise HTTPException(status_code=404, detail="Not enough comparable listings for an estimate")
+    return MarketEstimate(**estimate)
+
+# Delta feed for partner portals: every listing change after a continuation token,
+# in change order, as NDJSON. Changes younger than FEED_SETTLE_SECONDS are held back
+# until writes stamped before them have committed. Read from the primary: a lagging
+# secondary could hide a change that the token has already moved past.
+FEED_MAX_LIMIT = 1000
+FEED_SETTLE_SECONDS = float(os.environ.get("FEED_SETTLE_SECONDS", "5"))
+
+@api_router.get("/feed/listings", dependencies=[Depends(rate_limiter.limit("feed"))])
+async def listing_feed(since: Optional[str] = None, limit: int = 500, images: bool = True):
+    if not 1 <= limit <= FEED_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {FEED_MAX_LIMIT}")
+    position = None
+    if since:
+        position = decode_token(since)
+        if position is None:
+            raise HTTPException(status_code=400, detail="Invalid since token")
+        # Deletions older than that have been archived out of the collection
+        if position[0] < datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS):
+            raise HTTPException(status_code=410, detail="since token has expired, sync again without since")
+    return StreamingResponse(
+        feed_lines(db.listings, position, limit, FEED_SETTLE_SECONDS, include_images=images),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+# Make/model autocomplete, one request per keystroke, answered from memory
+@api_router.get("/autocomplete", response_model=List[Suggestion], dependencies=[Depends(rate_limiter.limit("autocomplete"))])
+async def autocomplete(field: str, response: Response, prefix: str = "", make: Optional[str] = None, limit: int = 10):
+    if field not in ("make", "model"):
+        raise HTTPException(status_code=400, detail="field must be one of: make, model")
+    if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {AUTOCOMPLETE_MAX_LIMIT}")
+    suggestions = autocomplete_index.complete(field, prefix, make=make, limit=limit)
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return [Suggestion(value=value, count=count) for value, count in suggestions]
+
 # Vehicle types endpoint
 @api_router.get("/vehicle-types")
 async def get_vehicle_types():
@@ -348,11 +1366,15 @@ async def export_user_data(current_user: User = Depends(get_current_user)):
             "is_active": current_user.is_active
         },
         "listings": [],
+        "saved_searches": await db.saved_searches.find(
+            {"user_id": current_user.id, "is_active": True}, {"_id": 0, "is_active": 0, "updated_at": 0}
+        ).to_list(None),
         "export_date": datetime.utcnow().isoformat()
     }
     
-    # Get user's listings
-    listings = await db.listings.find({"seller_id": current_user.id}).to_list(1000)
+    # Get user's listings, including ones already moved to the archive
+    listings = await db.listings.find({"seller_id": current_user.id}, {"fingerprint": 0}).to_list(1000)
+    listings += await db.listings_archive.find({"seller_id": current_user.id}, {"fingerprint": 0}).to_list(1000)
     for listing in listings:
         # Remove internal fields
         listing.pop("_id", None)
@@ -379,19 +1401,39 @@ async def delete_user_account(current_user: User = Depends(get_current_user)):
             }
         )
         
-        # Deactivate all user's listings
+        # End all sessions
+        await db.refresh_tokens.delete_many({"user_id": current_user.id})
+        
+        # Stop saved search alerts
+        now = datetime.utcnow()
+        await db.saved_searches.update_many(
+            {"user_id": current_user.id, "is_active": True},
+            {"$set": {"is_active": False, "updated_at": now, "deleted_at": now}}
+        )
+        await db.alert_queue.delete_many({"user_id": current_user.id})
+        
+        # Deactivate all user's listings and scrub seller copies left on older listings
         await db.listings.update_many(
             {"seller_id": current_user.id},
             {
                 "$set": {
                     "is_active": False,
-                    "deleted_at": datetime.utcnow(),
-                    "seller_name": "Gelöschter Benutzer",
-                    "seller_email": "deleted@deleted.local",
-                    "seller_phone": None
-                }
+                    "deleted_at": now,
+                    "updated_at": now
+                },
+                "$unset": LEGACY_SELLER_COPY
             }
         )
+        seller_cache.pop(current_user.id)
+        optional_user_cache.pop(current_user.username)
+        await db.seller_listing_counts.update_one(
+            {"_id": current_user.id},
+            [{"$set": {
+                "deleted": {"$add": ["$deleted", "$active"]},
+                "active": 0,
+                "writes": {"$add": [{"$ifNull": ["$writes", 0]}, 1]}
+            }}]
+        )
         
         return {"message": "Account successfully deleted"}
     except Exception as e:
@@ -458,15 +1500,15 @@ async def update_consent(
     return {"message": "Consent preferences updated successfully"}
 @api_router.get("/stats")
 async def get_stats():
-    total_listings = await db.listings.count_documents({"is_active": True})
-    total_users = await db.users.count_documents({"is_active": True})
+    total_listings = await public_listings.count_documents({"is_active": True})
+    total_users = await public_users.count_documents({"is_active": True})
     
     # Group by vehicle type
     pipeline = [
         {"$match": {"is_active": True}},
         {"$group": {"_id": "$vehicle_type", "count": {"$sum": 1}}}
     ]
-    vehicle_counts = await db.listings.aggregate(pipeline).to_list(10)
+    vehicle_counts = await public_listings.aggregate(pipeline).to_list(10)
     
     return {
         "total_listings": total_listings,
@@ -485,6 +1527,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it wraps everything and sheds load before any other work is done.
+# Event streams stay open indefinitely, so they are capped by the broadcaster instead.
+admission = AdmissionState(MAX_CONCURRENT_REQUESTS)
+app.add_middleware(
+    AdmissionControlMiddleware,
+    state=admission,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    exempt_paths=("/healthz", "/readyz", "/api/listings/stream"),
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -492,6 +1544,229 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ACTIVE_LISTING_INDEXES = {
+    "active_created_at": [("created_at", -1)],
+    "active_vehicle_type_created_at": [("vehicle_type", 1), ("created_at", -1)],
+    "active_price": [("price", 1)],
+    "active_popularity": [("popularity", -1), ("created_at", -1)],
+    "active_fingerprint_bands": [("fingerprint.bands", 1)],
+    # Listing lookups by id, and the id ranges sitemap shards are rendered from
+    "active_id": [("id", 1)],
+}
+# Full indexes of earlier deployments (mongo-init.js only runs on fresh volumes), replaced
+# by the partial ones above, (seller_id, created_at, id) and (updated_at, id)
+REPLACED_LISTING_INDEXES = ("created_at_-1", "vehicle_type_1", "price_1", "seller_id_1", "updated_at_1")
+
+async def ensure_indexes():
+    # Declared here as well as in mongo-init.js so every deployment gets them;
+    # registration relies on the unique user indexes to reject duplicate sign-ups,
+    # and seller lookups for listings resolve users by id
+    for field in ("username", "email", "id"):
+        try:
+            await db.users.create_index(field, unique=True)
+        except OperationFailure as e:
+            logger.error(f"Could not create unique index on users.{field}, clean up duplicates: {e}")
+    await db.refresh_tokens.create_index("token_hash", unique=True)
+    await db.refresh_tokens.create_index("family_id")
+    await db.refresh_tokens.create_index("user_id")
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    
+    # Nearly every listing query filters on is_active: True, so the browse indexes only
+    # cover live inventory and do not grow with soft-deleted listings
+    for name, keys in ACTIVE_LISTING_INDEXES.items():
+        try:
+            await db.listings.create_index(keys, name=name, partialFilterExpression={"is_active": True})
+        except OperationFailure:
+            # The server refuses a second index on the same keys: replace the full one
+            full_name = "_".join(f"{field}_{direction}" for field, direction in keys)
+            try:
+                await db.listings.drop_index(full_name)
+                await db.listings.create_index(keys, name=name, partialFilterExpression={"is_active": True})
+            except OperationFailure as e:
+                logger.warning(f"Could not create partial index {name}: {e}")
+    await db.listings.create_index([("seller_id", 1), ("created_at", -1), ("id", -1)])
+    await db.listings.create_index(
+        "deleted_at", name="inactive_deleted_at", partialFilterExpression={"is_active": False}
+    )
+    await db.listings.create_index([("updated_at", 1), ("id", 1)])
+    # Only dropped once their replacements exist, so queries never lose their index
+    for name in REPLACED_LISTING_INDEXES:
+        try:
+            await db.listings.drop_index(name)
+        except OperationFailure:
+            pass
+    # One change feed state document per consumer; those of consumers no longer running expire
+    await db.change_feed_state.create_index("updated_at", expireAfterSeconds=24 * 3600)
+    # Listings written before updated_at was stamped on create and delete
+    await db.listings.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": {"$ifNull": ["$deleted_at", "$created_at"]}}}]
+    )
+    await db.listings_archive.create_index("seller_id")
+    await db.saved_searches.create_index([("user_id", 1), ("created_at", -1)])
+    await db.saved_searches.create_index("updated_at")
+    await db.saved_searches.create_index("deleted_at", expireAfterSeconds=7 * 24 * 3600)
+    await db.alert_queue.create_index("search_id")
+    await db.alert_queue.create_index("user_id")
+
+background_tasks: List[asyncio.Task] = []
+
+# Health checks: /healthz only says the process and its event loop are alive;
+# /readyz says whether this worker should receive traffic. Neither touches listings.
+READY_PING_TIMEOUT = float(os.environ.get("READY_PING_TIMEOUT", "1.0"))
+READY_MAX_UTILIZATION = float(os.environ.get("READY_MAX_UTILIZATION", "0.9"))
+HEALTH_MAX_LOOP_LAG = float(os.environ.get("HEALTH_MAX_LOOP_LAG", "5.0"))
+loop_lag = LoopLagMonitor()
+startup_state = {"indexes": False, "search_index": False, "map_index": False, "autocomplete": False, "saved_searches": False}
+
+@app.get("/healthz")
+async def healthz():
+    status_code = 200 if loop_lag.lag < HEALTH_MAX_LOOP_LAG else 503
+    return JSONResponse({"status": "ok" if status_code == 200 else "stalled", "loop_lag": round(loop_lag.lag, 4)}, status_code=status_code)
+
+@app.get("/readyz")
+async def readyz():
+    checks = {}
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=READY_PING_TIMEOUT)
+        checks["mongo"] = True
+    except Exception:
+        checks["mongo"] = False
+    max_pool_size = client.options.pool_options.max_pool_size
+    pool_utilization = pool_monitor.checked_out / max_pool_size if max_pool_size else 0.0
+    checks["mongo_pool"] = pool_utilization < READY_MAX_UTILIZATION
+    checks["request_slots"] = admission.utilization < READY_MAX_UTILIZATION
+    checks.update(startup_state)
+    ready = all(checks.values())
+    return JSONResponse({
+        "status": "ready" if ready else "not_ready",
+        "checks": checks,
+        "mongo_pool_utilization": round(pool_utilization, 3),
+        "request_slot_utilization": round(admission.utilization, 3),
+        "loop_lag": round(loop_lag.lag, 4)
+    }, status_code=200 if ready else 503)
+
+# Sitemaps for crawlers: an index plus one gzipped shard per leading hex digits of the
+# listing id. One worker re-renders the shards with changes every SITEMAP_INTERVAL_MINUTES
+# and stores them precompressed in MongoDB; every worker serves them as stored.
+SITEMAP_INTERVAL_MINUTES = float(os.environ.get("SITEMAP_INTERVAL_MINUTES", "15"))
+# Minimum id prefix length (16 shards); longer prefixes are used as the catalogue grows
+SITEMAP_PREFIX_LENGTH = int(os.environ.get("SITEMAP_PREFIX_LENGTH", "1"))
+sitemap_cache = TTLCache(ttl=300, max_entries=16 ** SITEMAP_PREFIX_LENGTH + 1)
+
+async def sitemap_response(name: str, media_type: str) -> Response:
+    cached = sitemap_cache.get(name)
+    if cached is None:
+        if name == "sitemap.xml":
+            state = await db.sitemaps.find_one({"_id": STATE_ID}, {"index": 1, "generated_at": 1})
+            cached = (state["index"], state["generated_at"]) if state and state.get("index") else None
+        else:
+            shard = await db.sitemaps.find_one({"_id": name}, {"body": 1, "generated_at": 1})
+            cached = (shard["body"], shard["generated_at"]) if shard else None
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Sitemap not found")
+        sitemap_cache.set(name, cached)
+    body, generated_at = cached
+    return Response(content=body, media_type=media_type, headers={
+        "Cache-Control": "public, max-age=3600",
+        "Last-Modified": format_datetime(generated_at.replace(tzinfo=timezone.utc), usegmt=True),
+    })
+
+@app.get("/sitemap.xml")
+async def sitemap_index():
+    return await sitemap_response("sitemap.xml", "application/xml")
+
+@app.get("/sitemap-{prefix}.xml.gz")
+async def sitemap_shard(prefix: str):
+    return await sitemap_response(f"sitemap-{prefix}.xml.gz", "application/gzip")
+
+async def warm_up():
+    # Runs after the server starts accepting connections; /readyz reports progress.
+    # Every step is retried with backoff, so a MongoDB hiccup delays readiness
+    # instead of ending warm-up and leaving the worker unready for good.
+    await run_with_retry("Creating indexes", ensure_indexes)
+    startup_state["indexes"] = True
+    try:
+        from recommend import SimilarListings
+    except ImportError as e:
+        # Optional feature: /similar keeps answering 503, everything else starts normally
+        logger.error(f"Similar listings disabled, recommend.py could not be imported: {e}")
+    else:
+        similar_state["index"] = SimilarListings()
+    # Start consuming changes before the initial load so no write falls in between
+    await listing_changes.start()
+    # Loaders index listings by id, so a retry after a partial load is harmless
+    await run_with_retry("Loading the search index", lambda: search_backend.load(db.listings))
+    startup_state["search_index"] = True
+    await run_with_retry("Loading the map index", lambda: map_index.load(db.listings))
+    startup_state["map_index"] = True
+    await run_with_retry("Loading the autocomplete index", lambda: autocomplete_index.load(db.listings))
+    startup_state["autocomplete"] = True
+    # Not part of readiness: estimates answer 503 until the first snapshot exists
+    background_tasks.append(asyncio.create_task(run_periodically(
+        db, "market_snapshot", MARKET_SNAPSHOT_MINUTES * 60, rebuild_market_snapshot, exclusive=False
+    )))
+    await run_with_retry("Loading saved searches", lambda: saved_search_index.load(db.saved_searches))
+    startup_state["saved_searches"] = True
+    # Not part of readiness either: /similar answers 503 until this is loaded
+    if similar_state["index"] is not None:
+        await run_with_retry("Loading the similar listings index", lambda: similar_state["index"].load(db.listings))
+        similar_state["loaded"] = True
+
+@app.on_event("startup")
+async def start_warm_up():
+    loop_lag.start()
+    background_tasks.append(asyncio.create_task(warm_up()))
+
+# Soft-deleted listings older than ARCHIVE_AFTER_DAYS move to listings_archive
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", "24"))
+
+@app.on_event("startup")
+async def schedule_archiver():
+    if ARCHIVE_INTERVAL_HOURS > 0:
+        background_tasks.append(asyncio.create_task(run_periodically(
+            db, "archive_inactive_listings", ARCHIVE_INTERVAL_HOURS * 3600,
+            lambda: archive_inactive_listings(db, ARCHIVE_AFTER_DAYS)
+        )))
+
+@app.on_event("startup")
+async def schedule_view_flush():
+    # Every worker flushes its own buffer, so no lease
+    background_tasks.append(asyncio.create_task(run_periodically(
+        db, "flush_listing_views", VIEW_FLUSH_SECONDS, view_counter.flush, exclusive=False
+    )))
+
+@app.on_event("startup")
+async def schedule_saved_search_alerts():
+    async def refresh_saved_searches():
+        if startup_state["saved_searches"]:
+            await saved_search_index.refresh(db.saved_searches)
+    
+    background_tasks.append(asyncio.create_task(run_periodically(
+        db, "refresh_saved_searches", SAVED_SEARCH_REFRESH_SECONDS, refresh_saved_searches, exclusive=False
+    )))
+    if ALERT_DIGEST_HOURS > 0:
+        background_tasks.append(asyncio.create_task(run_periodically(
+            db, "send_alert_digests", ALERT_DIGEST_HOURS * 3600,
+            lambda: send_alert_digests(db, send_email, site_url=SITE_URL)
+        )))
+
+@app.on_event("startup")
+async def schedule_sitemaps():
+    if SITEMAP_INTERVAL_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(run_periodically(
+            db, "regenerate_sitemaps", SITEMAP_INTERVAL_MINUTES * 60,
+            lambda: regenerate_sitemaps(db, SITE_URL, SITEMAP_PREFIX_LENGTH)
+        )))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    loop_lag.stop()
+    await view_counter.flush()
+    await listing_changes.stop()
     client.close()
+    if RATE_LIMIT_BACKEND == "redis":
+        await rate_limit_backend.close()
@@ -0,0 +1,152 @@
+import itertools
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+HEX = "0123456789abcdef"
+STATE_ID = "_state"
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+# The protocol's limit per sitemap file
+MAX_URLS = 50000
+# Shards are sized for half the limit, leaving room to grow between runs
+TARGET_URLS = MAX_URLS // 2
+
+
+def shard_prefixes(prefix_length: int) -> List[str]:
+    """Listing ids are UUIDs, so their leading hex digits split listings evenly into shards."""
+    return ["".join(chars) for chars in itertools.product(HEX, repeat=prefix_length)]
+
+
+def prefix_length_for(count: int, minimum: int = 1) -> int:
+    """Shortest id prefix that splits `count` listings into shards of about TARGET_URLS."""
+    prefix_length = minimum
+    while count > TARGET_URLS * 16 ** prefix_length:
+        prefix_length += 1
+    return prefix_length
+
+
+def shard_name(prefix: str) -> str:
+    return f"sitemap-{prefix}.xml.gz"
+
+
+def w3c_datetime(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+async def render_shard(collection, prefix: str, site_url: str):
+    """Gzipped urlset of the active listings whose id starts with `prefix`.
+
+    Listings are streamed from the id index and compressed as they arrive, so
+    neither the listings nor the uncompressed XML are ever held in memory.
+    Returns (body, url count, newest updated_at), or None if the shard would
+    hold more than MAX_URLS listings.
+    """
+    # "f" + 1 is "g": every id starting with the prefix sorts before it
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor = collection.find(
+        {"is_active": True, "id": {"$gte": prefix, "$lt": upper}},
+        {"_id": 0, "id": 1, "updated_at": 1, "created_at": 1},
+    ).batch_size(5000)
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    chunks = [compressor.compress(f"{XML_HEADER}<urlset {XMLNS}>\n".encode())]
+    count = 0
+    newest: Optional[datetime] = None
+    base = escape(site_url.rstrip("/"))
+    async for listing in cursor:
+        modified = listing.get("updated_at") or listing.get("created_at")
+        lastmod = f"<lastmod>{w3c_datetime(modified)}</lastmod>" if modified else ""
+        chunks.append(compressor.compress(f"<url><loc>{base}/listings/{escape(listing['id'])}</loc>{lastmod}</url>\n".encode()))
+        count += 1
+        if count > MAX_URLS:
+            return None
+        if modified and (newest is None or modified > newest):
+            newest = modified
+    chunks.append(compressor.compress(b"</urlset>\n"))
+    chunks.append(compressor.flush())
+    return b"".join(chunks), count, newest
+
+
+async def dirty_shards(collection, since: datetime, until: datetime, prefix_length: int) -> Set[str]:
+    """Shards holding a listing created, edited or deleted in (since, until]."""
+    shards = set()
+    total = 16 ** prefix_length
+    # Covered by the (updated_at, id) index; deletes stamp updated_at too
+    cursor = collection.find({"updated_at": {"$gt": since, "$lte": until}}, {"_id": 0, "id": 1})
+    async for listing in cursor:
+        shards.add(listing["id"][:prefix_length].lower())
+        if len(shards) == total:
+            break
+    return shards
+
+
+async def regenerate_sitemaps(
+    db,
+    site_url: str,
+    min_prefix_length: int = 1,
+    settle_seconds: float = 5.0,
+    full: bool = False,
+) -> int:
+    """Re-render the shards changed since the last run, then the sitemap index.
+
+    Files are stored precompressed in the `sitemaps` collection, so any worker
+    can serve them byte for byte. Changes younger than `settle_seconds` are left
+    for the next run, as writes stamped before them may not have committed yet.
+
+    The id prefix length grows with the catalogue so that no shard exceeds
+    MAX_URLS; it never shrinks outside a full run. A shard found over the limit
+    anyway triggers a full run with one more prefix digit.
+    Returns the number of shards rendered.
+    """
+    until = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    state = await db.sitemaps.find_one({"_id": STATE_ID}) or {}
+    prefix_length = prefix_length_for(await db.listings.count_documents({"is_active": True}), min_prefix_length)
+    if not full:
+        prefix_length = max(prefix_length, state.get("prefix_length") or 0)
+    prefixes = shard_prefixes(prefix_length)
+    if full or state.get("prefix_length") != prefix_length or state.get("site_url") != site_url:
+        dirty = set(prefixes)
+        # Shards of another prefix length are replaced, not updated
+        await db.sitemaps.delete_many({"_id": {"$nin": [STATE_ID] + [shard_name(prefix) for prefix in prefixes]}})
+    else:
+        dirty = await dirty_shards(db.listings, state["generated_until"], until, prefix_length)
+
+    for prefix in sorted(dirty):
+        rendered = await render_shard(db.listings, prefix, site_url)
+        if rendered is None:
+            logger.warning(f"Sitemap shard {prefix} exceeds {MAX_URLS} URLs, splitting every shard")
+            return await regenerate_sitemaps(db, site_url, prefix_length + 1, settle_seconds, full=True)
+        body, count, newest = rendered
+        if count == 0:
+            await db.sitemaps.delete_one({"_id": shard_name(prefix)})
+            continue
+        await db.sitemaps.replace_one(
+            {"_id": shard_name(prefix)},
+            {"body": body, "count": count, "lastmod": newest, "generated_at": datetime.utcnow()},
+            upsert=True,
+        )
+
+    if dirty or not state:
+        base = escape(site_url.rstrip("/"))
+        entries = []
+        async for shard in db.sitemaps.find({"_id": {"$ne": STATE_ID}, "body": {"$exists": True}}, {"body": 0}).sort("_id", 1):
+            lastmod = f"<lastmod>{w3c_datetime(shard['lastmod'])}</lastmod>" if shard.get("lastmod") else ""
+            entries.append(f"<sitemap><loc>{base}/{shard['_id']}</loc>{lastmod}</sitemap>\n")
+        index = f"{XML_HEADER}<sitemapindex {XMLNS}>\n{''.join(entries)}</sitemapindex>\n"
+        await db.sitemaps.update_one(
+            {"_id": STATE_ID},
+            {"$set": {"index": index.encode(), "generated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    await db.sitemaps.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"generated_until": until, "prefix_length": prefix_length, "site_url": site_url}},
+        upsert=True,
+    )
+    if dirty:
+        logger.info(f"Regenerated {len(dirty)} of {len(prefixes)} sitemap shards")
+    return len(dirty)
@@ -0,0 +1,81 @@
+import base64
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# What partners get: the listing itself, without seller contact details or internal fields
+FEED_FIELDS = (
+    "id", "title", "description", "price", "vehicle_type", "make", "model", "year",
+    "mileage", "length", "fuel_type", "location", "images", "created_at", "updated_at", "version",
+)
+
+Position = Tuple[datetime, str]
+
+
+def encode_token(position: Position) -> str:
+    updated_at, listing_id = position
+    return base64.urlsafe_b64encode(json.dumps({"updated_at": updated_at.isoformat(), "id": listing_id}).encode()).decode()
+
+
+def decode_token(token: str) -> Optional[Position]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(position["updated_at"]), str(position["id"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def line(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=default, separators=(",", ":")) + "\n"
+
+
+async def feed_lines(
+    collection,
+    since: Optional[Position],
+    limit: int,
+    settle_seconds: float,
+    include_images: bool = True,
+) -> AsyncIterator[str]:
+    """NDJSON listing changes after `since` in (updated_at, id) order.
+
+    One line per listing ("created", "updated" or "deleted"), then a final line
+    with the token to resume from. Changes newer than `settle_seconds` are held
+    back: updated_at is stamped before the write commits, so a write still in
+    flight may land behind the newest one already visible, and must not end up
+    before a token a partner has been given.
+    """
+    query: Dict[str, Any] = {"updated_at": {"$lte": datetime.utcnow() - timedelta(seconds=settle_seconds)}}
+    if since is not None:
+        updated_at, listing_id = since
+        # Keyset pagination: strictly after the last change of the previous page
+        query["$or"] = [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "id": {"$gt": listing_id}},
+        ]
+    projection = {"_id": 0, "is_active": 1, **{field: 1 for field in FEED_FIELDS if include_images or field != "images"}}
+    cursor = collection.find(query, projection).sort([("updated_at", 1), ("id", 1)]).limit(limit + 1)
+    # Small batches keep memory flat while images stream through
+    cursor = cursor.batch_size(50 if include_images else 500)
+    position = since
+    count = 0
+    async for listing in cursor:
+        if count == limit:
+            yield line({"next": encode_token(position), "has_more": True})
+            return
+        position = (listing["updated_at"], listing["id"])
+        count += 1
+        if not listing.pop("is_active", True):
+            yield line({"op": "deleted", "id": listing["id"], "updated_at": listing["updated_at"]})
+        else:
+            # Every edit bumps the version, so version 0 has only ever been created
+            yield line({"op": "created" if not listing.get("version") else "updated", "listing": listing})
+    yield line({"next": encode_token(position) if position else None, "has_more": False})
@@ -0,0 +1,69 @@
+import logging
+import math
+import time
+from collections import Counter
+from typing import Any, Dict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Popularity is a time-decayed view count kept in log2 space relative to a fixed epoch:
+#   popularity = log2(sum(views * 2 ** ((viewed_at - EPOCH) / half_life)))
+# Comparing stored values ranks listings by their decayed count *now*, since the
+# current time shifts every score equally, so nothing has to be rewritten as time
+# passes. Log space keeps the numbers small however far we get from the epoch.
+POPULARITY_EPOCH = 1704067200.0  # 2024-01-01 UTC
+
+
+def popularity_increment(views: int, now: float, half_life: float) -> float:
+    return (now - POPULARITY_EPOCH) / half_life + math.log2(views)
+
+
+def log2_sum(current: Any, increment: float) -> Dict[str, Any]:
+    """Aggregation expression for log2(2**current + 2**increment), stable for large exponents."""
+    high = {"$max": [current, increment]}
+    low = {"$min": [current, increment]}
+    combined = {"$add": [high, {"$log": [{"$add": [1, {"$pow": [2, {"$subtract": [low, high]}]}]}, 2]}]}
+    return {"$cond": [{"$eq": [{"$type": current}, "missing"]}, increment, combined]}
+
+
+class ViewCounter:
+    """Buffers listing views in memory and writes them in one unordered bulk_write per flush.
+
+    Database writes scale with the flush interval rather than with traffic; a crash
+    loses at most the views recorded since the last flush.
+    """
+
+    def __init__(self, collection, half_life_hours: float = 72.0):
+        self.collection = collection
+        self.half_life = half_life_hours * 3600
+        self.pending: Counter = Counter()
+
+    def record(self, listing_id: str, views: int = 1):
+        self.pending[listing_id] += views
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        # Swap before awaiting so views recorded during the write land in the next batch
+        batch, self.pending = self.pending, Counter()
+        now = time.time()
+        # Views are only recorded for active listings; is_active lets the partial active_id index serve the lookup
+        operations = [
+            UpdateOne({"id": listing_id, "is_active": True}, [{"$set": {
+                "view_count": {"$add": [{"$ifNull": ["$view_count", 0]}, views]},
+                "popularity": log2_sum("$popularity", popularity_increment(views, now, self.half_life)),
+            }}])
+            for listing_id, views in batch.items()
+        ]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            logger.warning(f"Dropped views for {failed} of {len(operations)} listings: {e}")
+        except PyMongoError as e:
+            # Not retried: the write may have been applied, and views are approximate anyway
+            logger.warning(f"Dropped {sum(batch.values())} views for {len(batch)} listings: {e}")
+        return len(operations)
@@ -4,7 +4,10 @@ import json
 import random
 import string
 import base64
+import gzip
+import re
 import time
+import uuid
 import os
 import sys
 from datetime import datetime
@@ -35,6 +38,8 @@ print(f"Using backend API URL: {API_URL}")
 test_users = []
 test_listings = []
 auth_token = None
+refresh_token = None
+second_auth_token = None
 
 # Helper functions
 def random_string(length=8):
@@ -83,6 +88,56 @@ def create_test_listing():
         "show_phone": random.choice([True, False])
     }
 
+def get_second_user_token():
+    """Token of a second user for permission checks, registered once per run.
+
+    Registration allows 5 attempts per 10 minutes per client, so the tests must
+    not register a fresh user for every permission check.
+    """
+    global second_auth_token
+    if second_auth_token is None:
+        second_user = create_test_user()
+        register_response = requests.post(f"{API_URL}/register", json=second_user)
+        if register_response.status_code != 200:
+            print(f"Could not register second user: {register_response.status_code} {register_response.text}")
+            return None
+        login_data = {
+            "username": second_user["username"],
+            "password": second_user["password"]
+        }
+        login_response = requests.post(f"{API_URL}/login", json=login_data)
+        if login_response.status_code != 200:
+            print(f"Could not log in second user: {login_response.status_code} {login_response.text}")
+            return None
+        second_auth_token = login_response.json()["access_token"]
+    return second_auth_token
+
+def backend_setting(name, default):
+    """A backend setting as the server reads it: environment first, then /app/backend/.env"""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        with open('/app/backend/.env', 'r') as f:
+            for line in f:
+                if line.startswith(f"{name}="):
+                    return line.strip().split('=', 1)[1].strip('"\'')
+    except OSError:
+        pass
+    return default
+
+def wait_for(check, timeout, interval=2):
+    """Call check() until it returns something truthy or timeout seconds have passed; returns its last result"""
+    deadline = time.time() + timeout
+    while True:
+        result = check()
+        if result or time.time() >= deadline:
+            return result
+        time.sleep(interval)
+
+def wait_until_ready(timeout=120):
+    """Wait until /readyz reports the indexes loaded"""
+    return wait_for(lambda: requests.get(f"{BACKEND_URL}/readyz").status_code == 200, timeout)
+
 def print_test_result(test_name, success, message=""):
     """Print test result in a formatted way"""
     result = "PASSED" if success else "FAILED"
@@ -124,7 +179,7 @@ def test_register_user():
 def test_login():
     """Test user login endpoint"""
     print("\n=== Testing User Login ===")
-    global auth_token
+    global auth_token, refresh_token
     
     # Test valid login
     if not test_users:
@@ -145,6 +200,7 @@ def test_login():
     if success:
         try:
             auth_token = response.json()["access_token"]
+            refresh_token = response.json()["refresh_token"]
             print(f"Obtained auth token: {auth_token[:10]}...")
         except Exception as e:
             print(f"Error extracting token: {e}")
@@ -163,6 +219,50 @@ def test_login():
     
     return success and invalid_success
 
+def test_token_refresh():
+    """Test refresh token rotation and reuse detection"""
+    print("\n=== Testing Token Refresh ===")
+    global auth_token, refresh_token
+    
+    if not refresh_token:
+        print("No refresh token available. Logging in...")
+        test_login()
+    
+    old_refresh_token = refresh_token
+    response = requests.post(f"{API_URL}/token/refresh", json={"refresh_token": old_refresh_token})
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}"
+    print_test_result("Refresh access token", success, message)
+    
+    if success:
+        tokens = response.json()
+        auth_token = tokens["access_token"]
+        refresh_token = tokens["refresh_token"]
+        success = refresh_token != old_refresh_token
+        print(f"Refresh token rotated: {success}")
+    
+    # Inside the grace window a concurrent refresh (another tab) gets the same successor
+    response = requests.post(f"{API_URL}/token/refresh", json={"refresh_token": old_refresh_token})
+    grace_success = response.status_code == 200 and response.json()["refresh_token"] == refresh_token
+    print_test_result("Reuse rotated refresh token within the grace window", grace_success, f"Status: {response.status_code}")
+    
+    # After it, reusing a rotated token must fail and revoke the whole session
+    grace_seconds = float(backend_setting("REFRESH_TOKEN_GRACE_SECONDS", "30"))
+    print(f"Waiting {grace_seconds + 1:.0f}s for the refresh grace window to pass...")
+    time.sleep(grace_seconds + 1)
+    response = requests.post(f"{API_URL}/token/refresh", json={"refresh_token": old_refresh_token})
+    reuse_success = grace_success and response.status_code == 401
+    print_test_result("Reuse rotated refresh token after the grace window (should fail)", reuse_success, f"Status: {response.status_code}")
+    
+    response = requests.post(f"{API_URL}/token/refresh", json={"refresh_token": refresh_token})
+    revoked_success = response.status_code == 401
+    print_test_result("Refresh after reuse detection (should fail)", revoked_success, f"Status: {response.status_code}")
+    
+    # Log in again so later tests have a valid session
+    test_login()
+    
+    return success and reuse_success and revoked_success
+
 def test_protected_endpoint():
     """Test protected endpoint access"""
     print("\n=== Testing Protected Endpoint (/me) ===")
@@ -320,12 +420,31 @@ def test_get_my_listings():
     
     if success:
         try:
-            listings = response.json()
-            print(f"Retrieved {len(listings)} of my listings")
+            page = response.json()
+            print(f"Retrieved {len(page['listings'])} of {page['total']} my listings")
         except Exception as e:
             print(f"Error extracting my listings data: {e}")
             success = False
     
+    # Page through active listings one at a time using the cursor
+    params = {"status": "active", "view": "summary", "limit": 1}
+    seen_ids = []
+    page_success = True
+    while True:
+        response = requests.get(f"{API_URL}/my-listings", params=params, headers=headers)
+        if response.status_code != 200:
+            page_success = False
+            break
+        page = response.json()
+        seen_ids.extend(listing["id"] for listing in page["listings"])
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+    page_success = page_success and len(seen_ids) == len(set(seen_ids)) == page["total"]
+    message = f"Paged through {len(seen_ids)} listings, total reported: {page.get('total') if page_success else 'n/a'}"
+    print_test_result("Cursor pagination of my active listings", page_success, message)
+    success = success and page_success
+    
     # Test without authentication
     response = requests.get(f"{API_URL}/my-listings")
     no_auth_success = response.status_code == 401 or response.status_code == 403
@@ -476,6 +595,390 @@ def test_search_filter():
         print("Failed to create test listings")
         return False
 
+def test_listing_facets():
+    """Test facet counts returned alongside the listings page"""
+    print("\n=== Testing Listing Facets ===")
+    
+    response = requests.get(f"{API_URL}/listings?include_facets=true&limit=5")
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get listings with facets", success, message)
+    
+    if success:
+        try:
+            page = response.json()
+            expected_facets = ["vehicle_type", "fuel_type", "make", "year", "price"]
+            all_facets_present = all(f in page["facets"] for f in expected_facets)
+            print(f"Listings on page: {len(page['listings'])}")
+            print(f"All expected facets present: {all_facets_present}")
+            success = all_facets_present and len(page["listings"]) <= 5
+        except Exception as e:
+            print(f"Error extracting facet data: {e}")
+            success = False
+    
+    # Facet counts for vehicle_type should ignore the vehicle_type filter itself
+    if success:
+        response = requests.get(f"{API_URL}/listings?include_facets=true&vehicle_type=caravan")
+        filtered_success = response.status_code == 200
+        if filtered_success:
+            facets = response.json()["facets"]
+            print(f"Vehicle type facets with caravan filter: {facets['vehicle_type']}")
+        print_test_result("Get filtered listings with facets", filtered_success, f"Status: {response.status_code}")
+        success = success and filtered_success
+    
+    return success
+
+def test_popular_sort():
+    """Test sorting listings by decayed view popularity"""
+    print("\n=== Testing Popular Sort ===")
+    
+    response = requests.get(f"{API_URL}/listings?sort=popular&limit=5")
+    success = response.status_code == 200 and isinstance(response.json(), list)
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get listings sorted by popularity", success, message)
+    
+    if success and response.json():
+        print(f"View counts on page: {[listing.get('view_count') for listing in response.json()]}")
+    
+    response = requests.get(f"{API_URL}/listings?sort=oldest")
+    invalid_rejected = response.status_code == 400
+    print_test_result("Reject unknown sort", invalid_rejected, f"Status: {response.status_code}")
+    
+    return success and invalid_rejected
+
+def test_saved_searches():
+    """Test saving, listing and deleting a saved search"""
+    print("\n=== Testing Saved Searches ===")
+    global auth_token
+    
+    if not auth_token:
+        print("No auth token available. Logging in...")
+        test_login()
+    
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    search_data = {"name": "Günstige Wohnmobile", "vehicle_type": "motorhome", "max_price": 60000, "search_text": "Hymer"}
+    response = requests.post(f"{API_URL}/saved-searches", json=search_data, headers=headers)
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Create saved search", success, message)
+    if not success:
+        return False
+    search_id = response.json()["id"]
+    
+    response = requests.get(f"{API_URL}/saved-searches", headers=headers)
+    listed = response.status_code == 200 and any(s["id"] == search_id for s in response.json())
+    print_test_result("List saved searches", listed, f"Status: {response.status_code}")
+    
+    response = requests.post(f"{API_URL}/saved-searches", json={"min_price": 50000, "max_price": 10000}, headers=headers)
+    invalid_rejected = response.status_code == 400
+    print_test_result("Reject empty price range", invalid_rejected, f"Status: {response.status_code}")
+    
+    response = requests.delete(f"{API_URL}/saved-searches/{search_id}", headers=headers)
+    deleted = response.status_code == 200
+    print_test_result("Delete saved search", deleted, f"Status: {response.status_code}")
+    
+    return listed and invalid_rejected and deleted
+
+def test_listing_stream():
+    """Test that the live listing stream opens as server-sent events"""
+    print("\n=== Testing Listing Stream ===")
+    
+    try:
+        with requests.get(f"{API_URL}/listings/stream?vehicle_type=caravan", stream=True, timeout=10) as response:
+            content_type = response.headers.get("content-type", "")
+            first_line = next(response.iter_lines(decode_unicode=True), "")
+            success = response.status_code == 200 and content_type.startswith("text/event-stream") and first_line.startswith("retry:")
+            message = f"Status: {response.status_code}, Content-Type: {content_type}, First line: {first_line}"
+    except Exception as e:
+        success = False
+        message = f"Error: {e}"
+    print_test_result("Open listing stream", success, message)
+    
+    return success
+
+def test_listing_batch():
+    """Test fetching several listings by id in one request"""
+    print("\n=== Testing Listing Batch ===")
+    
+    if not test_listings:
+        print("No test listings available. Creating one...")
+        test_create_listing()
+    
+    ids = [listing["id"] for listing in test_listings[:3]] + ["does-not-exist"]
+    response = requests.get(f"{API_URL}/listings/batch", params={"ids": ",".join(reversed(ids)), "view": "summary"})
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get listing batch", success, message)
+    
+    if success:
+        batch = response.json()
+        returned = [listing["id"] for listing in batch["listings"]]
+        expected = [listing_id for listing_id in reversed(ids) if listing_id in returned]
+        success = returned == expected and "does-not-exist" in batch["missing"]
+        print(f"Order preserved: {returned == expected}, missing: {batch['missing']}")
+    
+    response = requests.post(f"{API_URL}/listings/batch", json={"ids": ids})
+    post_success = response.status_code == 200 and "missing" in response.json()
+    print_test_result("Post listing batch", post_success, f"Status: {response.status_code}")
+    
+    return success and post_success
+
+def test_listing_map():
+    """Test clustered map view of listings"""
+    print("\n=== Testing Listing Map ===")
+    
+    response = requests.get(f"{API_URL}/listings/map", params={"bbox": "5,45,18,56", "zoom": 6})
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get listing map clusters", success, message)
+    
+    if success:
+        clusters = response.json()["clusters"]
+        print(f"Clusters: {len(clusters)}, listings: {sum(c['count'] for c in clusters)}")
+        success = all(c["count"] >= 1 and "id" in c["listing"] for c in clusters)
+    
+    response = requests.get(f"{API_URL}/listings/map", params={"bbox": "not-a-bbox", "zoom": 6})
+    invalid_rejected = response.status_code == 400
+    print_test_result("Reject invalid bbox", invalid_rejected, f"Status: {response.status_code}")
+    
+    return success and invalid_rejected
+
+def test_market_estimate():
+    """Test the comparable based price estimate"""
+    print("\n=== Testing Market Estimate ===")
+    global auth_token
+    
+    if not auth_token:
+        print("No auth token available. Logging in...")
+        test_login()
+    
+    # Comparables of a make no other listing has, so the estimate is computed from them alone
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    make = f"Testmake {random_string()}"
+    prices = []
+    for i in range(10):
+        listing_data = create_test_listing()
+        listing_data.update(vehicle_type="motorhome", make=make, model="Estimator", year=2016 + i % 5, price=30000 + 1000 * i, mileage=40000 + 5000 * i)
+        response = requests.post(f"{API_URL}/listings", json=listing_data, headers=headers)
+        if response.status_code != 200:
+            print_test_result("Seed comparable listings", False, f"Status: {response.status_code}, Response: {response.text[:200]}...")
+            return False
+        prices.append(listing_data["price"])
+    
+    if not wait_until_ready():
+        print_test_result("Backend ready", False, "/readyz did not report ready")
+        return False
+    
+    # The seeds show up with the next snapshot, rebuilt every MARKET_SNAPSHOT_MINUTES; run the
+    # server with a short interval, or raise MARKET_TEST_WAIT_SECONDS to wait for the default one
+    params = {"vehicle_type": "motorhome", "make": make, "model": "Estimator", "year": 2018, "mileage": 60000}
+    timeout = float(os.environ.get("MARKET_TEST_WAIT_SECONDS", "60"))
+    def estimate_from_seeds():
+        response = requests.get(f"{API_URL}/market/estimate", params=params)
+        if response.status_code == 200 and response.json()["comparable_level"] == "make_model" and response.json()["comparables"] >= len(prices):
+            return response
+        return None
+    print(f"Waiting up to {timeout:.0f}s for a market snapshot with the seeded listings...")
+    response = wait_for(estimate_from_seeds, timeout, interval=5)
+    if response is None:
+        print_test_result("Get market estimate", True, f"SKIPPED: no snapshot with the seeded listings within {timeout:.0f}s")
+        return True
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get market estimate", success, message)
+    
+    if success:
+        estimate = response.json()
+        print(f"Estimate: {estimate['estimate']} ({estimate['low']} - {estimate['high']}) from {estimate['comparables']} comparables")
+        success = (
+            estimate["comparable_level"] == "make_model"
+            and estimate["comparables"] == len(prices)
+            and estimate["low"] <= estimate["estimate"] <= estimate["high"]
+            and min(prices) <= estimate["estimate"] <= max(prices)
+        )
+        print_test_result("Estimate comes from the seeded comparables", success, f"Seeded prices {min(prices)} - {max(prices)}")
+    
+    return success
+
+def test_similar_listings():
+    """Test similar listings for a listing"""
+    print("\n=== Testing Similar Listings ===")
+    
+    if not test_listings:
+        print("No test listings available. Creating one...")
+        test_create_listing()
+    
+    if not test_listings:
+        print_test_result("Get similar listings", False, "No listing to compare with")
+        return False
+    
+    listing_id = test_listings[0]["id"]
+    # 503 while the index is still loading, 404 until the change feed has delivered the listing
+    def similar_listings():
+        response = requests.get(f"{API_URL}/listings/{listing_id}/similar", params={"limit": 4})
+        return response if response.status_code == 200 else None
+    response = wait_for(similar_listings, 120) or requests.get(f"{API_URL}/listings/{listing_id}/similar", params={"limit": 4})
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get similar listings", success, message)
+    
+    if success:
+        similar = response.json()
+        scores = [item["score"] for item in similar]
+        # Earlier tests created plenty of other listings to compare with
+        success = 0 < len(similar) <= 4 and all(item["id"] != listing_id for item in similar)
+        print_test_result("Similar listings exclude the listing itself", success, f"Got {len(similar)} listings")
+        ordered = scores == sorted(scores, reverse=True)
+        print_test_result("Similar listings are ordered by score", ordered, f"Scores: {scores}")
+        success = success and ordered
+    
+    response = requests.get(f"{API_URL}/listings/{uuid.uuid4()}/similar")
+    unknown_success = response.status_code == 404
+    print_test_result("Similar listings of unknown listing", unknown_success, f"Status: {response.status_code}")
+    
+    return success and unknown_success
+
+def test_duplicate_listing():
+    """Test reposting an identical listing"""
+    print("\n=== Testing Duplicate Listing ===")
+    global auth_token
+    
+    if not auth_token:
+        print("No auth token available. Logging in...")
+        test_login()
+    
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    listing_data = create_test_listing()
+    response = requests.post(f"{API_URL}/listings", json=listing_data, headers=headers)
+    if response.status_code != 200:
+        print_test_result("Create original listing", False, f"Status: {response.status_code}")
+        return False
+    original_id = response.json()["id"]
+    test_listings.append(response.json())
+    
+    # "flag" accepts the repost and flags it, "reject" refuses a seller's own repost,
+    # anything else turns detection off
+    policy = backend_setting("DUPLICATE_POLICY", "flag")
+    response = requests.post(f"{API_URL}/listings", json=listing_data, headers=headers)
+    message = f"Policy: {policy}, Status: {response.status_code}, Response: {response.text[:200]}..."
+    if policy == "reject":
+        success = response.status_code == 409 and original_id in response.json().get("detail", "")
+        print_test_result("Repost identical listing is rejected", success, message)
+        return success
+    
+    success = response.status_code == 200
+    print_test_result("Repost identical listing", success, message)
+    if not success:
+        return False
+    repost = response.json()
+    test_listings.append(repost)
+    expected = original_id if policy == "flag" else None
+    stored = requests.get(f"{API_URL}/listings/{repost['id']}").json()
+    success = repost.get("duplicate_of") == expected and stored.get("duplicate_of") == expected
+    print_test_result("Repost duplicate_of matches the policy", success, f"Expected {expected}, got {repost.get('duplicate_of')} / {stored.get('duplicate_of')}")
+    
+    return success
+
+def test_autocomplete():
+    """Test make/model autocomplete"""
+    print("\n=== Testing Autocomplete ===")
+    
+    if not test_listings:
+        print("No test listings available. Creating one...")
+        test_create_listing()
+    
+    make = test_listings[0]["make"] if test_listings else "H"
+    # The index follows the change feed, so a new make may take a poll interval to appear
+    for attempt in range(5):
+        response = requests.get(f"{API_URL}/autocomplete", params={"field": "make", "prefix": make[:2].lower()})
+        if response.status_code != 200 or any(suggestion["value"].lower() == make.lower() for suggestion in response.json()):
+            break
+        time.sleep(1)
+    success = response.status_code == 200
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Autocomplete make", success, message)
+    if success and test_listings:
+        success = any(suggestion["value"].lower() == make.lower() for suggestion in response.json())
+        print_test_result("Autocomplete suggests the listing's make", success, response.text[:200])
+    
+    response = requests.get(f"{API_URL}/autocomplete", params={"field": "model", "make": make, "prefix": ""})
+    model_success = response.status_code == 200
+    print_test_result("Autocomplete model within make", model_success, f"Status: {response.status_code}")
+    
+    response = requests.get(f"{API_URL}/autocomplete", params={"field": "title", "prefix": "a"})
+    invalid_success = response.status_code == 400
+    print_test_result("Autocomplete unknown field (should fail)", invalid_success, f"Status: {response.status_code}")
+    
+    return success and model_success and invalid_success
+
+def test_listing_feed():
+    """Test the NDJSON delta feed"""
+    print("\n=== Testing Listing Feed ===")
+    
+    response = requests.get(f"{API_URL}/feed/listings", params={"limit": 5, "images": "false"})
+    success = response.status_code == 200 and response.headers.get("content-type", "").startswith("application/x-ndjson")
+    message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+    print_test_result("Get listing feed", success, message)
+    
+    if success:
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        last = lines[-1]
+        success = "next" in last and len(lines) <= 6 and all(line.get("op") in ("created", "updated", "deleted") for line in lines[:-1])
+        print_test_result("Feed ends with a continuation token", success, f"{len(lines) - 1} changes, has_more: {last.get('has_more')}")
+        if success and last["next"]:
+            response = requests.get(f"{API_URL}/feed/listings", params={"since": last["next"], "limit": 5, "images": "false"})
+            success = response.status_code == 200
+            print_test_result("Resume feed from token", success, f"Status: {response.status_code}")
+    
+    response = requests.get(f"{API_URL}/feed/listings", params={"since": "not-a-token"})
+    invalid_success = response.status_code == 400
+    print_test_result("Feed with invalid token (should fail)", invalid_success, f"Status: {response.status_code}")
+    
+    return success and invalid_success
+
+def test_sitemaps():
+    """Test the sitemap index and its gzipped shards"""
+    print("\n=== Testing Sitemaps ===")
+    
+    # Rendered by the server every SITEMAP_INTERVAL_MINUTES; 404 until the first run has finished
+    timeout = float(os.environ.get("SITEMAP_TEST_WAIT_SECONDS", "60"))
+    def sitemap_index():
+        response = requests.get(f"{BACKEND_URL}/sitemap.xml")
+        return response if response.status_code == 200 else None
+    response = wait_for(sitemap_index, timeout, interval=5)
+    if response is None:
+        print_test_result("Get sitemap index", True, f"SKIPPED: no sitemap generated within {timeout:.0f}s")
+        return True
+    index = response.text
+    shards = re.findall(r"<loc>[^<]*/(sitemap-[0-9a-f]+\.xml\.gz)</loc>", index)
+    success = (
+        response.headers.get("content-type", "").startswith("application/xml")
+        and index.startswith('<?xml version="1.0" encoding="UTF-8"?>')
+        and "<sitemapindex" in index and index.rstrip().endswith("</sitemapindex>")
+        and len(shards) > 0
+    )
+    print_test_result("Get sitemap index", success, f"{len(shards)} shards")
+    if not success:
+        return False
+    
+    response = requests.get(f"{BACKEND_URL}/{shards[0]}")
+    urlset = gzip.decompress(response.content).decode() if response.status_code == 200 else ""
+    urls = re.findall(r"<url><loc>[^<]*/listings/([0-9a-f-]+)</loc>", urlset)
+    prefix = shards[0][len("sitemap-"):-len(".xml.gz")]
+    success = (
+        urlset.startswith('<?xml version="1.0" encoding="UTF-8"?>')
+        and "<urlset" in urlset and urlset.rstrip().endswith("</urlset>")
+        and 0 < len(urls) <= 50000
+        and all(listing_id.startswith(prefix) for listing_id in urls)
+    )
+    print_test_result("Get sitemap shard", success, f"Status: {response.status_code}, {shards[0]}: {len(urls)} URLs")
+    
+    response = requests.get(f"{BACKEND_URL}/sitemap-zz.xml.gz")
+    missing_success = response.status_code == 404
+    print_test_result("Get unknown sitemap shard (should fail)", missing_success, f"Status: {response.status_code}")
+    
+    return success and missing_success
+
 def test_update_listing():
     """Test updating a listing"""
     print("\n=== Testing Update Listing ===")
@@ -522,32 +1025,69 @@ def test_update_listing():
         message = f"Status: {response.status_code}, Response: {response.text}"
         print_test_result("Update listing without authentication (should fail)", no_auth_success, message)
         
-        # Create a second user to test permission check
-        second_user = create_test_user()
-        register_response = requests.post(f"{API_URL}/register", json=second_user)
-        if register_response.status_code == 200:
-            login_data = {
-                "username": second_user["username"],
-                "password": second_user["password"]
-            }
-            login_response = requests.post(f"{API_URL}/login", json=login_data)
-            if login_response.status_code == 200:
-                second_token = login_response.json()["access_token"]
-                
-                # Try to update the listing with the second user's token
-                headers = {"Authorization": f"Bearer {second_token}"}
-                response = requests.put(f"{API_URL}/listings/{listing_id}", json=updated_data, headers=headers)
-                permission_success = response.status_code == 404  # Should return 404 for not found or no permission
-                message = f"Status: {response.status_code}, Response: {response.text}"
-                print_test_result("Update listing with different user (should fail)", permission_success, message)
-                
-                success = success and permission_success
+        # Use a second user to test permission check
+        second_token = get_second_user_token()
+        permission_success = second_token is not None
+        if second_token:
+            # Try to update the listing with the second user's token
+            headers = {"Authorization": f"Bearer {second_token}"}
+            response = requests.put(f"{API_URL}/listings/{listing_id}", json=updated_data, headers=headers)
+            permission_success = response.status_code == 404  # Should return 404 for not found or no permission
+            message = f"Status: {response.status_code}, Response: {response.text}"
+            print_test_result("Update listing with different user (should fail)", permission_success, message)
+        success = success and permission_success
         
         return success and no_auth_success
     else:
         print("Failed to create test listings")
         return False
 
+def test_patch_listing():
+    """Test partial listing updates with optimistic concurrency"""
+    print("\n=== Testing Patch Listing ===")
+    global auth_token
+    
+    if not auth_token:
+        print("No auth token available. Logging in...")
+        test_login()
+    
+    if not test_listings:
+        print("No test listings available. Creating one...")
+        test_create_listing()
+    
+    if test_listings:
+        listing_id = test_listings[0]["id"]
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        
+        # Only the price is sent; images and other fields must be preserved
+        new_price = test_listings[0]["price"] + 500
+        response = requests.patch(f"{API_URL}/listings/{listing_id}", json={"price": new_price}, headers=headers)
+        success = response.status_code == 200
+        message = f"Status: {response.status_code}, Response: {response.text[:200]}..."
+        print_test_result("Patch listing price", success, message)
+        
+        etag = response.headers.get("ETag")
+        if success:
+            patched = response.json()
+            success = patched["price"] == new_price and patched["images"] == test_listings[0]["images"]
+            print(f"Patched price: {patched['price']}, ETag: {etag}")
+            test_listings[0] = patched
+        
+        # A write with the current ETag succeeds, a stale one is rejected
+        headers_current = {**headers, "If-Match": etag}
+        response = requests.patch(f"{API_URL}/listings/{listing_id}", json={"show_phone": True}, headers=headers_current)
+        match_success = response.status_code == 200
+        print_test_result("Patch listing with current If-Match", match_success, f"Status: {response.status_code}")
+        
+        response = requests.patch(f"{API_URL}/listings/{listing_id}", json={"show_phone": False}, headers=headers_current)
+        stale_success = response.status_code == 412
+        print_test_result("Patch listing with stale If-Match (should fail)", stale_success, f"Status: {response.status_code}")
+        
+        return success and match_success and stale_success
+    else:
+        print("Failed to create test listings")
+        return False
+
 def test_delete_listing():
     """Test deleting a listing"""
     print("\n=== Testing Delete Listing ===")
@@ -595,26 +1135,17 @@ def test_delete_listing():
     message = f"Status: {response.status_code}, Response: {response.text}"
     print_test_result("Delete listing without authentication (should fail)", no_auth_success, message)
     
-    # Create a second user to test permission check
-    second_user = create_test_user()
-    register_response = requests.post(f"{API_URL}/register", json=second_user)
-    if register_response.status_code == 200:
-        login_data = {
-            "username": second_user["username"],
-            "password": second_user["password"]
-        }
-        login_response = requests.post(f"{API_URL}/login", json=login_data)
-        if login_response.status_code == 200:
-            second_token = login_response.json()["access_token"]
-            
-            # Try to delete the listing with the second user's token
-            headers = {"Authorization": f"Bearer {second_token}"}
-            response = requests.delete(f"{API_URL}/listings/{second_listing_id}", headers=headers)
-            permission_success = response.status_code == 404  # Should return 404 for not found or no permission
-            message = f"Status: {response.status_code}, Response: {response.text}"
-            print_test_result("Delete listing with different user (should fail)", permission_success, message)
-            
-            success = success and permission_success
+    # Use a second user to test permission check
+    second_token = get_second_user_token()
+    permission_success = second_token is not None
+    if second_token:
+        # Try to delete the listing with the second user's token
+        headers = {"Authorization": f"Bearer {second_token}"}
+        response = requests.delete(f"{API_URL}/listings/{second_listing_id}", headers=headers)
+        permission_success = response.status_code == 404  # Should return 404 for not found or no permission
+        message = f"Status: {response.status_code}, Response: {response.text}"
+        print_test_result("Delete listing with different user (should fail)", permission_success, message)
+    success = success and permission_success
     
     return success and no_auth_success and soft_delete_success
 
@@ -671,6 +1202,7 @@ def run_all_tests():
     # Authentication tests
     auth_success = test_register_user()
     auth_success = test_login() and auth_success
+    auth_success = test_token_refresh() and auth_success
     auth_success = test_protected_endpoint() and auth_success
     
     # Listings tests
@@ -680,8 +1212,21 @@ def run_all_tests():
     listings_success = test_get_single_listing() and listings_success
     listings_success = test_get_my_listings() and listings_success
     listings_success = test_update_listing() and listings_success
+    listings_success = test_patch_listing() and listings_success
     listings_success = test_delete_listing() and listings_success
     listings_success = test_search_filter() and listings_success
+    listings_success = test_listing_facets() and listings_success
+    listings_success = test_popular_sort() and listings_success
+    listings_success = test_saved_searches() and listings_success
+    listings_success = test_listing_stream() and listings_success
+    listings_success = test_listing_batch() and listings_success
+    listings_success = test_listing_map() and listings_success
+    listings_success = test_market_estimate() and listings_success
+    listings_success = test_similar_listings() and listings_success
+    listings_success = test_duplicate_listing() and listings_success
+    listings_success = test_autocomplete() and listings_success
+    listings_success = test_listing_feed() and listings_success
+    listings_success = test_sitemaps() and listings_success
     
     # Utility tests
     utility_success = test_contact_seller()
@@ -18,6 +18,8 @@ import PrivacySettings from './components/PrivacySettings';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || '';
 const API = `${BACKEND_URL}/api`;
+// Sends the read-after-write cookie so sellers see their own changes right away
+axios.defaults.withCredentials = true;
 
 // Fix for default markers in Leaflet
 delete L.Icon.Default.prototype._getIconUrl;
@@ -27,6 +29,45 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png',
 });
 
+// Exchange the stored refresh token for a new token pair instead of asking for the password again
+let refreshRequest = null;
+// AuthProvider subscribes here so its token state follows every refresh
+const tokenListeners = new Set();
+const refreshTokens = () => {
+  if (!refreshRequest) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshRequest = (refreshToken
+      ? axios.post(`${API}/token/refresh`, { refresh_token: refreshToken }, { skipAuthRefresh: true })
+      : Promise.reject(new Error('No refresh token'))
+    ).then((response) => {
+      const { access_token, refresh_token } = response.data;
+      localStorage.setItem('token', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
+      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      tokenListeners.forEach((listener) => listener(access_token));
+      return access_token;
+    }).finally(() => {
+      refreshRequest = null;
+    });
+  }
+  return refreshRequest;
+};
+
+axios.interceptors.response.use(null, async (error) => {
+  const original = error.config;
+  if (error.response?.status === 401 && original && !original.skipAuthRefresh && !original._retried) {
+    original._retried = true;
+    try {
+      const accessToken = await refreshTokens();
+      original.headers['Authorization'] = `Bearer ${accessToken}`;
+      return axios(original);
+    } catch (refreshError) {
+      return Promise.reject(error);
+    }
+  }
+  return Promise.reject(error);
+});
+
 // Auth Context
 const AuthContext = React.createContext();
 
@@ -34,6 +75,21 @@ const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
 
+  useEffect(() => {
+    // Refreshes made by the axios interceptor, in this tab or in another one
+    const onStorage = (event) => {
+      if (event.key === 'token' && event.newValue) {
+        setToken(event.newValue);
+      }
+    };
+    tokenListeners.add(setToken);
+    window.addEventListener('storage', onStorage);
+    return () => {
+      tokenListeners.delete(setToken);
+      window.removeEventListener('storage', onStorage);
+    };
+  }, []);
+
   useEffect(() => {
     if (token) {
       axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
@@ -54,9 +110,10 @@ const AuthProvider = ({ children }) => {
   const login = async (username, password) => {
     try {
       const response = await axios.post(`${API}/login`, { username, password });
-      const { access_token } = response.data;
+      const { access_token, refresh_token } = response.data;
       setToken(access_token);
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
       await fetchUser();
       return { success: true };
@@ -75,9 +132,14 @@ const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      axios.post(`${API}/logout`, { refresh_token: refreshToken }, { skipAuthRefresh: true }).catch(() => {});
+    }
     setUser(null);
     setToken(null);
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     delete axios.defaults.headers.common['Authorization'];
   };
 
@@ -655,8 +717,9 @@ const Register = () => {
   );
 };
 
-// Map Component
-const MapComponent = ({ listings, userLocation, onListingClick }) => {
+// Map Component: clusters for the visible area are loaded from the server, so the
+// map shows the whole inventory without downloading every listing
+const MapComponent = ({ userLocation, onListingClick }) => {
   const { t } = useTranslation();
   const mapRef = useRef(null);
   const mapInstanceRef = useRef(null);
@@ -673,20 +736,48 @@ const MapComponent = ({ listings, userLocation, onListingClick }) => {
       attribution: t('map.attribution')
     }).addTo(map);
 
-    // Add markers for listings
-    listings.forEach(listing => {
-      if (listing.location.latitude && listing.location.longitude) {
-        const marker = L.marker([listing.location.latitude, listing.location.longitude])
-          .addTo(map)
-          .bindPopup(`
-            <div>
-              <h3 class="font-bold">${listing.title}</h3>
-              <p>${t('common.currency')}${listing.price.toLocaleString()}</p>
-              <button onclick="window.selectListing('${listing.id}')" class="bg-blue-600 text-white px-2 py-1 rounded text-sm mt-2">${t('map.viewDetails')}</button>
-            </div>
-          `);
+    // Listing clusters for the visible area, reloaded whenever the view changes
+    const clusterLayer = L.layerGroup().addTo(map);
+    let request = 0;
+    const loadClusters = async () => {
+      const current = ++request;
+      try {
+        const response = await axios.get(`${API}/listings/map`, {
+          params: { bbox: map.getBounds().toBBoxString(), zoom: map.getZoom() }
+        });
+        if (current !== request) return;
+        clusterLayer.clearLayers();
+        response.data.clusters.forEach(cluster => {
+          if (cluster.count === 1) {
+            const listing = cluster.listing;
+            L.marker([cluster.latitude, cluster.longitude])
+              .addTo(clusterLayer)
+              .bindPopup(`
+                <div>
+                  <h3 class="font-bold">${listing.title}</h3>
+                  <p>${t('common.currency')}${listing.price.toLocaleString()}</p>
+                  <button onclick="window.selectListing('${listing.id}')" class="bg-blue-600 text-white px-2 py-1 rounded text-sm mt-2">${t('map.viewDetails')}</button>
+                </div>
+              `);
+          } else {
+            const size = Math.min(56, 28 + Math.round(Math.log10(cluster.count) * 10));
+            const icon = L.divIcon({
+              className: 'listing-cluster-marker',
+              html: `<div style="background-color: #2563eb; color: white; width: ${size}px; height: ${size}px; line-height: ${size}px; border-radius: 50%; border: 2px solid white; text-align: center; font-weight: 600;">${cluster.count}</div>`,
+              iconSize: [size, size],
+              iconAnchor: [size / 2, size / 2]
+            });
+            L.marker([cluster.latitude, cluster.longitude], { icon })
+              .addTo(clusterLayer)
+              .on('click', () => map.setView([cluster.latitude, cluster.longitude], Math.min(map.getZoom() + 2, 18)));
+          }
+        });
+      } catch (error) {
+        console.error('Failed to load map clusters:', error);
       }
-    });
+    };
+    map.on('moveend', loadClusters);
+    loadClusters();
 
     // Add user location marker if available
     if (userLocation && userLocation.latitude && userLocation.longitude) {
@@ -707,7 +798,7 @@ const MapComponent = ({ listings, userLocation, onListingClick }) => {
         mapInstanceRef.current.remove();
       }
     };
-  }, [listings, userLocation, t]);
+  }, [userLocation, t]);
 
   // Global function for popup button clicks
   window.selectListing = (listingId) => {
@@ -732,6 +823,7 @@ const Listings = () => {
   });
   const [showMap, setShowMap] = useState(false);
   const [userLocation, setUserLocation] = useState(null);
+  const [liveFilters, setLiveFilters] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -739,6 +831,37 @@ const Listings = () => {
     getUserLocation();
   }, []);
 
+  // Live updates for the filters of the last fetch, pushed by the server instead of refetching
+  useEffect(() => {
+    if (!liveFilters || typeof EventSource === 'undefined') return undefined;
+    const params = new URLSearchParams();
+    if (liveFilters.vehicle_type) params.append('vehicle_type', liveFilters.vehicle_type);
+    if (liveFilters.min_price) params.append('min_price', liveFilters.min_price);
+    if (liveFilters.max_price) params.append('max_price', liveFilters.max_price);
+    const source = new EventSource(`${API}/listings/stream?${params}`);
+
+    source.addEventListener('new', (event) => {
+      // The stream does not apply the text search, so new listings only show up without one
+      if (liveFilters.search_text) return;
+      const listing = JSON.parse(event.data);
+      setListings((current) => (current.some((l) => l.id === listing.id) ? current : [listing, ...current]));
+    });
+    source.addEventListener('updated', (event) => {
+      const listing = JSON.parse(event.data);
+      setListings((current) => current.map((l) => (l.id === listing.id ? { ...l, ...listing } : l)));
+    });
+    source.addEventListener('removed', (event) => {
+      const { id } = JSON.parse(event.data);
+      setListings((current) => current.filter((l) => l.id !== id));
+    });
+    source.addEventListener('reset', () => {
+      // Updates were dropped while we were behind; start over from a fresh page
+      source.close();
+      fetchListings();
+    });
+    return () => source.close();
+  }, [liveFilters]);
+
   const getUserLocation = () => {
     if (navigator.geolocation) {
       navigator.geolocation.getCurrentPosition(
@@ -766,6 +889,7 @@ const Listings = () => {
 
       const response = await axios.get(`${API}/listings?${params}`);
       setListings(response.data);
+      setLiveFilters({ ...filters });
     } catch (error) {
       console.error('Failed to fetch listings:', error);
     } finally {
@@ -904,7 +1028,6 @@ const Listings = () => {
           {showMap && (
             <div className="mb-8">
               <MapComponent 
-                listings={listings} 
                 userLocation={userLocation} 
                 onListingClick={handleListingClick}
               />
@@ -1005,12 +1128,24 @@ const ListingDetails = () => {
   });
   const [contactLoading, setContactLoading] = useState(false);
   const [contactSuccess, setContactSuccess] = useState(false);
+  const [similar, setSimilar] = useState([]);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchListing();
+    fetchSimilar();
   }, [id]);
 
+  const fetchSimilar = async () => {
+    try {
+      const response = await axios.get(`${API}/listings/${id}/similar`);
+      setSimilar(response.data);
+    } catch (error) {
+      // Optional section: hidden while the index is warming up
+      setSimilar([]);
+    }
+  };
+
   const fetchListing = async () => {
     try {
       const response = await axios.get(`${API}/listings/${id}`);
@@ -1107,6 +1242,27 @@ const ListingDetails = () => {
         </div>
       </div>
 
+      {similar.length > 0 && (
+        <div className="mt-12">
+          <h2 className="text-2xl font-bold mb-6">{t('listingDetails.similar')}</h2>
+          <div className="grid grid-cols-2 md:grid-cols-3 gap-4">
+            {similar.map((item) => (
+              <button
+                key={item.id}
+                onClick={() => navigate(`/listings/${item.id}`)}
+                className="text-left bg-white rounded-lg shadow p-4 hover:shadow-md"
+              >
+                <div className="font-semibold truncate">{item.title}</div>
+                <div className="text-blue-600 font-bold">{t('common.currency')}{item.price.toLocaleString()}</div>
+                <div className="text-sm text-gray-600">
+                  {[item.make, item.model, item.year].filter(Boolean).join(' · ')}
+                </div>
+              </button>
+            ))}
+          </div>
+        </div>
+      )}
+
       {/* Contact Form */}
       <div className="mt-12 max-w-2xl">
         <h2 className="text-2xl font-bold mb-6">{t('listingDetails.contactForm.title')}</h2>
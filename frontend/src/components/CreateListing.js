@@ -42,6 +42,8 @@ const CreateListing = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [dragActive, setDragActive] = useState(false);
+  const [priceEstimate, setPriceEstimate] = useState(null);
+  const [suggestions, setSuggestions] = useState({ make: [], model: [] });
 
   // Redirect if not logged in
   React.useEffect(() => {
@@ -50,8 +52,40 @@ const CreateListing = () => {
     }
   }, [user, navigate]);
 
+  const fetchPriceEstimate = async () => {
+    if (!formData.vehicle_type || !formData.year) {
+      setPriceEstimate({ error: t('createListing.form.priceEstimate.missingInput') });
+      return;
+    }
+    try {
+      const params = { vehicle_type: formData.vehicle_type, year: formData.year };
+      if (formData.make) params.make = formData.make;
+      if (formData.model) params.model = formData.model;
+      if (formData.mileage) params.mileage = formData.mileage;
+      if (formData.specifications.length) params.length = formData.specifications.length;
+      const response = await axios.get(`${API}/market/estimate`, { params });
+      setPriceEstimate(response.data);
+    } catch (error) {
+      setPriceEstimate({ error: error.response?.data?.detail || t('createListing.form.priceEstimate.unavailable') });
+    }
+  };
+
+  const fetchSuggestions = async (field, prefix) => {
+    try {
+      const params = { field, prefix };
+      if (field === 'model' && formData.make) params.make = formData.make;
+      const response = await axios.get(`${API}/autocomplete`, { params });
+      setSuggestions(prev => ({ ...prev, [field]: response.data.map(suggestion => suggestion.value) }));
+    } catch (error) {
+      setSuggestions(prev => ({ ...prev, [field]: [] }));
+    }
+  };
+
   const handleInputChange = (e) => {
     const { name, value } = e.target;
+    if (name === 'make' || name === 'model') {
+      fetchSuggestions(name, value);
+    }
     
     if (name.includes('.')) {
       const [parent, child] = name.split('.');
@@ -285,6 +319,24 @@ const CreateListing = () => {
                 onChange={handleInputChange}
                 className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500"
               />
+              <button
+                type="button"
+                onClick={fetchPriceEstimate}
+                className="mt-2 text-sm text-blue-600 hover:text-blue-800"
+              >
+                {t('createListing.form.priceEstimate.show')}
+              </button>
+              {priceEstimate && (
+                priceEstimate.error ? (
+                  <p className="mt-1 text-sm text-gray-500">{priceEstimate.error}</p>
+                ) : (
+                  <p className="mt-1 text-sm text-gray-700">
+                    {t('createListing.form.priceEstimate.marketPrice')} {t('common.currency')}{priceEstimate.estimate.toLocaleString()}{' '}
+                    ({t('common.currency')}{priceEstimate.low.toLocaleString()} – {t('common.currency')}{priceEstimate.high.toLocaleString()},{' '}
+                    {priceEstimate.comparables} {t('createListing.form.priceEstimate.comparables')})
+                  </p>
+                )
+              )}
             </div>
 
             <div>
@@ -297,9 +349,14 @@ const CreateListing = () => {
                 required
                 value={formData.make}
                 onChange={handleInputChange}
+                list="make-suggestions"
+                autoComplete="off"
                 placeholder={t('createListing.form.makePlaceholder')}
                 className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500"
               />
+              <datalist id="make-suggestions">
+                {suggestions.make.map(value => <option key={value} value={value} />)}
+              </datalist>
             </div>
 
             <div>
@@ -312,9 +369,15 @@ const CreateListing = () => {
                 required
                 value={formData.model}
                 onChange={handleInputChange}
+                onFocus={() => fetchSuggestions('model', formData.model)}
+                list="model-suggestions"
+                autoComplete="off"
                 placeholder={t('createListing.form.modelPlaceholder')}
                 className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-blue-500 focus:border-blue-500"
               />
+              <datalist id="model-suggestions">
+                {suggestions.model.map(value => <option key={value} value={value} />)}
+              </datalist>
             </div>
 
             <div>
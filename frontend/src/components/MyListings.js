@@ -13,6 +13,9 @@ const MyListings = () => {
   const navigate = useNavigate();
 
   const [listings, setListings] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [deleteLoading, setDeleteLoading] = useState(null);
@@ -26,11 +29,20 @@ const MyListings = () => {
     fetchMyListings();
   }, [user, navigate]);
 
+  // Summary view: only the first image is sent, the dashboard needs nothing more
+  const fetchPage = (cursor) => {
+    const params = new URLSearchParams({ status: 'active', view: 'summary', limit: '20' });
+    if (cursor) params.append('cursor', cursor);
+    return axios.get(`${API}/my-listings?${params}`);
+  };
+
   const fetchMyListings = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/my-listings`);
-      setListings(response.data);
+      const response = await fetchPage();
+      setListings(response.data.listings);
+      setNextCursor(response.data.next_cursor);
+      setTotal(response.data.total);
     } catch (error) {
       setError('Fehler beim Laden der Anzeigen');
       console.error('Failed to fetch listings:', error);
@@ -39,6 +51,21 @@ const MyListings = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await fetchPage(nextCursor);
+      setListings(prev => [...prev, ...response.data.listings]);
+      setNextCursor(response.data.next_cursor);
+      setTotal(response.data.total);
+    } catch (error) {
+      setError('Fehler beim Laden der Anzeigen');
+      console.error('Failed to fetch more listings:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDelete = async (listingId) => {
     if (!window.confirm(t('myListings.confirmDelete'))) {
       return;
@@ -48,6 +75,7 @@ const MyListings = () => {
     try {
       await axios.delete(`${API}/listings/${listingId}`);
       setListings(prev => prev.filter(listing => listing.id !== listingId));
+      setTotal(prev => prev - 1);
     } catch (error) {
       setError('Fehler beim Löschen der Anzeige');
       console.error('Failed to delete listing:', error);
@@ -174,10 +202,6 @@ const MyListings = () => {
                     <p><strong>{t('listings.card.location')}:</strong> {listing.location?.address}</p>
                   </div>
 
-                  <p className="text-gray-700 mb-4 line-clamp-2">
-                    {listing.description}
-                  </p>
-
                   {/* Aktionen */}
                   <div className="flex flex-wrap gap-3">
                     <Link
@@ -204,7 +228,7 @@ const MyListings = () => {
 
                     {/* Statistiken (könnten später hinzugefügt werden) */}
                     <div className="flex items-center space-x-4 text-sm text-gray-500 ml-auto">
-                      <span>👁 0 Aufrufe</span>
+                      <span>👁 {listing.view_count || 0} Aufrufe</span>
                       <span>💬 0 Anfragen</span>
                     </div>
                   </div>
@@ -212,6 +236,17 @@ const MyListings = () => {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <div className="text-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="bg-gray-200 text-gray-800 px-6 py-2 rounded-md text-sm font-medium hover:bg-gray-300 disabled:opacity-50"
+              >
+                {loadingMore ? t('common.loading') : `Weitere Anzeigen laden (${listings.length} von ${total})`}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -221,11 +256,13 @@ const MyListings = () => {
           <h3 className="text-lg font-semibold mb-4">Übersicht</h3>
           <div className="grid grid-cols-1 md:grid-cols-4 gap-4 text-center">
             <div>
-              <div className="text-2xl font-bold text-blue-600">{listings.length}</div>
+              <div className="text-2xl font-bold text-blue-600">{total}</div>
               <div className="text-sm text-gray-600">Aktive Anzeigen</div>
             </div>
             <div>
-              <div className="text-2xl font-bold text-green-600">0</div>
+              <div className="text-2xl font-bold text-green-600">
+                {listings.reduce((total, listing) => total + (listing.view_count || 0), 0).toLocaleString()}
+              </div>
               <div className="text-sm text-gray-600">Gesamt Aufrufe</div>
             </div>
             <div>
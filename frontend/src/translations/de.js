@@ -104,6 +104,7 @@ export const germanTranslations = {
     specifications: "Technische Daten",
     description: "Beschreibung",
     location: "Standort",
+    similar: "Ähnliche Fahrzeuge",
     contactForm: {
       title: "Verkäufer kontaktieren",
       name: "Ihr Name",
@@ -142,6 +143,14 @@ export const germanTranslations = {
       images: "Bilder",
       imageNote: "Sie können mehrere Bilder hochladen (max. 5)",
       
+      priceEstimate: {
+        show: "Preisvorschlag anzeigen",
+        missingInput: "Bitte zuerst Fahrzeugtyp und Baujahr angeben",
+        unavailable: "Kein Preisvorschlag verfügbar",
+        marketPrice: "Marktpreis ca.",
+        comparables: "Vergleichsangebote"
+      },
+      
       specifications: {
         title: "Technische Daten",
         length: "Länge (m)",
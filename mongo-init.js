@@ -20,13 +20,32 @@ db.createCollection('listings');
 // Create indexes for better performance
 db.users.createIndex({ "username": 1 }, { unique: true });
 db.users.createIndex({ "email": 1 }, { unique: true });
+db.users.createIndex({ "id": 1 }, { unique: true });
 
-db.listings.createIndex({ "seller_id": 1 });
-db.listings.createIndex({ "vehicle_type": 1 });
-db.listings.createIndex({ "price": 1 });
-db.listings.createIndex({ "created_at": -1 });
+db.listings.createIndex({ "seller_id": 1, "created_at": -1, "id": -1 });
+
+// Browse indexes only cover active listings; soft-deleted ones are archived by the backend
+db.listings.createIndex({ "created_at": -1 }, { name: "active_created_at", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "vehicle_type": 1, "created_at": -1 }, { name: "active_vehicle_type_created_at", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "price": 1 }, { name: "active_price", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "popularity": -1, "created_at": -1 }, { name: "active_popularity", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "fingerprint.bands": 1 }, { name: "active_fingerprint_bands", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "id": 1 }, { name: "active_id", partialFilterExpression: { "is_active": true } });
+db.listings.createIndex({ "deleted_at": 1 }, { name: "inactive_deleted_at", partialFilterExpression: { "is_active": false } });
+db.listings.createIndex({ "updated_at": 1, "id": 1 });
+
+db.createCollection('listings_archive');
+db.listings_archive.createIndex({ "seller_id": 1 });
 db.listings.createIndex({ "location.latitude": 1, "location.longitude": 1 });
 
+db.createCollection('saved_searches');
+db.saved_searches.createIndex({ "user_id": 1, "created_at": -1 });
+db.saved_searches.createIndex({ "updated_at": 1 });
+db.saved_searches.createIndex({ "deleted_at": 1 }, { expireAfterSeconds: 604800 });
+db.alert_queue.createIndex({ "search_id": 1 });
+db.alert_queue.createIndex({ "user_id": 1 });
+db.change_feed_state.createIndex({ "updated_at": 1 }, { expireAfterSeconds: 86400 });
+
 // Create text index for search functionality
 db.listings.createIndex({
   "title": "text",
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Worker scaling benchmark
+Starts backend/serve.py with 1..N workers and measures requests per second
+against an endpoint that does no database work.
+
+Usage: python scripts/benchmark-workers.py [--max-workers 4] [--path /api/vehicle-types]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+async def keep_alive_client(host, port, path, deadline, counter):
+    """One keep-alive HTTP/1.1 connection issuing sequential GETs until the deadline"""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            writer.write(request)
+            await writer.drain()
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            counter[0] += 1
+    finally:
+        writer.close()
+
+
+async def measure(host, port, path, connections, duration):
+    counter = [0]
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(keep_alive_client(host, port, path, deadline, counter) for _ in range(connections)))
+    return counter[0] / duration
+
+
+def wait_until_up(url, timeout=30):
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--path", default="/api/vehicle-types")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results = []
+    workers = 1
+    while workers <= args.max_workers:
+        env = {
+            **os.environ,
+            "WEB_CONCURRENCY": str(workers),
+            "PORT": str(args.port),
+            "HOST": "127.0.0.1",
+            "ACCESS_LOG": "0",
+            "MAX_CONCURRENT_REQUESTS": "100000",
+        }
+        server = subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env)
+        try:
+            if not wait_until_up(f"http://127.0.0.1:{args.port}/healthz"):
+                print(f"Server with {workers} workers did not start")
+                break
+            # Warm up every worker before measuring
+            asyncio.run(measure("127.0.0.1", args.port, args.path, args.connections, 2))
+            rps = asyncio.run(measure("127.0.0.1", args.port, args.path, args.connections, args.duration))
+            results.append((workers, rps))
+            print(f"{workers:>3} workers: {rps:>10.0f} req/s")
+        finally:
+            # SIGTERM exercises the graceful drain path
+            server.terminate()
+            server.wait(timeout=60)
+        workers *= 2
+
+    if results:
+        baseline = results[0][1]
+        print("\n======================================")
+        print("workers    req/s   speedup")
+        for workers, rps in results:
+            print(f"{workers:>7} {rps:>8.0f} {rps / baseline:>8.2f}x")
+        print("======================================")
+
+
+if __name__ == "__main__":
+    main()
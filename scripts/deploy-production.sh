@@ -96,7 +96,7 @@ check_health() {
     
     # Check backend health
     echo "🔍 Testing backend API..."
-    if docker exec rv-classifieds-backend curl -f http://localhost:8000/api/stats > /dev/null 2>&1; then
+    if docker exec rv-classifieds-backend curl -f http://localhost:8000/readyz > /dev/null 2>&1; then
         print_status "Backend API is responding"
     else
         print_warning "Backend API health check failed"
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate scan
+Fingerprints active listings that have no fingerprint yet, then groups near-duplicate
+listings across the whole catalog using the same MinHash/LSH buckets that
+create_listing checks against. Reads MONGO_URL and DB_NAME like the backend.
+
+Usage: python scripts/find-duplicates.py [--threshold 0.8] [--flag] [--skip-backfill]
+With --flag, every listing but the oldest of a group gets duplicate_of set.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from dotenv import load_dotenv  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from duplicates import DEFAULT_THRESHOLD, backfill_fingerprints, flag_duplicates, scan_duplicates  # noqa: E402
+
+
+async def main(args):
+    load_dotenv(BACKEND_DIR / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    listings = client[os.environ["DB_NAME"]].listings
+    try:
+        if not args.skip_backfill:
+            print(f"Fingerprinted {await backfill_fingerprints(listings)} listings")
+        groups = await scan_duplicates(listings, args.threshold, args.max_bucket)
+        for group in groups:
+            original, *copies = group
+            print(f"\n{original['id']}  {original['title']}  (seller {original['seller_id']})")
+            for listing in copies:
+                same_seller = " same seller" if listing["seller_id"] == original["seller_id"] else ""
+                print(f"  duplicate {listing['id']}  {listing['title']}{same_seller}")
+        print(f"\n{len(groups)} groups, {sum(len(group) - 1 for group in groups)} duplicates")
+        if args.flag:
+            print(f"Flagged {await flag_duplicates(listings, groups)} listings")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity")
+    parser.add_argument("--max-bucket", type=int, default=200, help="skip LSH buckets larger than this")
+    parser.add_argument("--flag", action="store_true", help="set duplicate_of on the duplicates found")
+    parser.add_argument("--skip-backfill", action="store_true", help="do not fingerprint unfingerprinted listings first")
+    asyncio.run(main(parser.parse_args()))
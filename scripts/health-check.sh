@@ -70,7 +70,7 @@ fi
 log_step "Checking network connectivity..."
 
 # Test backend health
-if docker exec "${COMPOSE_PROJECT_NAME:-rv-classifieds}-backend" curl -f http://localhost:8000/api/stats > /dev/null 2>&1; then
+if docker exec "${COMPOSE_PROJECT_NAME:-rv-classifieds}-backend" curl -f http://localhost:8000/readyz > /dev/null 2>&1; then
     log_info "✅ Backend API is responding"
 else
     log_error "❌ Backend API is not responding"
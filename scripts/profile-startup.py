@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Cold start profile
+Reports the slowest imports of backend/server.py (python -X importtime) and the
+time from exec until a single worker answers /healthz.
+
+Usage: python scripts/profile-startup.py [--top 20] [--target 3.0] [--skip-serve]
+Exits non-zero when time-to-healthy exceeds --target seconds.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def import_profile():
+    """Run `import server` under -X importtime and return (total_us, [(cumulative_us, self_us, module)])"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "import server failed")
+        sys.exit(1)
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), module[1:].rstrip()))
+    # Nested imports are indented by two spaces per level; only the outermost add up to the total
+    total = sum(cumulative for cumulative, _, module in rows if not module.startswith("    "))
+    return total, rows
+
+
+def time_to_healthy(port, timeout=60):
+    env = {**os.environ, "WEB_CONCURRENCY": "1", "PORT": str(port), "HOST": "127.0.0.1", "ACCESS_LOG": "0"}
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1)
+                return time.perf_counter() - started
+            except Exception:
+                time.sleep(0.05)
+        return None
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--target", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--skip-serve", action="store_true", help="only profile imports")
+    args = parser.parse_args()
+
+    total, rows = import_profile()
+    print("======================================")
+    print(f"interpreter startup + import server: {total / 1000:.0f} ms")
+    print("cumulative    self  module")
+    for cumulative, self_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>8.1f}ms {self_us / 1000:>6.1f}ms {module}")
+    print("======================================")
+
+    if args.skip_serve:
+        return
+    elapsed = time_to_healthy(args.port)
+    if elapsed is None:
+        print("Server did not become healthy")
+        sys.exit(1)
+    print(f"exec -> /healthz: {elapsed:.2f}s (target {args.target:.2f}s)")
+    if elapsed > args.target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import operator
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other by bare name (they run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+OPERATORS = {
+    "$in": lambda value, operand: value in operand,
+    "$ne": operator.ne,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+}
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and all(name.startswith("$") for name in condition):
+            if not all(OPERATORS[name](document.get(key), operand) for name, operand in condition.items()):
+                return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    def sort(self, key, direction=1):
+        documents = self.documents
+        # Stable sorts, least significant key first
+        for field, order in reversed(key if isinstance(key, list) else [(key, direction)]):
+            documents = sorted(documents, key=lambda document: document[field], reverse=order < 0)
+        return FakeCursor(documents)
+
+    def limit(self, count):
+        return FakeCursor(self.documents[:count]) if count else self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(document) for document in self.documents[:length]]
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+
+class FakeCollection:
+    """In-memory stand-in for the Motor collection reads the unit tests exercise.
+
+    Supports equality, $in, $ne, range operators and $or; projections are ignored.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query=None, projection=None, session=None):
+        query = query or {}
+        self.queries.append(query)
+        return FakeCursor(document for document in self.documents if matches(document, query))
+
+
+@pytest.fixture
+def fake_collection():
+    return FakeCollection
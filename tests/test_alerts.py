@@ -0,0 +1,83 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from alerts import IntervalTree, SavedSearchIndex
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+INF = float("inf")
+
+
+def at(seconds: float) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+
+def saved(search_id, updated=0, active=True, **criteria):
+    return {"id": search_id, "user_id": "u", "name": search_id, "updated_at": at(updated), "is_active": active, **criteria}
+
+
+def listing(price, vehicle_type="caravan", title="Knaus Sport"):
+    return {"id": "l", "title": title, "price": price, "vehicle_type": vehicle_type}
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for key in range(300):
+        low = rng.choice([-INF, rng.uniform(0, 100)])
+        high = rng.choice([INF, rng.uniform(0, 100)])
+        intervals.append((low, high, str(key)))
+    tree = IntervalTree(intervals)
+    for point in [rng.uniform(-10, 110) for _ in range(200)] + [0.0, 50.0, 100.0]:
+        expected = sorted(key for low, high, key in intervals if low <= point <= high)
+        assert sorted(tree.stab(point)) == expected
+
+
+def test_interval_tree_bounds_are_inclusive_and_empty_intervals_ignored():
+    tree = IntervalTree([(10, 20, "a"), (20, 30, "b"), (30, 10, "empty")])
+    assert sorted(tree.stab(20)) == ["a", "b"]
+    assert tree.stab(25) == ["b"]
+    assert tree.stab(31) == []
+    assert IntervalTree([]).stab(1) == []
+
+
+def test_match_requires_every_predicate():
+    index = SavedSearchIndex()
+    index.add(saved("any"))
+    index.add(saved("caravan", vehicle_type="caravan"))
+    index.add(saved("motorhome", vehicle_type="motorhome"))
+    index.add(saved("cheap", max_price=10000))
+    index.add(saved("knaus", search_text="Knaus"))
+    index.add(saved("knaus-hobby", search_text="Knaus Hobby"))
+    matched = {search["id"] for search in index.match(listing(15000))}
+    assert matched == {"any", "caravan", "knaus"}
+    matched = {search["id"] for search in index.match(listing(5000, vehicle_type=None, title="Hobby Knaus"))}
+    assert matched == {"any", "cheap", "knaus", "knaus-hobby"}
+
+
+def test_price_ranges_survive_rebuilds_and_removals():
+    index = SavedSearchIndex(rebuild_threshold=2)
+    for number in range(5):
+        index.add(saved(str(number), min_price=number * 1000, max_price=number * 1000 + 1500))
+    index.remove("1")
+    index.add(saved("2", min_price=0, max_price=100))
+    assert {search["id"] for search in index.match(listing(1200))} == {"0"}
+    assert {search["id"] for search in index.match(listing(3200))} == {"3"}
+    assert {search["id"] for search in index.match(listing(50))} == {"0", "2"}
+
+
+def test_refresh_applies_late_commits_inside_the_lag_window(fake_collection):
+    documents = [saved("a", updated=0)]
+    collection = fake_collection(documents)
+    index = SavedSearchIndex(commit_lag=5)
+    asyncio.run(index.refresh(collection))
+    index.watermark = at(0)
+    documents.append(saved("newer", updated=10))
+    asyncio.run(index.refresh(collection))
+    assert index.watermark == at(10)
+    # Stamped at 8 but committed after the watermark reached 10
+    documents.append(saved("late", updated=8))
+    documents[0] = saved("a", updated=9, active=False)
+    asyncio.run(index.refresh(collection))
+    assert set(index.searches) == {"newer", "late"}
+    assert ("newer", at(10)) in index.seen
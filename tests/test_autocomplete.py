@@ -0,0 +1,49 @@
+from autocomplete import AutocompleteIndex, PrefixIndex, normalize
+
+
+def test_normalize_ignores_case_accents_and_spacing():
+    assert normalize("  Bürstner  Lyseo ") == "burstner lyseo"
+    assert normalize("HOBBY") == normalize("hobby")
+
+
+def test_completions_are_ranked_by_count_then_key():
+    index = PrefixIndex()
+    for value in ["Hobby"] * 3 + ["Hymer"] * 3 + ["Hymercar", "Knaus"]:
+        index.add(value)
+    assert index.complete("h") == [("Hobby", 3), ("Hymer", 3), ("Hymercar", 1)]
+    assert index.complete("hym", limit=1) == [("Hymer", 3)]
+    assert index.complete("x") == []
+    assert [value for value, _ in index.complete("")] == ["Hobby", "Hymer", "Hymercar", "Knaus"]
+
+
+def test_most_common_spelling_is_shown():
+    index = PrefixIndex()
+    for value in ("Bürstner", "Bürstner", "burstner"):
+        index.add(value)
+    assert index.complete("bu") == [("Bürstner", 3)]
+    index.discard("Bürstner")
+    index.discard("Bürstner")
+    assert index.complete("bu") == [("burstner", 1)]
+
+
+def test_last_discard_removes_the_key():
+    index = PrefixIndex()
+    index.add("Knaus")
+    index.discard("Knaus")
+    index.discard("Knaus")
+    assert len(index) == 0
+    assert index.complete("k") == []
+
+
+def test_models_follow_listing_updates_and_deletes():
+    index = AutocompleteIndex()
+    index.index({"id": "1", "make": "Knaus", "model": "Sport"})
+    index.index({"id": "2", "make": "Hymer", "model": "Sprinter"})
+    assert index.complete("model", "sp", make="knaus") == [("Sport", 1)]
+    assert index.complete("model", "sp") == [("Sport", 1), ("Sprinter", 1)]
+    index.index({"id": "1", "make": "Knaus", "model": "Sudwind"})
+    assert index.complete("model", "s", make="Knaus") == [("Sudwind", 1)]
+    index.index({"id": "2", "make": "Hymer", "model": "Sprinter", "is_active": False})
+    assert index.complete("make", "") == [("Knaus", 1)]
+    assert index.complete("model", "", make="Hymer") == []
+    assert len(index) == 1
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from change_feed import PollWindow  # noqa: E402
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def at(seconds: float) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+
+def listing(listing_id, created, updated=None, deleted=None, active=True):
+    document = {"id": listing_id, "created_at": at(created), "is_active": active}
+    if updated is not None:
+        document["updated_at"] = at(updated)
+    if deleted is not None:
+        document["deleted_at"] = at(deleted)
+    return document
+
+
+def test_events_are_ordered_and_typed():
+    window = PollWindow(T0, lag=5)
+    events = window.accept([
+        listing("b", 0, updated=3),
+        listing("a", 1, updated=1),
+        listing("c", 0, updated=4, deleted=4, active=False),
+    ])
+    assert [(event.op, event.listing_id) for event in events] == [("insert", "a"), ("update", "b"), ("delete", "c")]
+    assert window.watermark == at(4)
+
+
+def test_rescanned_changes_are_not_published_twice():
+    window = PollWindow(T0, lag=5)
+    assert len(window.accept([listing("a", 1, updated=1)])) == 1
+    # The next poll re-scans the lag window and sees the same change again
+    assert window.accept([listing("a", 1, updated=1)]) == []
+    # A later edit of the same listing is a new change
+    assert [event.op for event in window.accept([listing("a", 1, updated=2)])] == ["update"]
+
+
+def test_late_commit_inside_lag_window_is_published():
+    window = PollWindow(T0, lag=5)
+    window.accept([listing("newer", 10, updated=10)])
+    assert window.since == at(5)
+    # Stamped at 8 but committed after the watermark reached 10
+    events = window.accept([listing("newer", 10, updated=10), listing("late", 8, updated=8)])
+    assert [event.listing_id for event in events] == ["late"]
+    assert window.watermark == at(10)
+
+
+def test_seen_keys_are_forgotten_outside_the_window():
+    window = PollWindow(T0, lag=5)
+    window.accept([listing("a", 1, updated=1)])
+    window.accept([listing("b", 20, updated=20)])
+    assert ("a", at(1)) not in window.seen
+    assert ("b", at(20)) in window.seen
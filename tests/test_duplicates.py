@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from duplicates import BANDS, NUM_HASHES, DisjointSets, fingerprint, shingles, signature, similarity  # noqa: E402
+
+DESCRIPTION = (
+    "Gepflegter Wohnwagen mit Vorzelt, Mover und neuen Reifen. Nichtraucherfahrzeug ohne Haustiere, "
+    "TÜV neu, Gasprüfung neu, Dichtigkeitsprüfung ohne Befund, Fahrradträger und Markise inklusive."
+)
+
+
+def listing(**changes):
+    return {"title": "Knaus Sport 460 EU", "description": DESCRIPTION, "make": "Knaus", "model": "Sport", "images": ["aGVsbG8="], **changes}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def test_identical_listings_share_every_band():
+    first, second = fingerprint(listing()), fingerprint(listing())
+    assert first == second
+    assert len(first["signature"]) == 8 * NUM_HASHES
+    assert len(first["bands"]) == BANDS
+    assert similarity(first["signature"], second["signature"]) == 1.0
+
+
+def test_similarity_estimates_jaccard():
+    original = listing()
+    edited = listing(description=DESCRIPTION.replace("Markise", "Sat-Anlage").replace("Mover", "Klimaanlage"))
+    exact = jaccard(shingles(original), shingles(edited))
+    estimate = similarity(fingerprint(original)["signature"], fingerprint(edited)["signature"])
+    assert 0.5 < exact < 1
+    # 64 hashes: the standard error is below 0.07
+    assert abs(estimate - exact) < 0.2
+
+
+def test_unrelated_listings_do_not_match():
+    other = listing(title="Hymer B-Klasse", make="Hymer", model="B 544", images=[],
+                    description="Integriertes Wohnmobil, Automatik, Einzelbetten, Solaranlage und Rückfahrkamera.")
+    first, second = fingerprint(listing()), fingerprint(other)
+    assert similarity(first["signature"], second["signature"]) < 0.2
+    assert not set(first["bands"]) & set(second["bands"])
+
+
+def test_reused_photo_is_a_feature():
+    features = shingles(listing())
+    assert any(feature.startswith("image:") for feature in features)
+    assert features - shingles(listing(images=[])) == {next(feature for feature in features if feature.startswith("image:"))}
+    assert signature(set()) != signature(features)
+
+
+def test_disjoint_sets_group_transitively():
+    groups = DisjointSets()
+    groups.union("a", "b")
+    groups.union("c", "d")
+    groups.union("b", "d")
+    groups.find("e")
+    assert len({groups.find(key) for key in "abcd"}) == 1
+    assert groups.find("e") == "e"
@@ -0,0 +1,66 @@
+import random
+import time
+
+from geo import MapIndex, cell_count, covering_cells, geohash, parse_bbox, precision_for_zoom
+
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+
+def test_geohash_known_value():
+    assert geohash(57.64911, 10.40744, 9) == "u4pruydqq"
+
+
+def test_cell_count_matches_covering_cells():
+    for bbox in [(10.0, 47.0, 11.5, 48.2), (-3.2, 51.1, 0.4, 52.0), WORLD]:
+        for precision in (1, 2, 3):
+            assert cell_count(bbox, precision) == len(covering_cells(bbox, precision))
+
+
+def test_covering_cells_contain_every_point_in_bbox():
+    bbox = (9.5, 46.5, 17.2, 49.0)
+    rng = random.Random(1)
+    for precision in (2, 3, 4):
+        cells = set(covering_cells(bbox, precision))
+        for _ in range(200):
+            lat = rng.uniform(bbox[1], bbox[3])
+            lng = rng.uniform(bbox[0], bbox[2])
+            assert geohash(lat, lng, precision) in cells
+
+
+def test_world_view_at_max_zoom_is_bounded():
+    index = MapIndex(max_cells=1024)
+    index.index({"id": "a", "location": {"latitude": 48.2, "longitude": 16.4}})
+    started = time.perf_counter()
+    precision, clusters = index.clusters(WORLD, 22)
+    assert time.perf_counter() - started < 0.5
+    assert cell_count(WORLD, precision) <= 1024
+    assert [cluster["count"] for cluster in clusters] == [1]
+
+
+def test_zoom_is_clamped():
+    assert precision_for_zoom(-5) == precision_for_zoom(0)
+    assert precision_for_zoom(100) == precision_for_zoom(22)
+
+
+def test_clusters_count_points_per_cell():
+    index = MapIndex()
+    rng = random.Random(2)
+    points = {str(i): (rng.uniform(46, 49), rng.uniform(9, 17)) for i in range(300)}
+    for listing_id, (lat, lng) in points.items():
+        index.index({"id": listing_id, "location": {"latitude": lat, "longitude": lng}})
+    index.remove("0")
+    index.index({"id": "1", "is_active": False, "location": {"latitude": 47, "longitude": 10}})
+    precision, clusters = index.clusters((9.0, 46.0, 17.0, 49.0), 6)
+    expected = {}
+    for listing_id, (lat, lng) in points.items():
+        if listing_id not in ("0", "1"):
+            cell = geohash(lat, lng, precision)
+            expected[cell] = expected.get(cell, 0) + 1
+    assert {cluster["geohash"]: cluster["count"] for cluster in clusters} == expected
+
+
+def test_parse_bbox_rejects_invalid_values():
+    assert parse_bbox("10,47,11,48") == (10.0, 47.0, 11.0, 48.0)
+    assert parse_bbox("-200,-100,200,100") == WORLD
+    for value in ("nan,47,11,48", "10,47,inf,48", "10,-inf,11,48", "11,47,10,48", "10,48,11,47", "10,47,11", "a,b,c,d"):
+        assert parse_bbox(value) is None
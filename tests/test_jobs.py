@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import jobs  # noqa: E402
+from jobs import run_with_retry  # noqa: E402
+
+
+def test_run_with_retry_backs_off_until_the_step_succeeds(monkeypatch):
+    pauses = []
+
+    async def sleep(delay):
+        pauses.append(delay)
+
+    monkeypatch.setattr(jobs.asyncio, "sleep", sleep)
+    attempts = []
+
+    async def step():
+        attempts.append(1)
+        if len(attempts) < 5:
+            raise ConnectionError("not yet")
+        return "loaded"
+
+    assert asyncio.run(run_with_retry("Loading", step, first_delay=1, max_delay=4)) == "loaded"
+    assert pauses == [1, 2, 4, 4]
+
+
+def test_run_with_retry_does_not_swallow_cancellation():
+    async def step():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run_with_retry("Loading", step))
@@ -0,0 +1,74 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+# server.py connects lazily, so importing it needs the settings but no running MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+import server  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+
+def listing(listing_id, seller_id="s1", is_active=True):
+    return {
+        "id": listing_id, "title": f"Listing {listing_id}", "description": "", "price": 20000.0,
+        "vehicle_type": "caravan", "make": "Knaus", "model": "Sport", "year": 2018,
+        "location": {"address": "Berlin"}, "images": [], "seller_id": seller_id,
+        "created_at": datetime(2026, 1, 1), "is_active": is_active,
+    }
+
+
+@pytest.fixture
+def db(monkeypatch, fake_collection):
+    listings = fake_collection([listing("a"), listing("b", seller_id="s2"), listing("c"), listing("gone", is_active=False)])
+    users = fake_collection([{"id": "s1", "full_name": "Anna", "email": "anna@example.org", "is_active": True}])
+    monkeypatch.setattr(server, "public_listings", listings)
+    monkeypatch.setattr(server, "public_users", users)
+    monkeypatch.setattr(server, "seller_cache", TTLCache(ttl=60))
+    return listings, users
+
+
+def fetch(ids, view="full"):
+    request = Request({"type": "http", "headers": []})
+    return asyncio.run(server.fetch_listing_batch(ids, view, request, server.SellerLoader()))
+
+
+def test_batch_keeps_request_order_and_reports_missing(db):
+    batch = fetch(["c", "a", "", "c", "gone", "unknown"])
+    assert [item.id for item in batch.listings] == ["c", "a"]
+    assert batch.missing == ["gone", "unknown"]
+    listings, _ = db
+    assert len(listings.queries) == 1
+
+
+def test_sellers_are_resolved_with_one_query(db):
+    batch = fetch(["a", "b", "c"])
+    _, users = db
+    assert len(users.queries) == 1
+    assert sorted(users.queries[0]["id"]["$in"]) == ["s1", "s2"]
+    assert [item.seller_name for item in batch.listings] == ["Anna", server.DELETED_SELLER["seller_name"], "Anna"]
+
+
+def test_summary_view_skips_sellers(db):
+    batch = fetch(["a"], view="summary")
+    assert isinstance(batch.listings[0], server.ListingSummary)
+    _, users = db
+    assert users.queries == []
+
+
+def test_invalid_batches_are_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        fetch(["a"], view="thumbnail")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        fetch([str(number) for number in range(server.LISTING_BATCH_MAX + 1)])
+    assert error.value.status_code == 400
+    assert fetch(["", ""]).listings == []
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from market import MIN_COMPARABLES, MarketSnapshot  # noqa: E402
+
+
+def rows(count, make="Knaus", model="Sport", vehicle_type="motorhome", first_year=2014, base_price=40000):
+    # Prices rise 8% per model year and fall with mileage, plus a little deterministic noise
+    return [
+        {
+            "vehicle_type": vehicle_type, "make": make, "model": model,
+            "year": first_year + i % 8, "mileage": 10000 + 7000 * (i % 5), "length": 7.0 + 0.1 * (i % 3),
+            "price": round(base_price * 1.08 ** (i % 8) * (1 - 0.01 * (i % 5)) * (1 + 0.02 * ((i * 7) % 3 - 1))),
+        }
+        for i in range(count)
+    ]
+
+
+def test_estimate_uses_same_make_and_model():
+    snapshot = MarketSnapshot(rows(40) + rows(40, make="Hymer", model="B", base_price=80000))
+    estimate = snapshot.estimate("motorhome", 2018, make="knaus ", model="SPORT", mileage=20000)
+    assert estimate["comparable_level"] == "make_model"
+    # Model years 2016-2020 of the Knaus rows only
+    assert estimate["comparables"] == 25
+    assert estimate["low"] <= estimate["estimate"] <= estimate["high"]
+    prices = [row["price"] for row in rows(40) if abs(row["year"] - 2018) <= 2]
+    assert min(prices) <= estimate["estimate"] <= max(prices)
+
+
+def test_newer_vehicles_are_estimated_higher():
+    snapshot = MarketSnapshot(rows(80))
+    older = snapshot.estimate("motorhome", 2015, make="Knaus", model="Sport")
+    newer = snapshot.estimate("motorhome", 2020, make="Knaus", model="Sport")
+    assert newer["estimate"] > older["estimate"]
+
+
+def test_comparables_are_relaxed_until_there_are_enough():
+    snapshot = MarketSnapshot(rows(MIN_COMPARABLES - 1) + rows(20, model="Sun Ti"))
+    estimate = snapshot.estimate("motorhome", 2017, make="Knaus", model="Sport")
+    assert estimate["comparable_level"] == "make"
+    estimate = snapshot.estimate("motorhome", 2017, make="Dethleffs", model="Globebus")
+    assert estimate["comparable_level"] == "vehicle_type"
+
+
+def test_too_few_comparables_give_no_estimate():
+    snapshot = MarketSnapshot(rows(MIN_COMPARABLES - 1, vehicle_type="caravan") + rows(20))
+    assert snapshot.estimate("caravan", 2017) is None
+    assert snapshot.estimate("camper_van", 2017) is None
+    assert MarketSnapshot([]).estimate("motorhome", 2017) is None
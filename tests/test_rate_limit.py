@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import rate_limit  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from rate_limit import InMemoryBackend, RateLimit, RateLimiter, is_trusted, parse_limits, parse_networks  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def take(backend, key, limit, cost=1):
+    return asyncio.run(backend.take(key, limit, cost))
+
+
+def test_parse_limits():
+    limits = parse_limits("login=10/60, register=5/600,")
+    assert (limits["login"].capacity, limits["login"].period) == (10, 60.0)
+    assert limits["register"].refill_rate == pytest.approx(5 / 600)
+
+
+def test_bucket_drains_then_refills(clock):
+    backend = InMemoryBackend()
+    limit = RateLimit(3, 30)
+    assert [take(backend, "a", limit)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = take(backend, "a", limit)
+    assert not allowed and retry_after == pytest.approx(10)
+    clock.now += 10
+    assert take(backend, "a", limit) == (True, 0.0)
+    # Other keys have their own bucket
+    assert take(backend, "b", limit)[0]
+
+
+def test_bucket_never_refills_above_capacity(clock):
+    backend = InMemoryBackend()
+    limit = RateLimit(2, 10)
+    take(backend, "a", limit)
+    clock.now += 3600
+    assert [take(backend, "a", limit)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_weighted_cost(clock):
+    backend = InMemoryBackend()
+    limit = RateLimit(10, 10)
+    assert take(backend, "a", limit, cost=7)[0]
+    allowed, retry_after = take(backend, "a", limit, cost=7)
+    assert not allowed and retry_after == pytest.approx(4)
+
+
+def test_idle_buckets_are_evicted(clock):
+    backend = InMemoryBackend(max_keys=2)
+    limit = RateLimit(1, 60)
+    for key in ("a", "b", "c"):
+        take(backend, key, limit)
+    assert list(backend.buckets) == ["b", "c"]
+
+
+def test_cost_is_capped_at_capacity(clock):
+    limiter = RateLimiter(InMemoryBackend(), {"listings": RateLimit(120, 60)}, lambda request: "client")
+    dependency = limiter.limit("listings", cost=lambda request: 1000)
+    asyncio.run(dependency(SimpleNamespace()))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(dependency(SimpleNamespace()))
+    assert error.value.status_code == 429
+    clock.now += 60
+    asyncio.run(dependency(SimpleNamespace()))
+
+
+def test_trusted_proxies():
+    networks = parse_networks("127.0.0.0/8, ::1,172.16.0.0/12")
+    assert is_trusted("127.0.0.1", networks)
+    assert is_trusted("::1", networks)
+    assert is_trusted("172.18.0.5", networks)
+    assert not is_trusted("203.0.113.9", networks)
+    assert not is_trusted("testclient", networks)
+    assert not is_trusted(None, networks)
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from recommend import FEATURES, MISSING_PENALTY, SimilarListings, encode  # noqa: E402
+
+
+def listing(listing_id, **fields):
+    base = {
+        "id": listing_id, "title": "Wohnmobil", "description": "", "vehicle_type": "motorhome", "make": "Hymer",
+        "model": "B-Klasse", "price": 50000, "year": 2018, "mileage": 40000, "length": 7.0,
+        "location": {"latitude": 48.2, "longitude": 16.4},
+    }
+    return {**base, **fields}
+
+
+def test_expanded_distance_matches_masked_squared_distance():
+    first = listing("a", price=None, location=None)
+    second = listing("b", year=None, price=20000)
+    (v1, k1), (v2, k2) = encode(first), encode(second)
+    both = k1 * k2
+    expected = float(((v1 - v2) ** 2 * both).sum() + MISSING_PENALTY * (FEATURES - both.sum()))
+    index = SimilarListings()
+    index.index(first)
+    index.index(second)
+    design = index.design[index.rows["b"]]
+    squares, values, known = np.split(index.design[index.rows["a"]], 3)
+    query = np.concatenate([known, -2 * values, squares - MISSING_PENALTY * known])
+    assert float(design @ query + MISSING_PENALTY * FEATURES) == pytest.approx(expected, abs=1e-3)
+
+
+def test_similar_prefers_close_listings_of_the_same_make():
+    index = SimilarListings()
+    index.index(listing("source"))
+    index.index(listing("same-make", price=52000))
+    index.index(listing("other-make", make="Knaus", price=52000))
+    index.index(listing("far", price=400000, year=1995, location={"latitude": 60.0, "longitude": 25.0}))
+    results = index.similar("source", limit=3)
+    assert [result["id"] for result in results] == ["same-make", "other-make", "far"]
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+    assert index.similar("missing") is None
+
+
+def test_removed_listings_leave_no_terms_or_makes_behind():
+    index = SimilarListings(capacity=1)
+    for i in range(20):
+        index.index(listing(str(i), make=f"Make {i % 3}", title=f"Wohnmobil Modell{i}"))
+    for i in range(20):
+        index.remove(str(i))
+    assert len(index) == 0
+    assert not index.document_frequency
+    assert not index.make_codes and not index.make_counts
+    index.index(listing("again", make="Make 9"))
+    # Codes of makes that are gone are reused
+    assert list(index.make_codes) == ["make 9"] and index.make_codes["make 9"] < 3
+    assert index.similar("again") == []
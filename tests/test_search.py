@@ -0,0 +1,91 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from search import InMemorySearchBackend, MongoSearchBackend, create_search_backend, german_stem, tokenize  # noqa: E402
+
+
+def listing(listing_id, title, description="", **fields):
+    return {"id": listing_id, "title": title, "description": description, "make": "", "model": "", **fields}
+
+
+@pytest.fixture
+def index():
+    index = InMemorySearchBackend(capacity=2)
+    index.index(listing("a", "Hymer Wohnmobil", "Markise und Solaranlage", vehicle_type="motorhome", price=45000, year=2018, make="Hymer"))
+    index.index(listing("b", "Knaus Wohnwagen", "Mit Markise", vehicle_type="caravan", price=18000, year=2012, make="Knaus"))
+    index.index(listing("c", "Kastenwagen", "Wohnmobil mit Heizung", vehicle_type="camper_van", price=39000, year=2021, make="Pössl"))
+    index.index(listing("d", "Hymer Alkoven", "Wohnmobil, gepflegt", vehicle_type="motorhome", price=250000, make="Hymer"))
+    return index
+
+
+def test_german_stem():
+    assert german_stem("wohnwagen") == "wohnwag"
+    assert german_stem("häuser") == "haus"
+    assert german_stem("kätzchen") == "katzch"
+    assert tokenize("Die Wohnmobile und der Wohnwagen") == ["wohnmobil", "wohnwag"]
+
+
+def test_title_matches_outrank_description_matches(index):
+    match = index.match("wohnmobil")
+    assert len(match) == 3
+    assert match.page([], 0, 10)[0] == "a"
+
+
+def test_fuzzy_expansion_of_unknown_terms(index):
+    assert set(index.match("wohnmobiel").page([], 0, 10)) == {"a", "c", "d"}
+    assert len(index.match("xyzzy")) == 0
+
+
+def test_pages_are_filtered_and_never_overlap(index):
+    match = index.match("wohnmobil markise")
+    everything = match.page([], 0, 10)
+    assert len(everything) == 4
+    assert match.page([], 0, 2) + match.page([], 2, 2) == everything
+    assert match.page([], 4, 2) == []
+    assert match.page([{"vehicle_type": "motorhome"}], 0, 10) == [i for i in everything if i in ("a", "d")]
+    assert match.page([{"price": {"$gte": 20000, "$lte": 50000}}], 0, 10) == [i for i in everything if i in ("a", "c")]
+    assert match.page([{"vehicle_type": "boat"}], 0, 10) == []
+
+
+def test_facets_count_every_match(index):
+    match = index.match("wohnmobil")
+    assert match.counts("make", []) == [{"value": "Hymer", "count": 2}, {"value": "Pössl", "count": 1}]
+    assert match.counts("vehicle_type", [{"price": {"$lte": 50000}}]) == [
+        {"value": "motorhome", "count": 1}, {"value": "camper_van", "count": 1},
+    ]
+    assert match.buckets("price", [0, 40000, 100000], []) == [
+        {"min": 0, "count": 1}, {"min": 40000, "count": 1}, {"min": "other", "count": 1},
+    ]
+    # Listings without a year are left out, as $bucket only groups numbers
+    assert match.buckets("year", [2000, 2020, 2030], []) == [{"min": 2000, "count": 1}, {"min": 2020, "count": 1}]
+
+
+def test_updates_and_removals(index):
+    index.index(listing("a", "Wohnwagen", vehicle_type="caravan", price=9000))
+    index.remove("c")
+    index.remove("missing")
+    assert set(index.match("wohnmobil").page([], 0, 10)) == {"d"}
+    assert index.match("wohnwagen").page([{"price": {"$lte": 10000}}], 0, 10) == ["a"]
+    index.index({**listing("d", "Hymer Alkoven"), "is_active": False})
+    assert len(index.match("wohnmobil")) == 0
+    assert len(index) == 2
+
+
+def test_index_grows_beyond_capacity():
+    index = InMemorySearchBackend(capacity=1)
+    for i in range(50):
+        index.index(listing(str(i), f"Wohnmobil {i}", price=i))
+    match = index.match("wohnmobil")
+    assert len(match) == 50
+    assert sorted(match.page([{"price": {"$lte": 9}}], 0, 50), key=int) == [str(i) for i in range(10)]
+
+
+def test_unsupported_filters_are_rejected(index):
+    with pytest.raises(ValueError):
+        index.match("wohnmobil").page([{"model": "Exsis"}], 0, 10)
+
+
+def test_backend_selection():
+    assert isinstance(create_search_backend("memory"), InMemorySearchBackend)
+    assert isinstance(create_search_backend("mongo"), MongoSearchBackend)
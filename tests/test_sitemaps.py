@@ -0,0 +1,40 @@
+import asyncio
+import gzip
+import uuid
+from datetime import datetime
+
+import sitemaps
+from sitemaps import MAX_URLS, TARGET_URLS, prefix_length_for, render_shard
+
+
+def test_prefix_length_grows_with_the_catalogue():
+    assert prefix_length_for(0) == 1
+    assert prefix_length_for(16 * TARGET_URLS) == 1
+    assert prefix_length_for(16 * TARGET_URLS + 1) == 2
+    assert prefix_length_for(10, minimum=2) == 2
+    # Expected shard size stays under the protocol limit at every length
+    for count in (10 ** 5, 10 ** 6, 10 ** 7):
+        assert count / 16 ** prefix_length_for(count) <= MAX_URLS
+
+
+def test_shard_holds_the_prefix_listings(fake_collection):
+    modified = datetime(2026, 1, 2, 3, 4, 5)
+    listings = [
+        {"id": "a1", "updated_at": modified, "is_active": True},
+        {"id": "a2", "is_active": True},
+        {"id": "a3", "is_active": False},
+        {"id": "b1", "updated_at": modified, "is_active": True},
+    ]
+    body, count, newest = asyncio.run(render_shard(fake_collection(listings), "a", "https://example.org/"))
+    xml = gzip.decompress(body).decode()
+    assert count == 2 and newest == modified
+    assert "<loc>https://example.org/listings/a1</loc><lastmod>2026-01-02T03:04:05+00:00</lastmod>" in xml
+    assert "<loc>https://example.org/listings/a2</loc></url>" in xml
+    assert "a3" not in xml and "b1" not in xml
+
+
+def test_oversized_shard_is_refused(monkeypatch, fake_collection):
+    monkeypatch.setattr(sitemaps, "MAX_URLS", 3)
+    listings = [{"id": f"a{uuid.uuid4().hex}", "is_active": True} for _ in range(4)]
+    assert asyncio.run(render_shard(fake_collection(listings), "a", "https://example.org")) is None
+    assert asyncio.run(render_shard(fake_collection(listings[:3]), "a", "https://example.org"))[1] == 3
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from syndication import decode_token, encode_token, feed_lines
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def listing(listing_id, seconds, version=1, is_active=True):
+    return {"id": listing_id, "title": listing_id, "updated_at": T0 + timedelta(seconds=seconds), "version": version, "is_active": is_active}
+
+
+def read(collection, since, limit):
+    async def collect():
+        return [json.loads(line) async for line in feed_lines(collection, since, limit, settle_seconds=5)]
+    return asyncio.run(collect())
+
+
+def test_token_round_trip_and_garbage():
+    position = (T0, "abc")
+    assert decode_token(encode_token(position)) == position
+    assert decode_token("not-a-token") is None
+    assert decode_token(encode_token(position)[:-4]) is None
+
+
+def test_pages_cover_every_change_once_in_order(fake_collection):
+    # Equal timestamps are ordered by id, so a page boundary between them loses nothing
+    documents = [listing("b", 1), listing("a", 1), listing("c", 1), listing("d", 2, version=0), listing("e", 3, is_active=False)]
+    collection = fake_collection(documents)
+    seen, since = [], None
+    for _ in range(10):
+        lines = read(collection, since, limit=2)
+        *changes, last = lines
+        seen.extend(change.get("id") or change["listing"]["id"] for change in changes)
+        since = decode_token(last["next"]) if last["next"] else since
+        if not last["has_more"]:
+            break
+    assert seen == ["a", "b", "c", "d", "e"]
+    assert read(collection, since, limit=2) == [{"next": encode_token(since), "has_more": False}]
+
+
+def test_operations_and_settle_window(fake_collection):
+    now = datetime.utcnow()
+    documents = [
+        {"id": "new", "updated_at": now - timedelta(seconds=60), "version": 0, "is_active": True},
+        {"id": "edited", "updated_at": now - timedelta(seconds=50), "version": 2, "is_active": True},
+        {"id": "deleted", "updated_at": now - timedelta(seconds=40), "version": 3, "is_active": False},
+        {"id": "in-flight", "updated_at": now, "version": 0, "is_active": True},
+    ]
+    *changes, last = read(fake_collection(documents), None, limit=10)
+    assert [change["op"] for change in changes] == ["created", "updated", "deleted"]
+    assert "is_active" not in changes[0]["listing"]
+    assert decode_token(last["next"])[1] == "deleted"
+    assert last["has_more"] is False